@@ -1,7 +1,9 @@
 import streamlit as st
 import requests
 import uuid
+import time
 from datetime import datetime
+from urllib.parse import urljoin
 import json
 
 # Configure page
@@ -219,6 +221,9 @@ if 'messages' not in st.session_state:
 if 'api_endpoint' not in st.session_state:
     st.session_state.api_endpoint = 'http://localhost:8000/api/chat/'  # Default Django endpoint
 
+if 'run_as_job' not in st.session_state:
+    st.session_state.run_as_job = False
+
 def call_django_api(session_id, message, api_endpoint):
     """
     Call your Django API endpoint
@@ -254,6 +259,54 @@ def call_django_api(session_id, message, api_endpoint):
     except Exception as e:
         return f"Error: {str(e)}", False
 
+def call_django_job_api(session_id, message, api_endpoint, on_progress=None, max_wait=1800):
+    """
+    Submit the message as a background job and poll until it finishes, so
+    long screenings and campaigns aren't cut off by the request timeout
+    """
+    try:
+        response = requests.post(
+            urljoin(api_endpoint, "/api/jobs/"),
+            data=json.dumps({"session_id": session_id, "message": message}),
+            headers={'Content-Type': 'application/json'},
+            timeout=30
+        )
+        if response.status_code != 202:
+            return f"API Error: {response.status_code} - {response.text}", False
+        job = response.json()
+
+        deadline = time.time() + max_wait
+        while time.time() < deadline:
+            result = requests.get(urljoin(api_endpoint, job["result_url"]), timeout=30)
+            if result.status_code == 200:
+                return result.json(), True
+            if result.status_code != 202:
+                return f"Job failed: {result.status_code} - {result.text}", False
+
+            if on_progress:
+                status = requests.get(urljoin(api_endpoint, job["status_url"]), timeout=30).json()
+                on_progress(status)
+            time.sleep(float(result.headers.get("Retry-After", 2)))
+
+        return f"Job {job['job_id']} is still running - check back later.", False
+
+    except requests.exceptions.ConnectionError:
+        return "Connection Error: Could not connect to the API. Please check if your Django server is running.", False
+    except requests.exceptions.Timeout:
+        return "Timeout Error: The API request timed out.", False
+    except Exception as e:
+        return f"Error: {str(e)}", False
+
+def describe_job_progress(status):
+    """One-line progress text from a job status payload"""
+    text = f"⏳ Job {status['status']}"
+    if status.get("current_step"):
+        text += f" • {status['current_step']}"
+    progress = status.get("progress") or {}
+    if progress.get("total"):
+        text += f" • {progress.get('done') or 0}/{progress['total']}"
+    return text
+
 def create_new_chat():
     """Create a new chat session"""
     st.session_state.session_id = str(uuid.uuid4())[:8]
@@ -281,6 +334,12 @@ with st.sidebar:
     
     if api_endpoint != st.session_state.api_endpoint:
         st.session_state.api_endpoint = api_endpoint
+
+    st.session_state.run_as_job = st.checkbox(
+        "Run as background job",
+        value=st.session_state.run_as_job,
+        help="For long screenings and email campaigns: the server keeps working even if this page waits"
+    )
     
     st.markdown("---")
     st.markdown("### 📊 Session Info")
@@ -372,11 +431,21 @@ if send_button and user_input.strip():
     # Show typing indicator
     with st.spinner("🤖 AI is thinking..."):
         # Call Django API
-        api_response, success = call_django_api(
-            st.session_state.session_id,
-            user_input,
-            st.session_state.api_endpoint
-        )
+        if st.session_state.run_as_job:
+            progress_placeholder = st.empty()
+            api_response, success = call_django_job_api(
+                st.session_state.session_id,
+                user_input,
+                st.session_state.api_endpoint,
+                on_progress=lambda status: progress_placeholder.markdown(describe_job_progress(status))
+            )
+            progress_placeholder.empty()
+        else:
+            api_response, success = call_django_api(
+                st.session_state.session_id,
+                user_input,
+                st.session_state.api_endpoint
+            )
     
     if success:
         # Extract response from API (adjust based on your API response format)
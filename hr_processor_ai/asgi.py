@@ -5,6 +5,11 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
+
+The chat API views are async, so serve the project through this module to
+let one process hold many in-flight requests, e.g.:
+
+    uvicorn hr_processor_ai.asgi:application --workers 4
 """
 
 import os
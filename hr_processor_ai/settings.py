@@ -80,6 +80,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'hr_processor_ai.wsgi.application'
+ASGI_APPLICATION = 'hr_processor_ai.asgi.application'  # Preferred: chat views are async
 
 
 # Database
@@ -121,6 +122,122 @@ EMAIL_HOST_USER = os.getenv('EMAIL_USER')
 EMAIL_HOST_PASSWORD = os.getenv('EMAIL_PASS')
 DEFAULT_FROM_EMAIL = os.getenv('EMAIL_USER')
 
+# Max personalized email drafts generated in parallel during a campaign
+EMAIL_GENERATION_CONCURRENCY = int(os.getenv('EMAIL_GENERATION_CONCURRENCY', '5'))
+
+# Largest campaign that may opt in to one LLM call per candidate;
+# bigger campaigns always use a single template with per-candidate slots
+EMAIL_PERSONALIZATION_MAX_BATCH = int(os.getenv('EMAIL_PERSONALIZATION_MAX_BATCH', '10'))
+
+# "outbox": campaigns are queued and sent by `python manage.py run_outbox`
+# "direct": campaigns are sent inside the chat request
+EMAIL_DELIVERY_MODE = os.getenv('EMAIL_DELIVERY_MODE', 'outbox')
+OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', '5'))
+OUTBOX_RETRY_BASE_SECONDS = int(os.getenv('OUTBOX_RETRY_BASE_SECONDS', '30'))
+OUTBOX_RETRY_MAX_SECONDS = int(os.getenv('OUTBOX_RETRY_MAX_SECONDS', '3600'))
+OUTBOX_SENDING_TIMEOUT_SECONDS = int(os.getenv('OUTBOX_SENDING_TIMEOUT_SECONDS', '600'))
+# Whether `run_outbox` runs for this deployment: in "direct" mode, sends past
+# the rate limit are handed to it only when it does, else reported as not sent
+OUTBOX_WORKER_ENABLED = os.getenv(
+    'OUTBOX_WORKER_ENABLED', 'true' if EMAIL_DELIVERY_MODE == 'outbox' else 'false'
+).lower() == 'true'
+
+# Token-bucket limits per mail provider, shared by all processes via the database.
+# The provider is derived from EMAIL_HOST (smtp.gmail.com -> gmail).
+EMAIL_RATE_LIMITS = {
+    'gmail': {'per_second': 1, 'per_minute': 20, 'per_day': 500},
+    'outlook': {'per_second': 1, 'per_minute': 30, 'per_day': 10000},
+    'default': {'per_second': 5, 'per_minute': 100, 'per_day': 10000},
+}
+# Longest a sender blocks for a slot before giving up / deferring
+EMAIL_RATE_LIMIT_MAX_WAIT_SECONDS = int(os.getenv('EMAIL_RATE_LIMIT_MAX_WAIT_SECONDS', '60'))
+
+# SMTP sessions kept open by the async email backend (async_mailer.AsyncEmailBackend)
+EMAIL_ASYNC_MAX_CONNECTIONS = int(os.getenv('EMAIL_ASYNC_MAX_CONNECTIONS', '3'))
+
+
+# Conversation memory: messages kept in each LangGraph checkpoint (older turns
+# are carried by the rolling summary), and how long to wait before retrying
+# an unreachable Postgres checkpointer
+MAX_HISTORY_MESSAGES = int(os.getenv('MAX_HISTORY_MESSAGES', '20'))
+LANGGRAPH_MEMORY_RETRY_SECONDS = int(os.getenv('LANGGRAPH_MEMORY_RETRY_SECONDS', '30'))
+# Checkpointer backend: 'postgres' (falls back to the local saver while the
+# database is down) or 'memory'; the local saver keeps this many threads (LRU)
+LANGGRAPH_CHECKPOINTER = os.getenv('LANGGRAPH_CHECKPOINTER', 'postgres')
+LANGGRAPH_LOCAL_MAX_THREADS = int(os.getenv('LANGGRAPH_LOCAL_MAX_THREADS', '1000'))
+# Build the pool, checkpointer and graph when a server worker starts (apps.py)
+LANGGRAPH_WARM_UP = os.getenv('LANGGRAPH_WARM_UP', 'true').lower() == 'true'
+
+# Local intent routing: keyword patterns plus a naive Bayes model trained on
+# logged LLM routing decisions; below the threshold the LLM router decides
+INTENT_ROUTER_THRESHOLD = float(os.getenv('INTENT_ROUTER_THRESHOLD', '0.9'))
+INTENT_MODEL_MIN_EXAMPLES = int(os.getenv('INTENT_MODEL_MIN_EXAMPLES', '20'))
+INTENT_MODEL_MAX_EXAMPLES = int(os.getenv('INTENT_MODEL_MAX_EXAMPLES', '2000'))
+INTENT_MODEL_REFRESH_SECONDS = int(os.getenv('INTENT_MODEL_REFRESH_SECONDS', '300'))
+
+# Duplicate chat requests: identical in-flight (session, message) requests
+# share one run, and its result answers repeats for this many seconds
+ANALYZE_RESULT_CACHE_SECONDS = int(os.getenv('ANALYZE_RESULT_CACHE_SECONDS', '10'))
+
+# Admission control for graph runs started by /api/analyze/ (and its stream):
+# runs beyond the global / per-session limits queue up to ADMISSION_MAX_QUEUE,
+# then get 429 with Retry-After. Keep the global limit below the Postgres
+# checkpointer pool size (10).
+ADMISSION_MAX_CONCURRENT = int(os.getenv('ADMISSION_MAX_CONCURRENT', '8'))
+ADMISSION_MAX_PER_SESSION = int(os.getenv('ADMISSION_MAX_PER_SESSION', '2'))
+ADMISSION_MAX_QUEUE = int(os.getenv('ADMISSION_MAX_QUEUE', '50'))
+ADMISSION_QUEUE_TIMEOUT_SECONDS = float(os.getenv('ADMISSION_QUEUE_TIMEOUT_SECONDS', '30'))
+
+# LLM gateway (llm_gateway.py): every LLM call goes through it. Model and
+# temperature per call site (node) override the defaults via LLM_NODE_MODELS,
+# which may also set "timeout" and "priority" per node.
+LLM_DEFAULT_MODEL = os.getenv('LLM_DEFAULT_MODEL', 'models/gemini-2.0-flash')
+LLM_DEFAULT_TEMPERATURE = float(os.getenv('LLM_DEFAULT_TEMPERATURE', '0.7'))
+LLM_NODE_MODELS = {
+    # Lower temperature for consistent memory processing
+    'memory_context': {'temperature': 0.3},
+    'rolling_summary': {'temperature': 0.3},
+}
+LLM_TIMEOUT_SECONDS = float(os.getenv('LLM_TIMEOUT_SECONDS', '30'))
+# Retries on timeouts, 429 and 5xx, with full-jitter exponential backoff
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', '3'))
+LLM_RETRY_BASE_SECONDS = float(os.getenv('LLM_RETRY_BASE_SECONDS', '1'))
+LLM_RETRY_MAX_SECONDS = float(os.getenv('LLM_RETRY_MAX_SECONDS', '20'))
+
+# Response cache for call sites that opt in (llm_gateway cache=True):
+# entries live in the database, expire after the TTL and beyond
+# LLM_CACHE_MAX_ENTRIES the least recently used go (checked every N stores)
+LLM_CACHE_ENABLED = os.getenv('LLM_CACHE_ENABLED', 'true').lower() == 'true'
+LLM_CACHE_TTL_SECONDS = int(os.getenv('LLM_CACHE_TTL_SECONDS', '86400'))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv('LLM_CACHE_MAX_ENTRIES', '5000'))
+LLM_CACHE_EVICT_EVERY = int(os.getenv('LLM_CACHE_EVICT_EVERY', '50'))
+
+# LLM scheduler: calls in flight at once across the shared Gemini quota, slots
+# only interactive chat replies may use, and weighted fair queuing weights
+LLM_MAX_CONCURRENT_CALLS = int(os.getenv('LLM_MAX_CONCURRENT_CALLS', '8'))
+LLM_RESERVED_INTERACTIVE_CALLS = int(os.getenv('LLM_RESERVED_INTERACTIVE_CALLS', '2'))
+LLM_PRIORITY_WEIGHTS = {
+    'interactive': 8,
+    'routing': 4,
+    'bulk_screening': 2,
+    'bulk_generation': 1,
+}
+
+# Background jobs (/api/jobs/, run by `python manage.py run_agent_jobs`): a running
+# job heartbeats every third of the timeout; one silent for longer (its worker
+# died) is requeued until it used its attempts
+AGENT_JOB_MAX_ATTEMPTS = int(os.getenv('AGENT_JOB_MAX_ATTEMPTS', '2'))
+AGENT_JOB_RUNNING_TIMEOUT_SECONDS = int(os.getenv('AGENT_JOB_RUNNING_TIMEOUT_SECONDS', '1800'))
+AGENT_JOB_PROGRESS_FLUSH_SECONDS = float(os.getenv('AGENT_JOB_PROGRESS_FLUSH_SECONDS', '1'))
+AGENT_JOB_MAX_EVENTS = int(os.getenv('AGENT_JOB_MAX_EVENTS', '200'))
+
+# Semantic retrieval over each thread's full history (hashed bag-of-words index);
+# each turn scores at most SCAN_LIMIT of the newest snippets sharing a term with it
+SEMANTIC_MEMORY_TOP_K = int(os.getenv('SEMANTIC_MEMORY_TOP_K', '4'))
+SEMANTIC_MEMORY_MIN_SCORE = float(os.getenv('SEMANTIC_MEMORY_MIN_SCORE', '0.15'))
+SEMANTIC_MEMORY_MAX_SNIPPETS = int(os.getenv('SEMANTIC_MEMORY_MAX_SNIPPETS', '500'))
+SEMANTIC_MEMORY_SCAN_LIMIT = int(os.getenv('SEMANTIC_MEMORY_SCAN_LIMIT', '200'))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -0,0 +1,172 @@
+import math
+import time
+import asyncio
+import logging
+from collections import defaultdict, deque
+from contextlib import asynccontextmanager
+from django.conf import settings
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+queue_wait_seconds = registry.histogram(
+    "admission_queue_wait_seconds", "Time graph runs waited for an admission slot"
+)
+rejected_total = registry.counter(
+    "admission_rejected_total", "Graph runs turned away by admission control, by reason"
+)
+active_runs = registry.gauge("admission_active_runs", "Graph runs currently admitted")
+queued_runs = registry.gauge("admission_queued_runs", "Graph runs waiting for an admission slot")
+
+
+class AdmissionRejected(Exception):
+    """Raised when a run can't be admitted; the view answers 429 with Retry-After"""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"Server busy ({reason}), retry in {retry_after}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class Slot:
+    """An admitted run. release() is idempotent and safe from any thread."""
+
+    def __init__(self, controller, session_id: str, loop):
+        self.controller = controller
+        self.session_id = session_id
+        self.loop = loop
+        self.started = time.monotonic()
+        self._released = False
+
+    def release(self):
+        if self._released:
+            return
+        self._released = True
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop:
+            self.controller._release(self)
+        else:
+            self.loop.call_soon_threadsafe(self.controller._release, self)
+
+
+class AdmissionController:
+    """
+    Bounds concurrent graph runs globally and per session. Runs over either
+    limit wait in one FIFO queue (a waiter whose session is at its limit
+    doesn't block the ones behind it); when the queue is full, or a waiter
+    times out, the run is rejected with a Retry-After estimate.
+
+    Loop-confined - use it from one event loop only (the runtime loop).
+    """
+
+    def __init__(self, max_concurrent: int = 8, max_per_session: int = 2,
+                 max_queue: int = 50, queue_timeout: float = 30):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_per_session = max(1, max_per_session)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.per_session = defaultdict(int)
+        self._waiters = deque()  # (session_id, future)
+        self._avg_run_seconds = 5.0  # EWMA, seeds Retry-After before any run finished
+
+    def _has_capacity(self, session_id: str) -> bool:
+        return self.active < self.max_concurrent and self.per_session.get(session_id, 0) < self.max_per_session
+
+    def _admit(self, session_id: str) -> Slot:
+        self.active += 1
+        self.per_session[session_id] += 1
+        active_runs.set(self.active)
+        return Slot(self, session_id, asyncio.get_running_loop())
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely free: queued work spread over the slots"""
+        backlog = (len(self._waiters) + 1) / self.max_concurrent
+        return max(1, math.ceil(self._avg_run_seconds * backlog))
+
+    def _reject(self, reason: str):
+        rejected_total.inc(reason=reason)
+        logger.warning(f"🚦 Rejected graph run: {reason}")
+        raise AdmissionRejected(reason, self.retry_after())
+
+    async def acquire(self, session_id: str) -> Slot:
+        # Anyone still queued is blocked by their own session's limit
+        if self._has_capacity(session_id):
+            queue_wait_seconds.observe(0.0)
+            return self._admit(session_id)
+
+        if len(self._waiters) >= self.max_queue:
+            self._reject("queue_full")
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (session_id, future)
+        self._waiters.append(entry)
+        queued_runs.set(len(self._waiters))
+        started = time.monotonic()
+        try:
+            # The slot is handed over by _wake_waiters (result set = admitted)
+            return await asyncio.wait_for(asyncio.shield(future), self.queue_timeout)
+        except asyncio.TimeoutError:
+            if future.done() and not future.cancelled():
+                return future.result()  # admitted just as the wait timed out
+            future.cancel()
+            self._reject("queue_timeout")
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                future.result().release()
+            future.cancel()
+            raise
+        finally:
+            if entry in self._waiters:
+                self._waiters.remove(entry)
+            queued_runs.set(len(self._waiters))
+            queue_wait_seconds.observe(time.monotonic() - started)
+
+    def _release(self, slot: Slot):
+        self.active -= 1
+        self.per_session[slot.session_id] -= 1
+        if not self.per_session[slot.session_id]:
+            del self.per_session[slot.session_id]
+        duration = time.monotonic() - slot.started
+        self._avg_run_seconds = 0.8 * self._avg_run_seconds + 0.2 * duration
+        active_runs.set(self.active)
+        self._wake_waiters()
+
+    def _wake_waiters(self):
+        for entry in list(self._waiters):
+            if self.active >= self.max_concurrent:
+                break
+            session_id, future = entry
+            if future.done():
+                self._waiters.remove(entry)
+            elif self._has_capacity(session_id):
+                self._waiters.remove(entry)
+                future.set_result(self._admit(session_id))
+        queued_runs.set(len(self._waiters))
+
+    @asynccontextmanager
+    async def admit(self, session_id: str):
+        slot = await self.acquire(session_id)
+        try:
+            yield slot
+        finally:
+            slot.release()
+
+
+_controller = None
+
+
+def get_admission_controller() -> AdmissionController:
+    """Process-wide controller for graph runs started by the chat endpoints"""
+    global _controller
+    if _controller is None:
+        _controller = AdmissionController(
+            max_concurrent=getattr(settings, "ADMISSION_MAX_CONCURRENT", 8),
+            max_per_session=getattr(settings, "ADMISSION_MAX_PER_SESSION", 2),
+            max_queue=getattr(settings, "ADMISSION_MAX_QUEUE", 50),
+            queue_timeout=getattr(settings, "ADMISSION_QUEUE_TIMEOUT_SECONDS", 30),
+        )
+    return _controller
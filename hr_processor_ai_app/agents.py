@@ -8,10 +8,14 @@ from datetime import datetime
 from dotenv import load_dotenv
 from typing import TypedDict, NotRequired
 from django.utils import timezone
-from langchain_google_genai import ChatGoogleGenerativeAI
+import asyncio
 import logging
+from .async_runtime import db_sync_to_async
 from .utils import email_fetcher,screen_and_summarize_applications
-from .memory_utils import extract_memory_context
+from .memory_utils import get_memory_context, _parse_json_response
+from .intent_router import classify_intent, record_decision
+from .streaming import emit_event
+from . import llm_gateway
 
 import logging
 
@@ -19,35 +23,58 @@ logger = logging.getLogger(__name__)
 
 load_dotenv()
 
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
-llm = ChatGoogleGenerativeAI(
-    model="models/gemini-2.0-flash",
-    temperature=0.7,
-    google_api_key=GEMINI_API_KEY
-)
+async def memory_context_agent(state: AgentState) -> AgentState:
+    """
+    Entry node: load conversation context once per turn and store it in
+    state, so every downstream agent reuses it instead of re-extracting.
+    Reads the thread's rolling summary, which is updated after each response.
+    """
+    message = state["message"]
+    history_messages = state.get("messages", [])
+    thread_id = state.get("thread_id") or state.get("session_id")
+
+    # Database read (and, for old threads, an LLM call) - run it off the event loop
+    memory_data = await db_sync_to_async(get_memory_context)(thread_id, history_messages, message)
+
+    return {
+        **state,
+        "memory_context": memory_data.get("memory_context", ""),
+        "conversation_summary": memory_data.get("conversation_summary", ""),
+        "user_preferences": memory_data.get("user_preferences", {}),
+        "previous_actions": memory_data.get("previous_actions", []),
+        "session_type": memory_data.get("session_type", "general"),
+        "retrieved_context": memory_data.get("retrieved_context", ""),
+        "current_agent": "memory_context_agent"
+    }
 
-def user_msg_general_agent(state: AgentState) -> AgentState:
+
+async def user_msg_general_agent(state: AgentState) -> AgentState:
     """Agent: answer to general query"""
     message = state["message"]
     try:
        
-        history_messages = state.get("messages", [])
-
-        memory_data = extract_memory_context(history_messages, message)
+        # Context computed once per turn by memory_context_agent
+        conversation_summary = state.get("conversation_summary") or ""
+        user_preferences = state.get("user_preferences") or {}
+        previous_actions = state.get("previous_actions") or []
+        retrieved_context = state.get("retrieved_context") or ""
 
         messages = [
             SystemMessage(
                 content=f"""You are a general-purpose AI assistant.
 
 CONVERSATION CONTEXT:
-{memory_data['conversation_summary']}
+{conversation_summary}
 
 USER PREFERENCES:
-{json.dumps(memory_data['user_preferences'], indent=2)}
+{json.dumps(user_preferences, indent=2)}
 
 PREVIOUS ACTIONS IN THIS SESSION:
-{', '.join(memory_data['previous_actions'])}
+{', '.join(previous_actions)}
+
+RELEVANT EARLIER MESSAGES:
+{retrieved_context}
 
 Current task: Your task is to understand and directly answer any user query to the best of your ability. Use clear, accurate, and concise language. You can handle questions across a wide range of topics, including but not limited to:
 
@@ -67,7 +94,7 @@ Respond with a clear and complete answer to the query above.
             HumanMessage(content=message),
         ]
 
-        llm_response = llm.invoke(messages)
+        llm_response = await llm_gateway.ainvoke(messages, node="general")
         response = llm_response.content.strip()
 
         print(f"Analyzer Agent Response: {response}")
@@ -89,22 +116,21 @@ Respond with a clear and complete answer to the query above.
 
 
 
-def user_msg_analyzer_agent(state: AgentState) -> AgentState:
+async def user_msg_analyzer_agent(state: AgentState) -> AgentState:
     """Agent 1: Analyzes if input is email or general query"""
     message = state["message"]
-    history_messages = state.get("messages", [])
-
-    memory_data = extract_memory_context(history_messages, message)
+    conversation_summary = state.get("conversation_summary") or ""
+    user_preferences = state.get("user_preferences") or {}
 
 
     messages = [
         SystemMessage(
             content=f"""You are a classification agent.
             CONVERSATION CONTEXT:
-{memory_data['conversation_summary']}
+{conversation_summary}
 
 USER PREFERENCES:
-{json.dumps(memory_data['user_preferences'], indent=2)}
+{json.dumps(user_preferences, indent=2)}
 
 
 
@@ -128,7 +154,7 @@ Respond with ONLY one lowercase word: hr_email_taskupdate or general.
         HumanMessage(content=message),
     ]
 
-    response = llm.invoke(messages).content.strip().lower()
+    response = (await llm_gateway.ainvoke(messages, node="analyzer", cache=True)).content.strip().lower()
     print(f"Analyzer Agent Response: {response}")
 
     return {
@@ -137,7 +163,7 @@ Respond with ONLY one lowercase word: hr_email_taskupdate or general.
         "current_agent": "analyzer"
     }
 
-def task_assigner_agent(state: dict) -> dict:
+async def task_assigner_agent(state: dict) -> dict:
     """Agent 2: Assigns the next agent based on message intent (task classification)"""
 
     message = state["message"]
@@ -194,7 +220,7 @@ email_fetcher&responder_agent, job_applications_emails_summary_agent, job_applic
         HumanMessage(content=message),
     ]
 
-    response = llm.invoke(messages).content.strip().lower()
+    response = (await llm_gateway.ainvoke(messages, node="task_assigner", cache=True)).content.strip().lower()
     print(f"Task Assigner Agent Response: {response}")
 
     return {
@@ -205,7 +231,138 @@ email_fetcher&responder_agent, job_applications_emails_summary_agent, job_applic
 
 
 
-def email_fetcher_responder_agent(state: AgentState) -> AgentState:
+ROUTER_CLASSIFICATIONS = ("hr_email_taskupdate", "general")
+ROUTER_TASKS = (
+    "email_fetcher&responder_agent",
+    "job_applications_emails_summary_agent",
+    "job_application_screening_agent",
+    "email_team_agent",
+    "other",
+)
+ROUTER_TARGET_KEYS = ("wrong application", "skill mismatch", "skill match")
+
+
+async def router_agent(state: AgentState) -> AgentState:
+    """
+    Single routing call: decides hr vs general, picks the task agent and
+    extracts the email target in one structured LLM response, replacing the
+    analyzer -> task assigner round trips. Falls back to the two-step agents
+    if the response can't be parsed. Messages the local intent router is
+    confident about skip the LLM entirely.
+    """
+    message = state["message"]
+
+    local_route = await db_sync_to_async(classify_intent)(message)
+    if local_route is not None:
+        route, confidence, source = local_route
+        await db_sync_to_async(record_decision)(message, route, source, confidence)
+        print(f"Router ({source}, {confidence:.2f}): {route['classification']} / {route['task_classification']} / {route['target_key']}")
+        return {**state, "planned_tasks": [], **route, "current_agent": "router"}
+
+    memory_context = state.get("memory_context") or ""
+    conversation_summary = state.get("conversation_summary") or ""
+    user_preferences = state.get("user_preferences") or {}
+
+    messages = [
+        SystemMessage(
+            content=f"""You are the routing agent of an HR email assistant.
+
+CONVERSATION CONTEXT:
+{conversation_summary}
+
+MEMORY CONTEXT:
+{memory_context}
+
+USER PREFERENCES:
+{json.dumps(user_preferences, indent=2)}
+
+Classify the user's message and return ONLY JSON with these fields:
+{{
+    "classification": "hr_email_taskupdate" or "general",
+    "task_classification": one of "email_fetcher&responder_agent", "job_applications_emails_summary_agent", "job_application_screening_agent", "email_team_agent", "other",
+    "target_key": one of "wrong application", "skill mismatch", "skill match", or null,
+    "tasks": list of task_classification values, in the order asked, when the message asks for several HR tasks at once; otherwise []
+}}
+
+classification:
+- hr_email_taskupdate – reading, summarizing, replying to or sending emails, or HR tasks (recruitment, screening, leave, employee communication)
+- general – anything else; then task_classification is "other"
+
+task_classification (only for hr_email_taskupdate):
+- email_fetcher&responder_agent – fetch, show, summarize or reply to emails
+- job_applications_emails_summary_agent – analyze or summarize job application emails
+- job_application_screening_agent – screen or shortlist applications against a job description
+- email_team_agent – send emails to candidates (rejection, acceptance, wrong application)
+- other – none of the above
+
+target_key (only for email_team_agent, otherwise null):
+- wrong application – candidates who applied for the wrong role
+- skill mismatch – rejected candidates
+- skill match – shortlisted candidates
+
+tasks (compound requests only), e.g. "fetch new mail, summarize job applications and screen them for this JD"
+-> ["email_fetcher&responder_agent", "job_applications_emails_summary_agent", "job_application_screening_agent"]
+"""
+        ),
+        HumanMessage(content=message),
+    ]
+
+    try:
+        llm_response = await llm_gateway.ainvoke(messages, node="router", cache=True)
+        cached = bool(llm_response.response_metadata.get("cached"))
+        route = _parse_json_response(llm_response.content.strip())
+
+        classification = str(route.get("classification", "")).strip().lower()
+        task = str(route.get("task_classification") or "other").strip().lower()
+        target_key = route.get("target_key")
+        target_key = str(target_key).strip().lower() if target_key else None
+
+        if classification not in ROUTER_CLASSIFICATIONS:
+            raise ValueError(f"unknown classification '{classification}'")
+        if task not in ROUTER_TASKS:
+            task = "other"
+        if target_key not in ROUTER_TARGET_KEYS:
+            target_key = None
+
+        planned_tasks = []
+        for planned in route.get("tasks") or []:
+            planned = str(planned).strip().lower()
+            if planned in ROUTER_TASKS and planned != "other" and planned not in planned_tasks:
+                planned_tasks.append(planned)
+        if classification != "hr_email_taskupdate" or len(planned_tasks) < 2:
+            planned_tasks = []
+
+    except Exception as e:
+        logger.warning(f"⚠️ Router response unusable ({e}), falling back to two-step routing")
+        state = await user_msg_analyzer_agent(state)
+        if state.get("classification") == "hr_email_taskupdate":
+            state = await task_assigner_agent(state)
+        await db_sync_to_async(record_decision)(message, {
+            "classification": state.get("classification", ""),
+            "task_classification": state.get("task_classification") or "other",
+            "target_key": None,
+        }, "llm")
+        # The two-step agents don't extract a target: clear the one checkpointed
+        # from an earlier turn so the email team identifies this turn's target
+        return {**state, "target_key": None, "planned_tasks": [], "current_agent": "router"}
+
+    print(f"Router Agent Response: {classification} / {task} / {target_key} / {planned_tasks}")
+
+    route = {
+        "classification": classification,
+        "task_classification": task if classification == "hr_email_taskupdate" else "other",
+        "target_key": target_key,
+        "planned_tasks": planned_tasks,
+    }
+    # LLM decisions are the training data for the local intent model; a cached
+    # answer was logged when it was first made, so it isn't counted again
+    if not cached:
+        await db_sync_to_async(record_decision)(message, route, "llm")
+
+    return {**state, **route, "current_agent": "router"}
+
+
+async def email_fetcher_responder_agent(state: AgentState) -> AgentState:
     session_id = state.get("session_id")
     user_message = state.get("message")
    
@@ -213,7 +370,7 @@ def email_fetcher_responder_agent(state: AgentState) -> AgentState:
     user_preferences = state.get("user_preferences", {})
 
     # Step 1: Fetch emails via utils
-    email_data = email_fetcher(session_id=session_id)
+    email_data = await email_fetcher(session_id=session_id)
 
     # Step 2: Prepare prompt
     system_prompt = f"""
@@ -244,7 +401,7 @@ Respond with a brief, useful summary.
     ]
 
     # Step 3: Call LLM
-    response = llm.invoke(messages)
+    response = await llm_gateway.ainvoke(messages, node="email_responder")
     ai_response = response.content.strip()
 
     # Step 4: Return updated AgentState
@@ -257,7 +414,7 @@ Respond with a brief, useful summary.
     }
 
 
-def job_applications_emails_summary_agent(state: AgentState) -> AgentState:
+async def job_applications_emails_summary_agent(state: AgentState) -> AgentState:
     from .utils import get_job_application_emails_as_json
     from langchain_core.messages import SystemMessage, HumanMessage
 
@@ -266,7 +423,7 @@ def job_applications_emails_summary_agent(state: AgentState) -> AgentState:
     
 
 
-    job_emails = get_job_application_emails_as_json(session_id)
+    job_emails = await db_sync_to_async(get_job_application_emails_as_json)(session_id)
 
     if not job_emails:
         return {
@@ -300,7 +457,7 @@ Emails:
         HumanMessage(content=prompt)
     ]
 
-    summary = llm.invoke(messages).content.strip()
+    summary = (await llm_gateway.ainvoke(messages, node="job_summary", cache=True)).content.strip()
 
     return {
         **state,
@@ -309,7 +466,7 @@ Emails:
     }
 
 
-def job_application_screening_agent(state: AgentState) -> AgentState:
+async def job_application_screening_agent(state: AgentState) -> AgentState:
     """
     Agent: Screens job application emails + resumes using job description in the user message.
     """
@@ -317,18 +474,24 @@ def job_application_screening_agent(state: AgentState) -> AgentState:
     job_description = state["message"]
 
     try:
-        result = screen_and_summarize_applications(session_id=session_id, job_descr=job_description)
+        result = await screen_and_summarize_applications(session_id=session_id, job_descr=job_description)
         final_summary = result.get("final_summary", "")
+        verdicts = [
+            {key: verdict[key] for key in ("candidate", "screening_status", "reason")}
+            for verdict in result.get("individual_results", [])
+        ]
     except Exception as e:
         final_summary = f"Error during screening: {str(e)}"
+        verdicts = []
 
     return {
         **state,
         "ai_response": final_summary,
+        "screening_results": verdicts,
         "current_agent": "job_application_screening_agent",
     }
 
-def email_team_agent(state: AgentState) -> AgentState:
+async def email_team_agent(state: AgentState) -> AgentState:
     """
     Email Team Agent - Handles sending emails to candidates based on screening results
     """
@@ -339,17 +502,27 @@ def email_team_agent(state: AgentState) -> AgentState:
     
     print(f"🚀 Email Team Agent called with message: {user_message}")
     
-    # Call the main email team agent function
-    result = email_team_main_agent(session_id, user_message)
+    # Call the main email team agent function (target already picked by the router)
+    result = await email_team_main_agent(session_id, user_message, target_key=state.get("target_key"))
     
     # Format response for user
     if result["success"]:
+        if result.get("delivery_mode") == "outbox":
+            delivery_line = f"- Queued: {result['emails_queued']} emails (skipped {result['emails_skipped']} already emailed)"
+        else:
+            delivery_line = f"- Sent: {result['emails_sent']} emails"
+            if result.get("emails_queued"):
+                delivery_line += f"\n- Queued: {result['emails_queued']} emails (rate limit reached, sent later by the outbox)"
+            if result.get("emails_rate_limited"):
+                delivery_line += f"\n- Rate-limited: {result['emails_rate_limited']} emails not sent, retry later"
+            if result.get("emails_skipped"):
+                delivery_line += f"\n- Skipped: {result['emails_skipped']} already emailed"
         ai_response = f"""✅ {result['message']}
 
 📊 Summary:
 - Target: {result['target_key']} candidates
 - Found: {result['candidates_found']} candidates
-- Sent: {result['emails_sent']} emails
+{delivery_line}
 - Failed: {result['emails_failed']} emails
 
 🎯 Suggested Next Tasks:
@@ -366,5 +539,80 @@ def email_team_agent(state: AgentState) -> AgentState:
         "current_agent": "email_team_agent",
         "email_results": result
     }
-        
 
+
+TASK_AGENTS = {
+    "email_fetcher&responder_agent": email_fetcher_responder_agent,
+    "job_applications_emails_summary_agent": job_applications_emails_summary_agent,
+    "job_application_screening_agent": job_application_screening_agent,
+    "email_team_agent": email_team_agent,
+}
+
+TASK_TITLES = {
+    "email_fetcher&responder_agent": "📥 Latest emails",
+    "job_applications_emails_summary_agent": "📄 Job applications",
+    "job_application_screening_agent": "🔍 Screening",
+    "email_team_agent": "📧 Candidate emails",
+}
+
+# A task waits for these when they are part of the same plan: summaries and
+# screening read the emails the fetcher stores, campaigns read screening results
+TASK_DEPENDENCIES = {
+    "job_applications_emails_summary_agent": ["email_fetcher&responder_agent"],
+    "job_application_screening_agent": ["email_fetcher&responder_agent"],
+    "email_team_agent": ["job_application_screening_agent"],
+}
+
+
+def plan_task_levels(tasks: list) -> list:
+    """Group planned tasks into levels; tasks in one level don't depend on each other"""
+    remaining = list(tasks)
+    done = set()
+    levels = []
+    while remaining:
+        level = [
+            task for task in remaining
+            if all(dep in done or dep not in tasks for dep in TASK_DEPENDENCIES.get(task, []))
+        ]
+        levels.append(level)
+        done.update(level)
+        remaining = [task for task in remaining if task not in level]
+    return levels
+
+
+async def task_planner_agent(state: AgentState) -> AgentState:
+    """
+    Compound requests: run every planned task in one turn. Independent tasks
+    run concurrently, dependent ones after what they need, and the results
+    are joined into a single response.
+    """
+    tasks = [task for task in state.get("planned_tasks") or [] if task in TASK_AGENTS]
+    merged = dict(state)
+    task_results = {}
+
+    for level in plan_task_levels(tasks):
+        emit_event("plan_level", tasks=level)
+        outputs = await asyncio.gather(
+            *(TASK_AGENTS[task]({**merged, "task_classification": task}) for task in level),
+            return_exceptions=True,
+        )
+        for task, output in zip(level, outputs):
+            if isinstance(output, Exception):
+                logger.error(f"❌ Planned task {task} failed: {output}")
+                task_results[task] = f"Error: {output}"
+                continue
+            task_results[task] = output.get("ai_response") or ""
+            # Later levels see what earlier ones produced (fetched emails, campaign results...)
+            merged.update({
+                key: value for key, value in output.items()
+                if key not in ("ai_response", "current_agent", "task_classification", "messages")
+            })
+
+    ai_response = "\n\n".join(f"{TASK_TITLES[task]}\n{task_results[task]}" for task in tasks)
+
+    return {
+        **merged,
+        "ai_response": ai_response,
+        "task_results": task_results,
+        "current_agent": "task_planner_agent"
+    }
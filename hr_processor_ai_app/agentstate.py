@@ -1,8 +1,22 @@
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage, BaseMessage
+from langgraph.graph.message import add_messages
+from django.conf import settings
 from typing import TypedDict, NotRequired, Optional, Dict, List, Sequence, Annotated
 import operator
 
 
+def window_messages(left: Sequence[BaseMessage], right: Sequence[BaseMessage]) -> List[BaseMessage]:
+    """
+    Reducer for AgentState.messages: merge by message id (nodes hand back the
+    whole state, so the same messages arrive again) and keep only the last
+    MAX_HISTORY_MESSAGES. Older turns live on in the rolling conversation
+    summary, so checkpoint size stays flat however long the session runs.
+    """
+    merged = add_messages(left, right)
+    limit = getattr(settings, "MAX_HISTORY_MESSAGES", 20)
+    return merged[-limit:]
+
+
 
 class AgentState(TypedDict):
     # Existing fields
@@ -18,13 +32,19 @@ class AgentState(TypedDict):
     target_key: Optional[str]
     candidates_found: Optional[int]
     emails_sent: Optional[int]
+    screening_results: Optional[List[Dict]]  # Verdicts of this turn's screening
     
     # Memory-related fields
-    messages: Annotated[Sequence[BaseMessage], operator.add]
+    messages: Annotated[Sequence[BaseMessage], window_messages]
     thread_id: Optional[str]
     memory_context: Optional[str]  # NEW: Formatted memory context
     conversation_summary: Optional[str]  # NEW: LLM-generated summary
     user_preferences: Optional[Dict]  # NEW: User preferences from history
+    previous_actions: Optional[List[str]]  # Actions completed earlier in the session
+    session_type: Optional[str]  # screening / emailing / general
+    retrieved_context: Optional[str]  # Earlier snippets retrieved for this message
+    planned_tasks: Optional[List[str]]  # Task agents of a compound request, in order
+    task_results: Optional[Dict]  # Per-task responses of a compound request
 
 
 # class AgentState(TypedDict):
@@ -1,6 +1,31 @@
+import os
+import sys
 from django.apps import AppConfig
+from django.conf import settings
+
+# Programs that serve requests; anything else (manage.py commands, tests,
+# shells, workers) has no use for a warm graph
+SERVER_PROGRAMS = ("gunicorn", "uvicorn", "daphne", "hypercorn", "uwsgi")
+
+
+def is_server_process() -> bool:
+    """True in web server workers and in runserver's serving child process"""
+    argv = sys.argv or [""]
+    if any(name in os.path.basename(argv[0]).lower() or f"{name}{os.sep}" in argv[0].lower()
+           for name in SERVER_PROGRAMS):
+        return True
+    # With autoreload, only the child process (RUN_MAIN set) serves requests
+    return argv[1:2] == ["runserver"] and (os.environ.get("RUN_MAIN") == "true" or "--noreload" in argv)
 
 
 class HrProcessorAiAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'hr_processor_ai_app'
+
+    def ready(self):
+        # Build the Postgres pool, checkpointer and compiled agent graph once
+        # per server process at startup rather than on the first request
+        if getattr(settings, "LANGGRAPH_WARM_UP", True) and is_server_process():
+            from .graph import warm_up_graph
+
+            warm_up_graph()
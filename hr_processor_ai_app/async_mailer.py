@@ -0,0 +1,139 @@
+import asyncio
+import logging
+from .async_runtime import db_sync_to_async
+from django.conf import settings
+from django.core.mail import EmailMessage
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncEmailBackend:
+    """
+    Async SMTP sender for use from async graph nodes.
+
+    Keeps up to `max_connections` SMTP sessions open and spreads messages
+    across them, so a campaign never blocks a worker thread and many sends
+    are in flight at once. Connection settings default to Django's EMAIL_*.
+
+    Usage:
+        async with AsyncEmailBackend() as backend:
+            sent = await backend.send_messages(messages)
+    """
+
+    def __init__(self, host=None, port=None, username=None, password=None,
+                 use_tls=None, timeout=None, max_connections=None):
+        import aiosmtplib  # Optional dependency, only needed for the async path
+
+        self._smtp_class = aiosmtplib.SMTP
+        self._disconnected_errors = (aiosmtplib.SMTPServerDisconnected, ConnectionError)
+        self.host = host if host is not None else settings.EMAIL_HOST
+        self.port = port if port is not None else settings.EMAIL_PORT
+        self.username = username if username is not None else settings.EMAIL_HOST_USER
+        self.password = password if password is not None else settings.EMAIL_HOST_PASSWORD
+        self.use_tls = use_tls if use_tls is not None else settings.EMAIL_USE_TLS
+        self.timeout = timeout if timeout is not None else getattr(settings, "EMAIL_TIMEOUT", None) or 60
+        self.max_connections = max(1, max_connections or getattr(settings, "EMAIL_ASYNC_MAX_CONNECTIONS", 3))
+
+        self._idle = asyncio.Queue()
+        self._connections = []
+        self._create_lock = asyncio.Lock()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+        return False
+
+    async def _connect(self):
+        smtp = self._smtp_class(
+            hostname=self.host,
+            port=self.port,
+            username=self.username or None,
+            password=self.password or None,
+            start_tls=bool(self.use_tls),
+            timeout=self.timeout,
+        )
+        await smtp.connect()
+        return smtp
+
+    async def _acquire(self):
+        if not self._idle.empty():
+            return self._idle.get_nowait()
+
+        async with self._create_lock:
+            if len(self._connections) < self.max_connections:
+                smtp = await self._connect()
+                self._connections.append(smtp)
+                return smtp
+
+        # All connections busy - wait for one to be released
+        return await self._idle.get()
+
+    async def _reconnect(self, smtp):
+        try:
+            smtp.close()
+        except Exception:
+            pass
+        await smtp.connect()
+
+    async def send_message(self, message: EmailMessage) -> bool:
+        """Send one Django EmailMessage; retries once if its connection dropped"""
+        smtp = await self._acquire()
+        try:
+            mime = message.message()
+            try:
+                await smtp.send_message(mime, sender=message.from_email, recipients=message.recipients())
+            except self._disconnected_errors:
+                await self._reconnect(smtp)
+                await smtp.send_message(mime, sender=message.from_email, recipients=message.recipients())
+            return True
+        finally:
+            self._idle.put_nowait(smtp)
+
+    async def send_messages(self, email_messages) -> int:
+        """Send many messages concurrently across the pool; returns the number sent"""
+        results = await asyncio.gather(
+            *(self.send_message(message) for message in email_messages),
+            return_exceptions=True,
+        )
+        for message, result in zip(email_messages, results):
+            if isinstance(result, Exception):
+                logger.error(f"❌ Failed to send email to {message.to}: {result}")
+        return sum(1 for result in results if result is True)
+
+    async def close(self):
+        for smtp in self._connections:
+            try:
+                if smtp.is_connected:
+                    await smtp.quit()
+            except Exception:
+                smtp.close()
+        self._connections = []
+        self._idle = asyncio.Queue()
+
+
+async def asend_email_to_candidate(email: str, subject: str, body: str, backend: AsyncEmailBackend, throttle: bool = True):
+    """Async counterpart of utils.send_email_to_candidate over a shared AsyncEmailBackend"""
+    try:
+        if throttle:
+            from .rate_limiter import acquire
+
+            acquired, retry_after = await db_sync_to_async(acquire)()
+            if not acquired:
+                raise RuntimeError(f"Rate limited by provider limits, retry in {retry_after:.0f}s")
+
+        message = EmailMessage(
+            subject=subject,
+            body=body,
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            to=[email],
+        )
+        await backend.send_message(message)
+
+        print(f"📧 Email sent successfully to {email}")
+        return True
+
+    except Exception as e:
+        print(f"❌ Failed to send email to {email}: {e}")
+        return False
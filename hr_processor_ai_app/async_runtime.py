@@ -0,0 +1,65 @@
+import asyncio
+import functools
+import threading
+import logging
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+# One long-lived event loop per process. The Postgres pool, checkpointer and
+# compiled graph are bound to the loop they were created on, so every
+# request has to run its coroutines here instead of in a fresh asyncio.run().
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """Return the process-wide event loop, starting its thread on first use"""
+    global _loop
+    with _loop_lock:
+        if _loop is None or _loop.is_closed():
+            _loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=_loop.run_forever, name="hr-agent-async-runtime", daemon=True)
+            thread.start()
+            logger.info("✅ Async runtime loop started")
+        return _loop
+
+
+def submit(coro):
+    """Schedule a coroutine on the runtime loop and return a concurrent.futures.Future"""
+    return asyncio.run_coroutine_threadsafe(coro, get_loop())
+
+
+def run_sync(coro, timeout: float = None):
+    """Run a coroutine on the runtime loop and block the calling thread for its result"""
+    return submit(coro).result(timeout)
+
+
+async def run_async(coro):
+    """
+    Await a coroutine on the runtime loop from any other event loop (e.g. the
+    ASGI server's) without blocking a thread while it runs.
+    """
+    loop = get_loop()
+    if asyncio.get_running_loop() is loop:
+        return await coro
+    return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, loop))
+
+
+def db_sync_to_async(func):
+    """
+    sync_to_async for ORM work from async nodes. Calls run on the shared
+    worker pool so they don't queue behind each other, and close the pool
+    thread's connection when it's broken or past CONN_MAX_AGE, as Django
+    does between requests, so idle pool threads don't hold connections.
+    """
+    @functools.wraps(func)
+    def run(*args, **kwargs):
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+
+    return sync_to_async(run, thread_sensitive=False)
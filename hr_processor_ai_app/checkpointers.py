@@ -0,0 +1,90 @@
+import threading
+import logging
+from collections import OrderedDict
+from django.conf import settings
+from langgraph.checkpoint.memory import InMemorySaver
+
+logger = logging.getLogger(__name__)
+
+
+class LRUMemorySaver(InMemorySaver):
+    """
+    In-process checkpointer that keeps the `max_threads` most recently used
+    threads and evicts the rest. Used when Postgres is unavailable so
+    conversations keep their memory (for the life of the process) instead
+    of running stateless.
+    """
+
+    def __init__(self, max_threads: int = 1000, **kwargs):
+        super().__init__(**kwargs)
+        self.max_threads = max(1, max_threads)
+        self._recent = OrderedDict()
+        self._lru_lock = threading.Lock()
+
+    def _touch(self, config):
+        thread_id = config["configurable"]["thread_id"]
+        with self._lru_lock:
+            self._recent[thread_id] = None
+            self._recent.move_to_end(thread_id)
+            evicted = []
+            while len(self._recent) > self.max_threads:
+                evicted.append(self._recent.popitem(last=False)[0])
+
+        for old_thread_id in evicted:
+            self.delete_thread(old_thread_id)
+            logger.info(f"🧹 Evicted thread {old_thread_id} from local checkpointer")
+
+    def get_tuple(self, config):
+        checkpoint = super().get_tuple(config)
+        if checkpoint is not None:
+            self._touch(config)
+        return checkpoint
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        next_config = super().put(config, checkpoint, metadata, new_versions)
+        self._touch(config)
+        return next_config
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        super().put_writes(config, writes, task_id, task_path)
+        self._touch(config)
+
+    def delete_thread(self, thread_id):
+        super().delete_thread(thread_id)
+        with self._lru_lock:
+            self._recent.pop(thread_id, None)
+
+
+_local_checkpointer = None
+_local_lock = threading.Lock()
+
+
+def get_local_checkpointer() -> LRUMemorySaver:
+    """Process-wide local checkpointer, shared by every request"""
+    global _local_checkpointer
+    with _local_lock:
+        if _local_checkpointer is None:
+            _local_checkpointer = LRUMemorySaver(
+                max_threads=getattr(settings, "LANGGRAPH_LOCAL_MAX_THREADS", 1000)
+            )
+        return _local_checkpointer
+
+
+async def get_checkpointer():
+    """
+    Return (checkpointer, backend) for the configured LANGGRAPH_CHECKPOINTER:
+    "postgres" (default) falls back to the local LRU saver while the
+    database is unreachable; "memory" always uses the local saver.
+    """
+    from .memory_manager import memory_manager
+
+    backend = getattr(settings, "LANGGRAPH_CHECKPOINTER", "postgres")
+    if backend == "postgres":
+        memory = await memory_manager.get_memory()
+        if memory is not None:
+            return memory, "postgres"
+        logger.warning("⚠️ PostgreSQL memory unavailable, using local checkpointer")
+    elif backend != "memory":
+        logger.warning(f"⚠️ Unknown LANGGRAPH_CHECKPOINTER '{backend}', using local checkpointer")
+
+    return get_local_checkpointer(), "memory"
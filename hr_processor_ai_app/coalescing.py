@@ -0,0 +1,70 @@
+import asyncio
+import time
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+EXECUTED = "executed"
+COALESCED = "coalesced"
+CACHED = "cached"
+
+
+class SingleFlight:
+    """
+    Coalesce identical concurrent calls: the first caller starts the work,
+    later callers with the same key await that same run. Successful results
+    are kept for `ttl` seconds so immediate repeats (client retries, double
+    clicks) don't run again either.
+
+    Loop-confined - use it from one event loop only (the runtime loop).
+    """
+
+    def __init__(self, ttl: float = 10, max_entries: int = 1000, cacheable=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.cacheable = cacheable or (lambda result: True)
+        self._inflight = {}
+        self._results = OrderedDict()  # key -> (expires_at, result)
+
+    def _cached(self, key):
+        entry = self._results.get(key)
+        if entry is None:
+            return None
+        expires_at, result = entry
+        if expires_at <= time.monotonic():
+            del self._results[key]
+            return None
+        return entry
+
+    def _finish(self, key, task):
+        self._inflight.pop(key, None)
+        if task.cancelled() or task.exception() is not None or self.ttl <= 0:
+            return
+        result = task.result()
+        if not self.cacheable(result):
+            return
+        self._results[key] = (time.monotonic() + self.ttl, result)
+        self._results.move_to_end(key)
+        while len(self._results) > self.max_entries:
+            self._results.popitem(last=False)
+
+    async def run(self, key, coro_factory):
+        """Return (result, how) where how is "executed", "coalesced" or "cached" """
+        entry = self._cached(key)
+        if entry is not None:
+            return entry[1], CACHED
+
+        task = self._inflight.get(key)
+        how = COALESCED
+        if task is None:
+            # Its own task, so a caller disconnecting doesn't cancel the run
+            # the other waiters are sharing
+            task = asyncio.ensure_future(coro_factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+            how = EXECUTED
+        else:
+            logger.info(f"🔁 Coalesced duplicate request {key}")
+
+        return await asyncio.shield(task), how
@@ -1,8 +1,16 @@
 import json
+import re
+import asyncio
+from .async_runtime import db_sync_to_async
+from django.conf import settings
 from langchain_core.messages import SystemMessage, HumanMessage
-from .utils import fetch_candidates_by_target, send_email_to_candidate,llm
+from .utils import fetch_candidates_by_target, send_email_to_candidate, CampaignMailer
+from .async_mailer import AsyncEmailBackend, asend_email_to_candidate
+from .rate_limiter import acquire
+from .streaming import emit_event
+from . import llm_gateway
 
-def target_identifier_agent(user_message: str):
+async def target_identifier_agent(user_message: str):
     """
     Agent to identify target key from user message
     """
@@ -23,9 +31,9 @@ def target_identifier_agent(user_message: str):
     """
     
     try:
-        response = llm.invoke([
+        response = (await llm_gateway.ainvoke([
             HumanMessage(content=prompt)
-        ]).content.strip().lower()
+        ], node="target_identifier", cache=True)).content.strip().lower()
         
         if "wrong application" in response:
             return "wrong application"
@@ -39,7 +47,7 @@ def target_identifier_agent(user_message: str):
         return "wrong application"  # default
 
 
-def email_generator_agent(candidate_data: dict, user_message: str, target_key: str):
+async def email_generator_agent(candidate_data: dict, user_message: str, target_key: str):
     """
     Generate personalized email for individual candidate based on their full details
     """
@@ -53,7 +61,7 @@ def email_generator_agent(candidate_data: dict, user_message: str, target_key: s
     - Original Application Subject: {candidate_data['original_subject']}
     - Application Body: {candidate_data['email_body'][:500]}
     - Resume Summary: {candidate_data['resume_text'][:300]}
-    - Screening Reason: {candidate_data['reason']}
+    - Screening Reason: {candidate_facing_reason(candidate_data.get('reason')) or target_key}
     - Application Date: {candidate_data['application_date']}
     
     Generate a professional, personalized email for this specific candidate.
@@ -73,9 +81,9 @@ def email_generator_agent(candidate_data: dict, user_message: str, target_key: s
     """
     
     try:
-        response = llm.invoke([
+        response = (await llm_gateway.ainvoke([
             HumanMessage(content=prompt)
-        ]).content.strip()
+        ], node="email_generator")).content.strip()
         
         # Clean response
         if response.startswith('```'):
@@ -96,20 +104,122 @@ def email_generator_agent(candidate_data: dict, user_message: str, target_key: s
 
 
 
-def send_individual_email(candidate_data: dict, user_message: str, target_key: str):
+# Per-candidate fields a campaign template may reference as {slot}
+TEMPLATE_SLOTS = ["candidate_name", "candidate_email", "original_subject", "application_date", "reason"]
+
+# Screening reasons fit for a candidate-facing email; anything else (e.g. the
+# internal "error processing") is never put in front of a candidate
+CANDIDATE_FACING_REASONS = {"skill match", "skill mismatch", "wrong application"}
+
+
+def candidate_facing_reason(reason) -> str:
+    return reason if reason in CANDIDATE_FACING_REASONS else ""
+
+
+async def email_template_agent(user_message: str, target_key: str):
     """
-    Generate and send email to individual candidate
+    Generate ONE email template with named {slots} for a whole campaign,
+    so large campaigns cost a single LLM call instead of one per candidate
     """
+    prompt = f"""
+    User request: "{user_message}"
+    Target type: {target_key}
+    
+    Write ONE professional email template that will be sent to every {target_key} candidate.
+    
+    You may use ONLY these placeholders, written exactly with curly braces:
+    - {{candidate_name}}: the candidate's name
+    - {{original_subject}}: subject line of their original application
+    - {{application_date}}: date they applied
+    - {{reason}}: screening outcome ({target_key})
+    
+    Return ONLY JSON:
+    {{
+        "subject": "subject line (placeholders allowed)",
+        "body": "email body starting with Dear {{candidate_name}},"
+    }}
+    
+    Guidelines:
+    - For "wrong application": Mention the position they applied for does not match the opening
+    - For "skill mismatch": Be encouraging but honest about skill gaps
+    - For "skill match": Congratulate them and mention next steps
+    """
+    
     try:
-        # Generate personalized email
-        email_content = email_generator_agent(candidate_data, user_message, target_key)
+        response = (await llm_gateway.ainvoke([
+            HumanMessage(content=prompt)
+        ], node="email_template")).content.strip()
         
-        # Send email
-        success = send_email_to_candidate(
-            candidate_data["candidate_email"], 
-            email_content["subject"], 
-            email_content["body"]
-        )
+        if response.startswith('```'):
+            response = response.replace('```json', '').replace('```', '').strip()
+        
+        template = json.loads(response)
+        return {
+            "subject": template.get("subject") or "Regarding your application - {original_subject}",
+            "body": template.get("body") or "Dear {candidate_name},\n\nThank you for your application.\n\nBest regards,\nHR Team"
+        }
+        
+    except Exception as e:
+        print(f"❌ Error generating email template: {e}")
+        return {
+            "subject": "Application Update - {candidate_name}",
+            "body": "Dear {candidate_name},\n\nThank you for your application.\n\nBest regards,\nHR Team"
+        }
+
+
+def fill_email_template(template: dict, candidate_data: dict):
+    """
+    Fill a campaign template's {slots} locally from the candidate record.
+    Unknown placeholders are left untouched; {reason} stays empty unless it
+    is a candidate-facing screening reason.
+    """
+    values = {slot: str(candidate_data.get(slot) or "") for slot in TEMPLATE_SLOTS}
+    values["reason"] = candidate_facing_reason(values["reason"])
+    if values["application_date"]:
+        values["application_date"] = values["application_date"][:10]  # ISO date only
+
+    def replace(match):
+        slot = match.group(1)
+        return values[slot] if slot in values else match.group(0)
+
+    return {
+        "subject": re.sub(r"\{(\w+)\}", replace, template["subject"]),
+        "body": re.sub(r"\{(\w+)\}", replace, template["body"])
+    }
+
+
+def wants_personalized_emails(user_message: str, candidate_count: int):
+    """
+    Per-candidate LLM personalization is opt-in ("personalized" / "individual"
+    in the request) and only for batches up to EMAIL_PERSONALIZATION_MAX_BATCH
+    """
+    max_batch = getattr(settings, "EMAIL_PERSONALIZATION_MAX_BATCH", 10)
+    asked = re.search(r"\bpersonali[sz]ed?\b|\bindividual(ly)?\b", user_message, re.IGNORECASE)
+    return bool(asked) and candidate_count <= max_batch
+
+
+async def deliver_email(candidate_data: dict, email_content: dict, backend: AsyncEmailBackend = None, throttle: bool = True):
+    """
+    Send an already generated email to individual candidate over the shared
+    async SMTP backend (or the blocking sender in a worker thread without one).
+    Pass throttle=False when the caller already took a rate-limit slot.
+    """
+    try:
+        if backend is not None:
+            success = await asend_email_to_candidate(
+                candidate_data["candidate_email"],
+                email_content["subject"],
+                email_content["body"],
+                backend=backend,
+                throttle=throttle
+            )
+        else:
+            success = await db_sync_to_async(send_email_to_candidate)(
+                candidate_data["candidate_email"],
+                email_content["subject"],
+                email_content["body"],
+                throttle=throttle
+            )
         
         return {
             "candidate_name": candidate_data["candidate_name"],
@@ -129,6 +239,82 @@ def send_individual_email(candidate_data: dict, user_message: str, target_key: s
         }
 
 
+async def queue_email(session_id: str, target_key: str, candidate_data: dict, email_content: dict):
+    """
+    Put a generated email in the durable outbox instead of sending it inline.
+    Candidates already queued or emailed for this campaign are skipped.
+    """
+    from .outbox import enqueue_email
+
+    try:
+        row, status = await db_sync_to_async(enqueue_email)(
+            session_id, target_key, candidate_data, email_content
+        )
+        return {
+            "candidate_name": row.candidate_name,
+            "candidate_email": row.candidate_email,
+            "subject": row.subject,
+            "success": True,
+            "status": status,
+            "error": None
+        }
+
+    except Exception as e:
+        return {
+            "candidate_name": candidate_data.get("candidate_name", "Unknown"),
+            "candidate_email": candidate_data.get("candidate_email", "Unknown"),
+            "subject": "",
+            "success": False,
+            "status": "failed",
+            "error": str(e)
+        }
+
+
+async def send_individual_email(candidate_data: dict, user_message: str, target_key: str, backend: AsyncEmailBackend = None):
+    """
+    Generate and send email to individual candidate
+    """
+    # Generate personalized email
+    email_content = await email_generator_agent(candidate_data, user_message, target_key)
+    
+    # Send email
+    return await deliver_email(candidate_data, email_content, backend=backend)
+
+
+async def generate_drafts_concurrently(candidates_list: list, user_message: str, target_key: str, concurrency: int):
+    """
+    Stage 1 of the campaign pipeline: generate personalized drafts with at most
+    `concurrency` LLM calls in flight and yield (index, candidate, email_content)
+    as each draft completes, so the sender can start on the first draft while
+    the rest are still being written.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def generate(index, candidate):
+        async with semaphore:
+            try:
+                email_content = await email_generator_agent(candidate, user_message, target_key)
+            except Exception as e:
+                print(f"❌ Error generating email for {candidate.get('candidate_name', 'Unknown')}: {e}")
+                email_content = None
+        return index, candidate, email_content
+
+    tasks = [asyncio.create_task(generate(index, candidate)) for index, candidate in enumerate(candidates_list, 1)]
+    try:
+        for next_draft in asyncio.as_completed(tasks):
+            yield await next_draft
+    finally:
+        # Drop drafts nobody will send if the sender stops early
+        for task in tasks:
+            task.cancel()
+
+
+async def fill_template_drafts(template: dict, candidates_list: list):
+    """Template mode counterpart of generate_drafts_concurrently: slots are filled locally"""
+    for index, candidate in enumerate(candidates_list, 1):
+        yield index, candidate, fill_email_template(template, candidate)
+
+
 def email_sender_agent(candidates_json: list, email_content: dict):
     """
     Agent to send emails to all candidates
@@ -136,23 +322,25 @@ def email_sender_agent(candidates_json: list, email_content: dict):
     sent_count = 0
     failed_emails = []
     
-    for candidate in candidates_json:
-        try:
-            # Personalize email
-            personalized_body = email_content["body"].replace("{{candidate_name}}", candidate["candidate_name"])
-            
-            if send_email_to_candidate(
-                candidate["candidate_email"], 
-                email_content["subject"], 
-                personalized_body
-            ):
-                sent_count += 1
-            else:
-                failed_emails.append(candidate["candidate_email"])
+    with CampaignMailer() as mailer:
+        for candidate in candidates_json:
+            try:
+                # Personalize email
+                personalized_body = email_content["body"].replace("{{candidate_name}}", candidate["candidate_name"])
                 
-        except Exception as e:
-            print(f"❌ Error sending to {candidate.get('candidate_email', 'unknown')}: {e}")
-            failed_emails.append(candidate.get("candidate_email", "unknown"))
+                if send_email_to_candidate(
+                    candidate["candidate_email"], 
+                    email_content["subject"], 
+                    personalized_body,
+                    mailer=mailer
+                ):
+                    sent_count += 1
+                else:
+                    failed_emails.append(candidate["candidate_email"])
+                    
+            except Exception as e:
+                print(f"❌ Error sending to {candidate.get('candidate_email', 'unknown')}: {e}")
+                failed_emails.append(candidate.get("candidate_email", "unknown"))
     
     return {
         "sent_count": sent_count,
@@ -161,7 +349,7 @@ def email_sender_agent(candidates_json: list, email_content: dict):
     }
 
 
-def response_generator_agent(send_results: dict, target_key: str):
+async def response_generator_agent(send_results: dict, target_key: str):
     """
     Agent to generate final response message
     """
@@ -182,9 +370,9 @@ def response_generator_agent(send_results: dict, target_key: str):
     """
     
     try:
-        response = llm.invoke([
+        response = (await llm_gateway.ainvoke([
             HumanMessage(content=prompt)
-        ]).content.strip()
+        ], node="campaign_response")).content.strip()
         
         if response.startswith('```'):
             response = response.replace('```json', '').replace('```', '').strip()
@@ -200,19 +388,23 @@ def response_generator_agent(send_results: dict, target_key: str):
         }
 
 
-def email_team_main_agent(session_id: str, user_message: str):
+async def email_team_main_agent(session_id: str, user_message: str, personalize: bool = None, target_key: str = None):
     """
-    Main email team agent with enhanced workflow
+    Main email team agent with enhanced workflow.
+    `personalize` forces per-candidate LLM emails on/off; by default a single
+    campaign template is used unless a small batch explicitly asks for it.
+    `target_key` skips target identification when the router already did it.
     """
     print(f"🚀 Email Team Agent started for session: {session_id}")
     print(f"📝 User message: {user_message}")
     
     # Step 1: Identify target key
-    target_key = target_identifier_agent(user_message)
+    if not target_key:
+        target_key = await target_identifier_agent(user_message)
     print(f"🎯 Target identified: {target_key}")
     
     # Step 2: Fetch unique candidates with full details
-    candidates_list = fetch_candidates_by_target(session_id, target_key)
+    candidates_list = await db_sync_to_async(fetch_candidates_by_target)(session_id, target_key)
     print(f"📊 Found {len(candidates_list)} unique candidates")
     
     if not candidates_list:
@@ -227,52 +419,182 @@ def email_team_main_agent(session_id: str, user_message: str):
             "detailed_results": []
         }
     
-    # Step 3: Send emails in loop (one by one with personalization)
+    # Step 3: Generate emails (template or per-candidate) and send them as they become ready
+    if personalize is None:
+        personalize = wants_personalized_emails(user_message, len(candidates_list))
+    print(f"✍️ Generation mode: {'personalized' if personalize else 'template'}")
+    
     detailed_results = []
     successful_sends = 0
     failed_sends = 0
+    skipped_sends = 0
+    deferred_sends = 0
+    rate_limited_sends = 0
+    rate_limited = False
     
-    print(f"📤 Starting email sending loop for {len(candidates_list)} candidates...")
+    # "outbox" hands emails to the run_outbox worker and returns immediately;
+    # "direct" sends them inside this request
+    delivery_mode = getattr(settings, "EMAIL_DELIVERY_MODE", "outbox")
+    use_outbox = delivery_mode == "outbox"
+    # Direct sends past the rate limit go to the outbox only when its worker runs
+    can_defer = getattr(settings, "OUTBOX_WORKER_ENABLED", use_outbox)
     
-    for i, candidate in enumerate(candidates_list, 1):
-        print(f"📧 Processing candidate {i}/{len(candidates_list)}: {candidate['candidate_name']}")
-        
-        # Generate and send individual email
-        result = send_individual_email(candidate, user_message, target_key)
+    print(f"📤 Starting email {'queueing' if use_outbox else 'sending'} loop for {len(candidates_list)} candidates...")
+    
+    # Shared async SMTP connections for the whole campaign
+    backend = None
+    if not use_outbox:
+        try:
+            backend = AsyncEmailBackend()
+        except Exception as e:
+            print(f"⚠️ Async SMTP backend unavailable, sending per message: {e}")
+            backend = None
+
+    if personalize:
+        # Drafts are generated concurrently and sent as soon as each one is ready,
+        # so LLM latency overlaps with SMTP latency
+        concurrency = max(1, getattr(settings, "EMAIL_GENERATION_CONCURRENCY", 5))
+        drafts = generate_drafts_concurrently(candidates_list, user_message, target_key, concurrency)
+    else:
+        # One LLM call for the whole campaign, slots filled locally per candidate
+        template = await email_template_agent(user_message, target_key)
+        drafts = fill_template_drafts(template, candidates_list)
+
+    def record(i, result):
+        nonlocal successful_sends, skipped_sends, failed_sends, rate_limited_sends
         detailed_results.append(result)
+        emit_event(
+            "email_result",
+            index=i,
+            total=len(candidates_list),
+            candidate_name=result["candidate_name"],
+            candidate_email=result["candidate_email"],
+            success=result["success"],
+            status=result["status"],
+            error=result["error"],
+        )
         
-        if result["success"]:
+        if result["status"] in ("sent", "queued", "requeued"):
             successful_sends += 1
-            print(f"✅ Email sent to {result['candidate_name']}")
+            print(f"✅ Email {result['status']} for {result['candidate_name']}")
+        elif result["status"] == "rate_limited":
+            rate_limited_sends += 1
+            print(f"⏳ Not sent to {result['candidate_name']}: {result['error']}")
+        elif result["success"]:
+            skipped_sends += 1
+            print(f"⏭️ Skipping {result['candidate_name']}: already {result['status']} for this campaign")
         else:
             failed_sends += 1
             print(f"❌ Failed to send to {result['candidate_name']}: {result['error']}")
+
+    # Direct sends run concurrently, one per pooled SMTP connection; taking a
+    # slot before starting a send holds back drafts while every connection is busy
+    send_slots = asyncio.Semaphore(backend.max_connections if backend is not None
+                                   else max(1, getattr(settings, "EMAIL_ASYNC_MAX_CONNECTIONS", 3)))
+    sends = set()
+
+    async def send(i, candidate, email_content):
+        try:
+            result = await deliver_email(candidate, email_content, backend=backend, throttle=False)
+        finally:
+            send_slots.release()
+        result["status"] = "sent" if result["success"] else "failed"
+        return i, result
+
+    def record_finished_sends():
+        for task in [task for task in sends if task.done()]:
+            sends.discard(task)
+            record(*task.result())
+
+    try:
+        async for i, candidate, email_content in drafts:
+            print(f"📧 Processing candidate {i}/{len(candidates_list)}: {candidate['candidate_name']}")
+            record_finished_sends()
+            
+            if email_content is None:
+                record(i, {
+                    "candidate_name": candidate.get("candidate_name", "Unknown"),
+                    "candidate_email": candidate.get("candidate_email", "Unknown"),
+                    "subject": "",
+                    "success": False,
+                    "status": "failed",
+                    "error": "Failed to generate email"
+                })
+            elif use_outbox:
+                record(i, await queue_email(session_id, target_key, candidate, email_content))
+            else:
+                # Never sleep on the rate limit inside the request: once the
+                # provider window is used up, the rest goes to the outbox, or
+                # is reported as not sent when no outbox worker runs
+                if not rate_limited:
+                    acquired, retry_after = await db_sync_to_async(acquire)(max_wait=0)
+                    rate_limited = not acquired
+                if rate_limited and not can_defer:
+                    record(i, {
+                        "candidate_name": candidate.get("candidate_name", "Unknown"),
+                        "candidate_email": candidate.get("candidate_email", "Unknown"),
+                        "subject": email_content.get("subject", ""),
+                        "success": False,
+                        "status": "rate_limited",
+                        "error": f"Rate limited by provider limits, retry in {retry_after:.0f}s",
+                    })
+                elif rate_limited:
+                    result = await queue_email(session_id, target_key, candidate, email_content)
+                    if result["status"] in ("queued", "requeued"):
+                        deferred_sends += 1
+                    record(i, result)
+                else:
+                    await send_slots.acquire()
+                    sends.add(asyncio.create_task(send(i, candidate, email_content)))
+
+        for finished in asyncio.as_completed(sends):
+            record(*await finished)
+        sends.clear()
+    finally:
+        for task in sends:
+            task.cancel()
+        await asyncio.gather(*sends, return_exceptions=True)
+        await drafts.aclose()
+        if backend is not None:
+            await backend.close()
     
-    print(f"📊 Email sending complete: {successful_sends} sent, {failed_sends} failed")
+    print(f"📊 Email {'queueing' if use_outbox else 'sending'} complete: "
+          f"{successful_sends} {'queued' if use_outbox else 'sent'}, {skipped_sends} skipped, {failed_sends} failed")
+    if deferred_sends:
+        print(f"⏳ Rate limit reached, {deferred_sends} emails handed to the outbox")
+    if rate_limited_sends:
+        print(f"⏳ Rate limit reached, {rate_limited_sends} emails not sent")
     
     # Step 4: Generate final AI response using LLM
-    final_response = generate_final_response(
-        detailed_results, target_key, user_message, successful_sends, failed_sends
+    final_response = await generate_final_response(
+        detailed_results, target_key, user_message, successful_sends, failed_sends, delivery_mode
     )
     
     return {
-        "success": successful_sends > 0,
+        "success": successful_sends + skipped_sends + rate_limited_sends > 0,
         "target_key": target_key,
         "candidates_found": len(candidates_list),
-        "emails_sent": successful_sends,
+        "delivery_mode": delivery_mode,
+        "emails_sent": 0 if use_outbox else successful_sends - deferred_sends,
+        "emails_queued": successful_sends if use_outbox else deferred_sends,
+        "emails_skipped": skipped_sends,
         "emails_failed": failed_sends,
+        "emails_rate_limited": rate_limited_sends,
+        "generation_mode": "personalized" if personalize else "template",
         "detailed_results": detailed_results,
         "message": final_response["message"],
         "next_tasks": final_response["next_tasks"]
     }
 
-def generate_final_response(detailed_results: list, target_key: str, user_message: str, sent_count: int, failed_count: int):
+async def generate_final_response(detailed_results: list, target_key: str, user_message: str, sent_count: int, failed_count: int, delivery_mode: str = "direct"):
     """
     Generate comprehensive AI response using LLM
     """
     # Prepare summary for LLM
     successful_emails = [r for r in detailed_results if r["success"]]
-    failed_emails = [r for r in detailed_results if not r["success"]]
+    failed_emails = [r for r in detailed_results if not r["success"] and r.get("status") != "rate_limited"]
+    rate_limited_emails = [r for r in detailed_results if r.get("status") == "rate_limited"]
+    sent_label = "Queued for background delivery" if delivery_mode == "outbox" else "Successfully sent"
     
     prompt = f"""
     User requested: "{user_message}"
@@ -280,8 +602,10 @@ def generate_final_response(detailed_results: list, target_key: str, user_messag
     
     Email Sending Results:
     - Total candidates: {len(detailed_results)}
-    - Successfully sent: {sent_count}
+    - {sent_label}: {sent_count}
+    - Already emailed earlier in this campaign (skipped): {len(successful_emails) - sent_count}
     - Failed: {failed_count}
+    - Not sent, provider rate limit reached (retry later): {len(rate_limited_emails)}
     
     Successful Emails:
     {json.dumps([{
@@ -311,9 +635,9 @@ def generate_final_response(detailed_results: list, target_key: str, user_messag
     """
     
     try:
-        response = llm.invoke([
+        response = (await llm_gateway.ainvoke([
             HumanMessage(content=prompt)
-        ]).content.strip()
+        ], node="campaign_response")).content.strip()
         
         if response.startswith('```'):
             response = response.replace('```json', '').replace('```', '').strip()
@@ -326,13 +650,16 @@ def generate_final_response(detailed_results: list, target_key: str, user_messag
         
         # Fallback response
         successful_names = [r["candidate_name"] for r in detailed_results if r["success"]]
-        failed_names = [r["candidate_name"] for r in detailed_results if not r["success"]]
+        failed_names = [r["candidate_name"] for r in failed_emails]
+        rate_limited_names = [r["candidate_name"] for r in rate_limited_emails]
+        
+        verb = "queued for delivery" if delivery_mode == "outbox" else "sent successfully"
         
         message = f"✅ Email campaign completed for {target_key} candidates.\n\n"
-        message += f"📊 Summary: {sent_count} emails sent successfully, {failed_count} failed.\n\n"
+        message += f"📊 Summary: {sent_count} emails {verb}, {failed_count} failed.\n\n"
         
         if successful_names:
-            message += f"✅ Emails sent to: {', '.join(successful_names[:5])}"
+            message += f"✅ Emails {verb.split()[0]} to: {', '.join(successful_names[:5])}"
             if len(successful_names) > 5:
                 message += f" and {len(successful_names)-5} others"
             message += "\n\n"
@@ -340,6 +667,9 @@ def generate_final_response(detailed_results: list, target_key: str, user_messag
         if failed_names:
             message += f"❌ Failed to send to: {', '.join(failed_names)}\n\n"
         
+        if rate_limited_names:
+            message += f"⏳ Rate limit reached, not sent to: {', '.join(rate_limited_names)}\n\n"
+        
         return {
             "message": message,
             "next_tasks": [
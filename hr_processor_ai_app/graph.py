@@ -1,16 +1,16 @@
 import asyncio
 from langgraph.graph import StateGraph, END
-from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
 from .agentstate import AgentState
-from .memory_manager import memory_manager
+from .checkpointers import get_checkpointer
 from .agents import (
-    user_msg_analyzer_agent, 
-    task_assigner_agent,
+    memory_context_agent,
+    router_agent,
     email_fetcher_responder_agent,
     job_applications_emails_summary_agent,
     job_application_screening_agent,
     email_team_agent,
-    user_msg_general_agent
+    user_msg_general_agent,
+    task_planner_agent
 )
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 import logging
@@ -20,9 +20,7 @@ logger = logging.getLogger(__name__)
 # Your existing routing functions remain the same
 def route_by_classification(state: AgentState) -> str:
     classification = state.get("classification", "")
-    if classification == "hr_email_taskupdate":
-        return "task_assigner_agent"
-    elif classification == "general":
+    if classification == "general":
         return "user_msg_general_agent"
     else:
         return END
@@ -40,63 +38,81 @@ def route_by_task_classification(state: AgentState) -> str:
     else:
         return END
 
-# NEW: Memory-enabled graph builder
-async def build_graph_with_memory():
-    """Build graph with PostgreSQL memory support"""
-    try:
-        # Initialize memory
-        await memory_manager.initialize()
-        memory, conn = await memory_manager.get_memory()
-        
-        # Create graph
-        graph = StateGraph(AgentState)
-        
-        # Add all nodes (your existing nodes)
-        graph.add_node("analyzer", user_msg_analyzer_agent)
-        graph.add_node("task_assigner_agent", task_assigner_agent)
-        graph.add_node("email_fetcher&responder_agent", email_fetcher_responder_agent)
-        graph.add_node("job_applications_emails_summary_agent", job_applications_emails_summary_agent)
-        graph.add_node("job_application_screening_agent", job_application_screening_agent)
-        graph.add_node("email_team_agent", email_team_agent)
-        graph.add_node("user_msg_general_agent", user_msg_general_agent)  # General query agent
-        
-        # Add routing (your existing routing)
-        graph.add_conditional_edges("analyzer", route_by_classification)
-        graph.add_conditional_edges("task_assigner_agent", route_by_task_classification)
-        
-        # Set entry point
-        graph.set_entry_point("analyzer")
-        
-        # Compile with memory checkpointer
-        compiled_graph = graph.compile(checkpointer=memory)
-        
-        logger.info("✅ Graph compiled with PostgreSQL memory")
-        return compiled_graph, conn
-        
-    except Exception as e:
-        logger.error(f"❌ Failed to build graph with memory: {e}")
-        # Fallback to non-memory graph
-        return build_graph(), None
+def route_by_intent(state: AgentState) -> str:
+    """Router output -> next node: HR tasks go straight to their task agent"""
+    if state.get("classification", "") == "hr_email_taskupdate":
+        if len(state.get("planned_tasks") or []) > 1:
+            return "task_planner_agent"
+        return route_by_task_classification(state)
+    return route_by_classification(state)
 
-# Keep your existing non-memory graph for fallback
-def build_graph():
-    """Original graph without memory (fallback)"""
+# Compiled once per process (per checkpointer backend) and reused by every request
+_compiled_graphs = {}
+_stateless_graph = None
+
+
+def _build_state_graph() -> StateGraph:
+    """The one graph definition shared by every checkpointer backend"""
     graph = StateGraph(AgentState)
     
-    graph.add_node("analyzer", user_msg_analyzer_agent)
-    graph.add_node("task_assigner_agent", task_assigner_agent)
+    # Add all nodes
+    graph.add_node("memory_context_agent", memory_context_agent)
+    graph.add_node("router", router_agent)  # hr/general + task + target in one call
     graph.add_node("email_fetcher&responder_agent", email_fetcher_responder_agent)
     graph.add_node("job_applications_emails_summary_agent", job_applications_emails_summary_agent)
     graph.add_node("job_application_screening_agent", job_application_screening_agent)
     graph.add_node("email_team_agent", email_team_agent)
+    graph.add_node("user_msg_general_agent", user_msg_general_agent)  # General query agent
+    graph.add_node("task_planner_agent", task_planner_agent)  # Compound requests, tasks fanned out
     
-    graph.add_conditional_edges("analyzer", route_by_classification)
-    graph.add_conditional_edges("task_assigner_agent", route_by_task_classification)
+    # Add routing
+    graph.add_edge("memory_context_agent", "router")
+    graph.add_conditional_edges("router", route_by_intent)
     
-    graph.set_entry_point("analyzer")
-    
-    return graph.compile()
+    # Set entry point - memory context is computed once, then shared
+    graph.set_entry_point("memory_context_agent")
+    return graph
+
+
+async def build_graph_with_memory():
+    """
+    Return the process-wide graph compiled with the active checkpointer,
+    building it on first use. Returns (graph, has_memory). While Postgres
+    is unavailable the graph runs on the local LRU checkpointer, so
+    conversations keep their memory for the life of the process.
+    """
+    try:
+        memory, backend = await get_checkpointer()
+        
+        graph = _compiled_graphs.get(backend)
+        if graph is None:
+            graph = _build_state_graph().compile(checkpointer=memory)
+            _compiled_graphs[backend] = graph
+            logger.info(f"✅ Graph compiled with {backend} memory")
+        return graph, True
+        
+    except Exception as e:
+        logger.error(f"❌ Failed to build graph with memory: {e}")
+        return build_graph(), False
+
+
+def warm_up_graph():
+    """
+    Create the connection pool, checkpointer and compiled graph at process
+    startup instead of on the first request. Runs in the background so a
+    slow or unavailable database never blocks server start.
+    """
+    from .async_runtime import submit
 
+    submit(build_graph_with_memory())
+
+
+def build_graph():
+    """Full graph without a checkpointer (last-resort fallback)"""
+    global _stateless_graph
+    if _stateless_graph is None:
+        _stateless_graph = _build_state_graph().compile()
+    return _stateless_graph
 
 
 # # graph.py
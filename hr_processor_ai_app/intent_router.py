@@ -0,0 +1,305 @@
+import math
+import re
+import time
+import threading
+import logging
+from collections import Counter, defaultdict
+from datetime import timedelta
+from typing import Dict, List, Optional
+from django.conf import settings
+from django.db.models import Count
+from django.utils import timezone
+from .models import RoutingDecision
+from .semantic_memory import tokenize
+
+logger = logging.getLogger(__name__)
+
+HR = "hr_email_taskupdate"
+
+# (pattern, task_classification) - checked in order, most specific first.
+# A message matching patterns of two different tasks is left to the LLM.
+TASK_PATTERNS = [
+    (re.compile(r"\b(summari[sz]e|analy[sz]e|how many|count|which companies)\b.*\bjob[\s-]*applications?\b"),
+     "job_applications_emails_summary_agent"),
+    (re.compile(r"\b(screen|shortlist|filter|evaluate)\b.*\b(applications?|candidates?|applicants?|resumes?|cvs?)\b"),
+     "job_application_screening_agent"),
+    (re.compile(r"\b(send|write|draft)\b.*\b(e-?mails?|mails?|messages?)\b.*\b(candidates?|applicants?)\b"
+                r"|\b(e-?mail|mail)\b\s+(\w+\s+){0,3}(candidates?|applicants?)\b"),
+     "email_team_agent"),
+    (re.compile(r"\b(show|fetch|get|check|read|list|open)\b.*\b(e-?mails?|inbox|mails?)\b"
+                r"|\b(reply|respond)\b.*\b(e-?mails?|mails?)\b"),
+     "email_fetcher&responder_agent"),
+]
+
+# Phrases naming each campaign target group
+TARGET_PHRASES = {
+    "wrong application": r"wrong[\s-](application|role|position|job)s?",
+    "skill match": r"shortlisted|selected|matched|matching|accepted|skill[\s-]match(ed)?",
+    "skill mismatch": r"rejected|mismatch(ed)?|unsuccessful|skill[\s-]mismatch(ed)?",
+}
+
+TARGET_PATTERNS = [
+    (re.compile(rf"\b({phrase})\b"), target) for target, phrase in TARGET_PHRASES.items()
+]
+
+# A target only counts when it names the recipients of the command: "send
+# email to (the) rejected candidates", "email the shortlisted applicants".
+# "send the hiring manager an email about shortlisted candidates" does not.
+RECIPIENT_PATTERNS = [
+    (re.compile(rf"^\s*(please\s+)?(go ahead and\s+)?send(\s+[\w-]+){{0,3}}?\s+to\s+(all\s+)?(the\s+)?"
+                rf"({phrase})\s+(candidates?|applicants?)\b"
+                rf"|^\s*(please\s+)?(go ahead and\s+)?(e-?mail|mail)\s+(all\s+)?(the\s+)?"
+                rf"({phrase})\s+(candidates?|applicants?)\b"), target)
+    for target, phrase in TARGET_PHRASES.items()
+]
+
+# Clause boundaries of compound requests ("fetch new mail, then screen the applications")
+CLAUSE_SPLIT = re.compile(r",|;|\band then\b|\bthen\b|\band\b")
+
+# Negated, excluding, deferred or questioning messages ("do not email them
+# yet", "candidates who weren't shortlisted", "everyone except ...", "should
+# we screen?") are never routed locally - a keyword hit there can mean the
+# opposite of what the user asked
+GUARD_PATTERN = re.compile(
+    r"\b(don'?t|do not|does not|doesn'?t|not yet|never|no need|hold off|stop|cancel|avoid|"
+    r"shouldn'?t|won'?t|wait|later|maybe|perhaps|whether|should (i|we)|"
+    r"not|\w+n't|except|excluding|other than|apart from|but|instead|without)\b|\?"
+)
+
+# Sending mail is only routed locally on an explicit command at the start
+# of the message ("send ...", "please email ..."); anything else asks the LLM
+IMPERATIVE_SEND = re.compile(r"^\s*(please\s+)?(go ahead and\s+)?(send|e-?mail|mail)\b")
+
+MAIL_TASK = "email_team_agent"
+
+GENERAL_PATTERN = re.compile(r"^\s*(hi|hello|hey|thanks|thank you|good (morning|afternoon|evening))\b[\s!.,]*$")
+
+PATTERN_CONFIDENCE = 0.95
+
+
+def is_guarded(text: str) -> bool:
+    """True when the message is negated, hedged or a question"""
+    return bool(GUARD_PATTERN.search(text.lower()))
+
+
+def recipient_target(text: str) -> Optional[str]:
+    """
+    Target group of a mail command, only when exactly one group is mentioned
+    and it is the direct recipient - None otherwise (the LLM decides).
+    """
+    mentioned = {target for pattern, target in TARGET_PATTERNS if pattern.search(text)}
+    if len(mentioned) != 1:
+        return None
+    target = mentioned.pop()
+    pattern = next(pattern for pattern, recipient in RECIPIENT_PATTERNS if recipient == target)
+    return target if pattern.search(text) else None
+
+
+def _tasks_in(text: str) -> set:
+    return {task for pattern, task in TASK_PATTERNS if pattern.search(text)}
+
+
+def plan_compound(text: str) -> Optional[List[str]]:
+    """
+    Tasks of a compound request, in the order asked - only when every clause
+    matches exactly one task rule, otherwise None (the LLM plans it).
+    Plans with a negated clause ("don't screen them, just show my mail") or
+    a mail campaign are always left to the LLM.
+    """
+    planned = []
+    for clause in CLAUSE_SPLIT.split(text):
+        if not clause.strip():
+            continue
+        if is_guarded(clause):
+            return None
+        tasks = _tasks_in(clause)
+        if len(tasks) != 1:
+            return None
+        task = tasks.pop()
+        if task == MAIL_TASK:
+            return None
+        if task not in planned:
+            planned.append(task)
+    return planned if len(planned) > 1 else None
+
+
+def match_patterns(message: str) -> Optional[Dict]:
+    """Keyword rules for unambiguous messages; None when no (or conflicting) rules match"""
+    text = (message or "").lower()
+
+    if GENERAL_PATTERN.match(text):
+        return {"classification": "general", "task_classification": "other", "target_key": None, "planned_tasks": []}
+
+    if is_guarded(text):
+        return None
+
+    tasks = _tasks_in(text)
+    planned_tasks = []
+    if len(tasks) > 1:
+        planned_tasks = plan_compound(text)
+        if planned_tasks is None:
+            return None
+        task = planned_tasks[0]
+    elif len(tasks) == 1:
+        task = tasks.pop()
+    else:
+        return None
+
+    target_key = None
+    if task == MAIL_TASK:
+        target_key = recipient_target(text)
+        if target_key is None:
+            return None
+
+    return {"classification": HR, "task_classification": task, "target_key": target_key, "planned_tasks": planned_tasks}
+
+
+class NaiveBayesIntentModel:
+    """
+    Multinomial naive Bayes over message tokens, trained on the routes the
+    LLM chose. Labels are whole routes, so one prediction fills every field.
+    """
+
+    def __init__(self, alpha: float = 1.0):
+        self.alpha = alpha
+        self.label_counts = Counter()
+        self.token_counts = defaultdict(Counter)
+        self.token_totals = Counter()
+        self.vocabulary = set()
+        self.routes = {}
+
+    @staticmethod
+    def label_for(route: Dict) -> str:
+        return f"{route['classification']}|{route['task_classification']}|{route.get('target_key') or ''}"
+
+    def fit(self, examples: List[Dict]) -> "NaiveBayesIntentModel":
+        for example in examples:
+            label = self.label_for(example)
+            self.routes[label] = {
+                "classification": example["classification"],
+                "task_classification": example["task_classification"],
+                "target_key": example.get("target_key") or None,
+                "planned_tasks": [],
+            }
+            self.label_counts[label] += 1
+            for token in tokenize(example["message"]):
+                self.token_counts[label][token] += 1
+                self.token_totals[label] += 1
+                self.vocabulary.add(token)
+        return self
+
+    @property
+    def size(self) -> int:
+        return sum(self.label_counts.values())
+
+    def predict(self, message: str):
+        """Return (route, confidence) for the most likely route, or (None, 0.0)"""
+        tokens = [t for t in tokenize(message) if t in self.vocabulary]
+        if not tokens or not self.label_counts:
+            return None, 0.0
+
+        total = self.size
+        vocabulary_size = len(self.vocabulary)
+        scores = {}
+        for label, count in self.label_counts.items():
+            denominator = self.token_totals[label] + self.alpha * vocabulary_size
+            score = math.log(count / total)
+            for token in tokens:
+                score += math.log((self.token_counts[label][token] + self.alpha) / denominator)
+            scores[label] = score
+
+        # Softmax over log scores gives a posterior we can threshold
+        best = max(scores, key=scores.get)
+        norm = sum(math.exp(score - scores[best]) for score in scores.values())
+        return dict(self.routes[best]), 1.0 / norm
+
+
+_model = None
+_trained_at = 0.0
+_model_lock = threading.Lock()
+
+
+def get_model() -> NaiveBayesIntentModel:
+    """Model trained on recent LLM decisions, refreshed every INTENT_MODEL_REFRESH_SECONDS"""
+    global _model, _trained_at
+
+    refresh = getattr(settings, "INTENT_MODEL_REFRESH_SECONDS", 300)
+    with _model_lock:
+        if _model is not None and time.monotonic() - _trained_at < refresh:
+            return _model
+
+        max_examples = getattr(settings, "INTENT_MODEL_MAX_EXAMPLES", 2000)
+        examples = [
+            example for example in RoutingDecision.objects.filter(source="llm")
+            .order_by("-created_at")
+            .values("message", "classification", "task_classification", "target_key", "planned_tasks")[:max_examples]
+            # Compound plans come from patterns or the LLM, never from the model
+            if not example["planned_tasks"]
+        ]
+        _model = NaiveBayesIntentModel().fit(examples)
+        _trained_at = time.monotonic()
+        logger.info(f"✅ Intent model trained on {_model.size} routing decisions")
+        return _model
+
+
+def classify_intent(message: str):
+    """
+    Route a message locally. Returns (route, confidence, source) where
+    source is "pattern" or "model", or None when the LLM should decide.
+    """
+    route = match_patterns(message)
+    if route is not None:
+        return route, PATTERN_CONFIDENCE, "pattern"
+
+    if is_guarded(message or ""):
+        return None
+
+    model = get_model()
+    if model.size < getattr(settings, "INTENT_MODEL_MIN_EXAMPLES", 20):
+        return None
+
+    route, confidence = model.predict(message)
+    if route is None or confidence < getattr(settings, "INTENT_ROUTER_THRESHOLD", 0.9):
+        return None
+    if route["task_classification"] == MAIL_TASK:
+        text = (message or "").lower()
+        target_key = recipient_target(text)
+        if not IMPERATIVE_SEND.match(text) or target_key is None or route.get("target_key") != target_key:
+            return None
+    return route, confidence, "model"
+
+
+def record_decision(message: str, route: Dict, source: str, confidence: float = 1.0) -> None:
+    try:
+        RoutingDecision.objects.create(
+            message=message,
+            classification=route["classification"],
+            task_classification=route.get("task_classification") or "other",
+            target_key=route.get("target_key"),
+            planned_tasks=route.get("planned_tasks") or [],
+            source=source,
+            confidence=confidence,
+        )
+    except Exception as e:
+        logger.warning(f"⚠️ Could not record routing decision: {e}")
+
+
+def skip_rate(days: int = None) -> Dict:
+    """Share of routing decisions made without an LLM call"""
+    decisions = RoutingDecision.objects.all()
+    if days:
+        decisions = decisions.filter(created_at__gte=timezone.now() - timedelta(days=days))
+
+    by_source = Counter({
+        row["source"]: row["count"]
+        for row in decisions.values("source").annotate(count=Count("id"))
+    })
+    total = sum(by_source.values())
+    local = by_source["pattern"] + by_source["model"]
+    return {
+        "total": total,
+        "pattern": by_source["pattern"],
+        "model": by_source["model"],
+        "llm": by_source["llm"],
+        "skip_rate": local / total if total else 0.0,
+    }
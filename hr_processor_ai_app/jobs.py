@@ -0,0 +1,262 @@
+import time
+import asyncio
+import logging
+from datetime import timedelta
+from .async_runtime import db_sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .models import AgentJob
+
+logger = logging.getLogger(__name__)
+
+# Streamed events worth keeping on the job; tokens and the final result are not
+PROGRESS_EVENTS = {"node", "screening_result", "email_result", "plan_level", "progress"}
+
+
+def submit_job(session_id: str, message: str) -> AgentJob:
+    """Queue a chat message for the background worker and return the job"""
+    return AgentJob.objects.create(session_id=session_id, message=message)
+
+
+def owned_by_run(job: AgentJob):
+    """The job's row while the run holding `job` still owns it: running, on the attempt it claimed"""
+    return AgentJob.objects.filter(pk=job.pk, status=AgentJob.STATUS_RUNNING, attempts=job.attempts)
+
+
+def release_stale_jobs() -> int:
+    """
+    Requeue jobs stuck in 'running' (worker died mid-run), or fail them once
+    they have used up AGENT_JOB_MAX_ATTEMPTS. A running job's heartbeat
+    refreshes updated_at every third of AGENT_JOB_RUNNING_TIMEOUT_SECONDS.
+    Each job is only released if it is still on the attempt seen as stale,
+    so a job another worker just reclaimed is left alone.
+    """
+    timeout = getattr(settings, "AGENT_JOB_RUNNING_TIMEOUT_SECONDS", 1800)
+    max_attempts = getattr(settings, "AGENT_JOB_MAX_ATTEMPTS", 2)
+    cutoff = timezone.now() - timedelta(seconds=timeout)
+    stale = AgentJob.objects.filter(status=AgentJob.STATUS_RUNNING, updated_at__lt=cutoff)
+
+    released = 0
+    for pk, attempts in stale.values_list("pk", "attempts"):
+        still_stale = stale.filter(pk=pk, attempts=attempts)
+        if attempts >= max_attempts:
+            released += still_stale.update(
+                status=AgentJob.STATUS_FAILED,
+                error="Worker stopped responding",
+                finished_at=timezone.now(),
+                updated_at=timezone.now(),
+            )
+        else:
+            released += still_stale.update(status=AgentJob.STATUS_QUEUED, updated_at=timezone.now())
+    return released
+
+
+def claim_jobs(limit: int = 1):
+    """
+    Atomically claim the oldest queued jobs for this worker. SKIP LOCKED lets
+    several workers share the queue without running a job twice.
+    """
+    with transaction.atomic():
+        jobs = list(
+            AgentJob.objects.select_for_update(skip_locked=True)
+            .filter(status=AgentJob.STATUS_QUEUED)
+            .order_by("created_at")[:limit]
+        )
+        for job in jobs:
+            job.status = AgentJob.STATUS_RUNNING
+            job.attempts += 1
+            job.started_at = timezone.now()
+            job.save(update_fields=["status", "attempts", "started_at", "updated_at"])
+    return jobs
+
+
+class JobProgress:
+    """
+    Collects a running job's node transitions and progress events and writes
+    them to its row at most every AGENT_JOB_PROGRESS_FLUSH_SECONDS, so chatty
+    nodes don't turn into one UPDATE per event.
+    """
+
+    def __init__(self, job: AgentJob):
+        self.job = job
+        self.flush_interval = getattr(settings, "AGENT_JOB_PROGRESS_FLUSH_SECONDS", 1.0)
+        self.max_events = getattr(settings, "AGENT_JOB_MAX_EVENTS", 200)
+        self._dirty = False
+        self._flushed_at = 0.0
+
+    def record(self, event: str, data: dict):
+        if event not in PROGRESS_EVENTS:
+            return
+        entry = {key: value for key, value in data.items() if key != "event"}
+        entry.update({"event": event, "at": timezone.now().isoformat()})
+
+        if event == "node":
+            self.job.current_step = data.get("node") or ""
+        elif "total" in data:
+            self.job.progress = {"event": event, "done": data.get("index"), "total": data["total"]}
+
+        self.job.events = (self.job.events + [entry])[-self.max_events:]
+        self._dirty = True
+
+    async def maybe_flush(self):
+        if self._dirty and time.monotonic() - self._flushed_at >= self.flush_interval:
+            await self.flush()
+
+    async def flush(self):
+        self._dirty = False
+        self._flushed_at = time.monotonic()
+        # A run that lost its job (see heartbeat) must not overwrite the new owner's progress
+        await db_sync_to_async(owned_by_run(self.job).update)(
+            current_step=self.job.current_step,
+            progress=self.job.progress,
+            events=self.job.events,
+            updated_at=timezone.now(),
+        )
+
+
+async def heartbeat(job: AgentJob, run: asyncio.Task):
+    """
+    Touch updated_at every third of AGENT_JOB_RUNNING_TIMEOUT_SECONDS so long
+    silent nodes (a big screening call, an SMTP campaign) never look stale.
+    Cancels `run` if the job was released anyway, so it can't run twice.
+    """
+    interval = getattr(settings, "AGENT_JOB_RUNNING_TIMEOUT_SECONDS", 1800) / 3
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            touched = await db_sync_to_async(owned_by_run(job).update)(updated_at=timezone.now())
+        except Exception as e:
+            logger.warning(f"⚠️ Heartbeat for job {job.job_id} failed: {e}")
+            continue
+        if not touched:
+            logger.warning(f"⚠️ Job {job.job_id} was released while running, stopping this run")
+            run.cancel()
+            return
+
+
+async def run_job(job: AgentJob) -> AgentJob:
+    """Run one claimed job through the graph, recording progress and the outcome"""
+    from .views import graph_events
+
+    progress = JobProgress(job)
+    outcome = {"result": None, "error": ""}
+
+    async def run_graph():
+        async for event, data in graph_events(job.session_id, job.message, tokens=False):
+            if event == "result":
+                outcome["result"] = data
+            elif event == "error":
+                outcome["error"] = data.get("error") or "Unknown error"
+            else:
+                progress.record(event, data)
+                await progress.maybe_flush()
+
+    run = asyncio.create_task(run_graph())
+    beat = asyncio.create_task(heartbeat(job, run))
+    try:
+        await run
+    except asyncio.CancelledError:
+        if not (beat.done() and run.cancelled()):
+            raise
+        # The heartbeat found the job released: whoever owns it now records the outcome
+        return job
+    except Exception as e:
+        outcome["error"] = str(e)
+    finally:
+        beat.cancel()
+        run.cancel()
+
+    result = outcome["result"]
+    job.result = result
+    job.error = "" if result is not None else (outcome["error"] or "No result produced")
+    job.status = AgentJob.STATUS_SUCCEEDED if result is not None else AgentJob.STATUS_FAILED
+    job.finished_at = timezone.now()
+    finished = await db_sync_to_async(owned_by_run(job).update)(
+        current_step=job.current_step,
+        progress=job.progress,
+        events=job.events,
+        result=job.result,
+        error=job.error,
+        status=job.status,
+        finished_at=job.finished_at,
+        updated_at=timezone.now(),
+    )
+    if not finished:
+        logger.warning(f"⚠️ Job {job.job_id} was released while running, outcome not recorded")
+        return job
+
+    logger.info(f"{'✅' if result is not None else '❌'} Job {job.job_id} {job.status}")
+    return job
+
+
+async def run_worker(concurrency: int = 1, once: bool = False, poll_interval: float = 2.0) -> int:
+    """
+    Keep up to `concurrency` jobs running, claiming the next queued job as
+    soon as a slot frees up so one slow job never idles the other slots.
+    With `once`, stops claiming when the queue is empty and waits for the
+    running jobs. Returns the number of jobs run.
+    """
+    slots = asyncio.Semaphore(max(1, concurrency))
+    running = set()
+    processed = 0
+    released_at = None
+
+    def finished(task):
+        running.discard(task)
+        slots.release()
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"❌ Job run crashed: {task.exception()}")
+
+    try:
+        while True:
+            await slots.acquire()
+            if released_at is None or time.monotonic() - released_at >= poll_interval:
+                await db_sync_to_async(release_stale_jobs)()
+                released_at = time.monotonic()
+
+            jobs = await db_sync_to_async(claim_jobs)(1)
+            if not jobs:
+                slots.release()
+                if once:
+                    break
+                await asyncio.sleep(poll_interval)
+                continue
+
+            task = asyncio.create_task(run_job(jobs[0]))
+            running.add(task)
+            task.add_done_callback(finished)
+            processed += 1
+
+        await asyncio.gather(*running, return_exceptions=True)
+    finally:
+        for task in running:
+            task.cancel()
+    return processed
+
+
+def process_jobs(concurrency: int = 1, once: bool = True, poll_interval: float = 2.0) -> int:
+    """
+    Run queued jobs on the shared runtime loop, up to `concurrency` at a
+    time (see run_worker). Returns the number of jobs run.
+    """
+    from .async_runtime import run_sync
+
+    return run_sync(run_worker(concurrency, once=once, poll_interval=poll_interval))
+
+
+def job_status_payload(job: AgentJob) -> dict:
+    """Shape a job row into the JSON returned by the job status endpoint"""
+    return {
+        "job_id": str(job.job_id),
+        "session_id": job.session_id,
+        "status": job.status,
+        "current_step": job.current_step,
+        "progress": job.progress,
+        "events": job.events,
+        "error": job.error,
+        "attempts": job.attempts,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
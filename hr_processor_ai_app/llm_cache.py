@@ -0,0 +1,107 @@
+import json
+import hashlib
+import threading
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError
+from django.db.models import F
+from django.utils import timezone
+from langchain_core.messages import AIMessage
+from .models import LLMCacheEntry
+from .metrics import registry
+
+lookups_total = registry.counter("llm_cache_lookups_total", "LLM response cache lookups by node and result (hit/miss)")
+hit_ratio = registry.gauge("llm_cache_hit_ratio", "Share of LLM response cache lookups that hit, by node")
+evictions_total = registry.counter("llm_cache_evictions_total", "LLM response cache entries evicted, by reason")
+
+_puts = 0
+_puts_lock = threading.Lock()
+
+
+def _normalize(messages) -> list:
+    """Role and whitespace-collapsed content of each message, so trivially different prompts share a key"""
+    if isinstance(messages, str):
+        messages = [messages]
+    normalized = []
+    for message in messages:
+        role = getattr(message, "type", "human")
+        content = getattr(message, "content", message)
+        if not isinstance(content, str):
+            content = json.dumps(content, sort_keys=True, default=str)
+        normalized.append([role, " ".join(content.split())])
+    return normalized
+
+
+def cache_key(model: str, temperature: float, messages) -> str:
+    raw = json.dumps([model, temperature, _normalize(messages)], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _count_lookup(node: str, result: str):
+    lookups_total.inc(node=node, result=result)
+    hits = lookups_total.value(node=node, result="hit")
+    hit_ratio.set(hits / (hits + lookups_total.value(node=node, result="miss")), node=node)
+
+
+def get(key: str, node: str):
+    """Cached AIMessage for `key`, or None. A hit refreshes the entry's LRU position."""
+    now = timezone.now()
+    entry = LLMCacheEntry.objects.filter(key=key, expires_at__gt=now).values("content").first()
+    if entry is None:
+        _count_lookup(node, "miss")
+        return None
+
+    LLMCacheEntry.objects.filter(key=key).update(last_used_at=now, hits=F("hits") + 1)
+    _count_lookup(node, "hit")
+    return AIMessage(content=entry["content"], response_metadata={"cached": True})
+
+
+def put(key: str, node: str, model: str, response) -> None:
+    content = getattr(response, "content", None)
+    if not isinstance(content, str) or not content.strip():
+        return  # Never cache empty or structured (tool call) responses
+
+    ttl = getattr(settings, "LLM_CACHE_TTL_SECONDS", 86400)
+    now = timezone.now()
+    try:
+        LLMCacheEntry.objects.update_or_create(
+            key=key,
+            defaults={
+                "node": node,
+                "model": model,
+                "content": content,
+                "last_used_at": now,
+                "expires_at": now + timedelta(seconds=ttl),
+            },
+        )
+    except IntegrityError:
+        pass  # A concurrent caller stored the same response first
+
+    global _puts
+    with _puts_lock:
+        _puts += 1
+        due = _puts % getattr(settings, "LLM_CACHE_EVICT_EVERY", 50) == 0
+    if due:
+        evict()
+
+
+def evict() -> dict:
+    """Drop expired entries, then the least recently used beyond LLM_CACHE_MAX_ENTRIES"""
+    expired, _ = LLMCacheEntry.objects.filter(expires_at__lte=timezone.now()).delete()
+
+    max_entries = getattr(settings, "LLM_CACHE_MAX_ENTRIES", 5000)
+    # last_used_at of the newest entry past the limit - it and everything older goes
+    cutoff = list(
+        LLMCacheEntry.objects.order_by("-last_used_at")
+        .values_list("last_used_at", flat=True)[max_entries:max_entries + 1]
+    )
+    overflow = 0
+    if cutoff:
+        overflow, _ = LLMCacheEntry.objects.filter(last_used_at__lte=cutoff[0]).delete()
+
+    if expired:
+        evictions_total.inc(expired, reason="ttl")
+    if overflow:
+        evictions_total.inc(overflow, reason="lru")
+    return {"expired": expired, "lru": overflow}
+
@@ -0,0 +1,223 @@
+import os
+import time
+import random
+import asyncio
+import threading
+import logging
+from .async_runtime import db_sync_to_async
+from django.conf import settings
+from langchain_google_genai import ChatGoogleGenerativeAI
+from .llm_scheduler import get_scheduler, INTERACTIVE, ROUTING, BULK_SCREENING, BULK_GENERATION
+from .metrics import registry
+from . import llm_cache
+
+logger = logging.getLogger(__name__)
+
+# Scheduler priority of each LLM call site; LLM_NODE_MODELS can override it
+NODE_PRIORITIES = {
+    "general": INTERACTIVE,
+    "email_responder": INTERACTIVE,
+    "job_summary": INTERACTIVE,
+    "screening_summary": INTERACTIVE,
+    "campaign_response": INTERACTIVE,
+    "analyzer": ROUTING,
+    "task_assigner": ROUTING,
+    "router": ROUTING,
+    "target_identifier": ROUTING,
+    "memory_context": ROUTING,
+    "email_classifier": BULK_SCREENING,
+    "screening": BULK_SCREENING,
+    "email_generator": BULK_GENERATION,
+    "email_template": BULK_GENERATION,
+    "rolling_summary": BULK_GENERATION,
+}
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+call_seconds = registry.histogram("llm_call_seconds", "LLM call latency by node, model and outcome")
+calls_total = registry.counter("llm_calls_total", "LLM calls by node and outcome")
+retries_total = registry.counter("llm_retries_total", "LLM call retries by node and reason")
+tokens_total = registry.counter("llm_tokens_total", "LLM tokens by node and direction (input/output)")
+
+
+def _cache_lookup(key: str, node: str):
+    try:
+        return llm_cache.get(key, node)
+    except Exception as e:
+        logger.warning(f"⚠️ LLM cache lookup failed: {e}")
+        return None
+
+
+def _cache_store(key: str, node: str, model: str, response):
+    try:
+        llm_cache.put(key, node, model, response)
+    except Exception as e:
+        logger.warning(f"⚠️ Could not cache LLM response: {e}")
+
+
+def _cache_key_for(config: dict, messages, cache: bool):
+    """Cache key when this call uses the response cache, else None"""
+    if not getattr(settings, "LLM_CACHE_ENABLED", True) or not config.get("cache", cache):
+        return None
+    return llm_cache.cache_key(config["model"], config["temperature"], messages)
+
+
+class LLMCallError(Exception):
+    """An LLM call failed for good - not retryable, or out of attempts"""
+
+
+def node_config(node: str) -> dict:
+    """Model, temperature, timeout and priority for one call site"""
+    config = {
+        "model": getattr(settings, "LLM_DEFAULT_MODEL", "models/gemini-2.0-flash"),
+        "temperature": getattr(settings, "LLM_DEFAULT_TEMPERATURE", 0.7),
+        "timeout": getattr(settings, "LLM_TIMEOUT_SECONDS", 30),
+        "priority": NODE_PRIORITIES.get(node, INTERACTIVE),
+    }
+    config.update(getattr(settings, "LLM_NODE_MODELS", {}).get(node, {}))
+    return config
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(model: str, temperature: float, timeout: float) -> ChatGoogleGenerativeAI:
+    """
+    One shared client per configuration, so calls reuse its HTTP connections.
+    Retries are the gateway's job, not the client's.
+    """
+    key = (model, temperature, timeout)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = ChatGoogleGenerativeAI(
+                model=model,
+                temperature=temperature,
+                timeout=timeout,
+                max_retries=0,
+                google_api_key=os.getenv("GEMINI_API_KEY"),
+            )
+        return client
+
+
+def _status_code(error: Exception):
+    """HTTP status of a provider error, looking through wrapped causes"""
+    while error is not None:
+        for attribute in ("code", "status_code"):
+            value = getattr(error, attribute, None)
+            if isinstance(value, int):
+                return value
+        error = error.__cause__
+    return None
+
+
+def _retry_reason(error: Exception):
+    """Why the call is worth retrying, or None"""
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError)):
+        return "timeout"
+    status = _status_code(error)
+    if status in RETRYABLE_STATUS:
+        return str(status)
+    return None
+
+
+def _backoff(attempt: int) -> float:
+    """Full-jitter exponential backoff, so throttled callers don't retry in lockstep"""
+    base = getattr(settings, "LLM_RETRY_BASE_SECONDS", 1.0)
+    cap = getattr(settings, "LLM_RETRY_MAX_SECONDS", 20)
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def _record(node: str, model: str, outcome: str, started: float, response=None):
+    call_seconds.observe(time.monotonic() - started, node=node, model=model, outcome=outcome)
+    calls_total.inc(node=node, outcome=outcome)
+    usage = getattr(response, "usage_metadata", None) or {}
+    if usage:
+        tokens_total.inc(usage.get("input_tokens", 0), node=node, direction="input")
+        tokens_total.inc(usage.get("output_tokens", 0), node=node, direction="output")
+
+
+def _give_up(node: str, attempt: int, max_retries: int, error: Exception):
+    reason = _retry_reason(error)
+    if reason is None or attempt >= max_retries:
+        raise LLMCallError(f"LLM call '{node}' failed after {attempt + 1} attempts: {error}") from error
+    retries_total.inc(node=node, reason=reason)
+    logger.warning(f"⚠️ LLM call '{node}' failed ({reason}), retrying")
+
+
+async def ainvoke(messages, node: str, cache: bool = False):
+    """
+    Run one LLM call for `node`: scheduled by its priority, bounded by its
+    timeout and retried with jittered backoff on timeouts, 429s and 5xx.
+    With cache=True (or "cache" in the node's LLM_NODE_MODELS entry) a
+    stored response for the same model, temperature and messages is
+    returned without calling the model.
+    """
+    config = node_config(node)
+    key = _cache_key_for(config, messages, cache)
+    if key is not None:
+        cached = await db_sync_to_async(_cache_lookup)(key, node)
+        if cached is not None:
+            return cached
+
+    client = get_client(config["model"], config["temperature"], config["timeout"])
+    scheduler = get_scheduler()
+    max_retries = getattr(settings, "LLM_MAX_RETRIES", 3)
+
+    for attempt in range(max_retries + 1):
+        await scheduler.acquire(config["priority"])
+        started = time.monotonic()
+        try:
+            response = await asyncio.wait_for(client.ainvoke(messages), config["timeout"])
+        except Exception as e:
+            _record(node, config["model"], "error", started)
+            error = e
+        else:
+            _record(node, config["model"], "ok", started, response)
+            break
+        finally:
+            # Back off without holding a slot other calls could use
+            scheduler.release(config["priority"])
+
+        _give_up(node, attempt, max_retries, error)
+        await asyncio.sleep(_backoff(attempt))
+
+    if key is not None:
+        await db_sync_to_async(_cache_store)(key, node, config["model"], response)
+    return response
+
+
+def invoke(messages, node: str, cache: bool = False):
+    """Blocking variant of ainvoke for sync callers (worker threads)"""
+    config = node_config(node)
+    key = _cache_key_for(config, messages, cache)
+    if key is not None:
+        cached = _cache_lookup(key, node)
+        if cached is not None:
+            return cached
+
+    client = get_client(config["model"], config["temperature"], config["timeout"])
+    scheduler = get_scheduler()
+    max_retries = getattr(settings, "LLM_MAX_RETRIES", 3)
+
+    for attempt in range(max_retries + 1):
+        scheduler.acquire_sync(config["priority"])
+        started = time.monotonic()
+        try:
+            response = client.invoke(messages)
+        except Exception as e:
+            _record(node, config["model"], "error", started)
+            error = e
+        else:
+            _record(node, config["model"], "ok", started, response)
+            break
+        finally:
+            scheduler.release(config["priority"])
+
+        _give_up(node, attempt, max_retries, error)
+        time.sleep(_backoff(attempt))
+
+    if key is not None:
+        _cache_store(key, node, config["model"], response)
+    return response
@@ -0,0 +1,161 @@
+import time
+import asyncio
+import threading
+import logging
+from collections import deque
+from django.conf import settings
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# Priority classes, highest first. Interactive: the reply a chat user is
+# waiting on. Routing: per-request classification on the critical path.
+# Bulk: per-item fan-out of screenings and email campaigns.
+INTERACTIVE = "interactive"
+ROUTING = "routing"
+BULK_SCREENING = "bulk_screening"
+BULK_GENERATION = "bulk_generation"
+PRIORITIES = (INTERACTIVE, ROUTING, BULK_SCREENING, BULK_GENERATION)
+
+DEFAULT_WEIGHTS = {INTERACTIVE: 8, ROUTING: 4, BULK_SCREENING: 2, BULK_GENERATION: 1}
+
+wait_seconds = registry.histogram(
+    "llm_scheduler_wait_seconds", "Time LLM calls waited for a scheduler slot, by priority"
+)
+queued_calls = registry.gauge("llm_scheduler_queued_calls", "LLM calls waiting for a slot, by priority")
+active_calls = registry.gauge("llm_scheduler_active_calls", "LLM calls in flight, by priority")
+
+
+class _Waiter:
+    __slots__ = ("priority", "tag", "wake", "granted", "abandoned", "enqueued")
+
+    def __init__(self, priority, tag, wake):
+        self.priority = priority
+        self.tag = tag
+        self.wake = wake
+        self.granted = False
+        self.abandoned = False
+        self.enqueued = time.monotonic()
+
+
+class LLMScheduler:
+    """
+    Shares the LLM quota between priority classes with weighted fair
+    queuing: each call gets a virtual finish tag (class weight sets how fast
+    a class's tags advance) and a free slot goes to the smallest tag.
+    `reserved_interactive` of the `max_concurrent` slots are only ever used
+    by interactive calls, so chat replies never wait behind a full campaign.
+
+    Thread-safe, and usable from any event loop or from sync code.
+    """
+
+    def __init__(self, max_concurrent: int = 8, reserved_interactive: int = 2, weights: dict = None):
+        self.max_concurrent = max(1, max_concurrent)
+        self.reserved_interactive = min(max(0, reserved_interactive), self.max_concurrent - 1)
+        self.weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+        self._lock = threading.Lock()
+        self._queues = {priority: deque() for priority in PRIORITIES}
+        self._last_tag = dict.fromkeys(PRIORITIES, 0.0)
+        self._virtual_time = 0.0
+        self._active = dict.fromkeys(PRIORITIES, 0)
+
+    @property
+    def active(self) -> int:
+        return sum(self._active.values())
+
+    def _check_priority(self, priority: str):
+        if priority not in self._queues:
+            raise ValueError(f"Unknown LLM priority '{priority}', expected one of {PRIORITIES}")
+
+    def _eligible(self, priority: str) -> bool:
+        if self.active >= self.max_concurrent:
+            return False
+        if priority == INTERACTIVE:
+            return True
+        shared = self.max_concurrent - self.reserved_interactive
+        return self.active - self._active[INTERACTIVE] < shared
+
+    def _enqueue(self, priority: str, wake) -> _Waiter:
+        # Start from the current virtual time so an idle class can't bank credit
+        start = max(self._virtual_time, self._last_tag[priority])
+        waiter = _Waiter(priority, start + 1.0 / self.weights[priority], wake)
+        self._last_tag[priority] = waiter.tag
+        self._queues[priority].append(waiter)
+        return waiter
+
+    def _dispatch(self):
+        """Grant free slots to the smallest finish tags among eligible classes (lock held)"""
+        while True:
+            best = None
+            for priority, queue in self._queues.items():
+                while queue and queue[0].abandoned:
+                    queue.popleft()
+                if queue and self._eligible(priority) and (best is None or queue[0].tag < best.tag):
+                    best = queue[0]
+            if best is None:
+                break
+            self._queues[best.priority].popleft()
+            self._virtual_time = max(self._virtual_time, best.tag - 1.0 / self.weights[best.priority])
+            self._active[best.priority] += 1
+            best.granted = True
+            best.wake()
+        self._report()
+
+    def _report(self):
+        for priority in PRIORITIES:
+            queued_calls.set(len(self._queues[priority]), priority=priority)
+            active_calls.set(self._active[priority], priority=priority)
+
+    def release(self, priority: str):
+        with self._lock:
+            self._active[priority] -= 1
+            self._dispatch()
+
+    async def acquire(self, priority: str):
+        self._check_priority(priority)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def wake():
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None))
+
+        with self._lock:
+            waiter = self._enqueue(priority, wake)
+            self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                waiter.abandoned = True
+                granted = waiter.granted
+            if granted:
+                self.release(priority)
+            raise
+        wait_seconds.observe(time.monotonic() - waiter.enqueued, priority=priority)
+
+    def acquire_sync(self, priority: str):
+        self._check_priority(priority)
+        event = threading.Event()
+        with self._lock:
+            waiter = self._enqueue(priority, event.set)
+            self._dispatch()
+        event.wait()
+        wait_seconds.observe(time.monotonic() - waiter.enqueued, priority=priority)
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> LLMScheduler:
+    """Process-wide scheduler in front of every LLM call"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = LLMScheduler(
+                max_concurrent=getattr(settings, "LLM_MAX_CONCURRENT_CALLS", 8),
+                reserved_interactive=getattr(settings, "LLM_RESERVED_INTERACTIVE_CALLS", 2),
+                weights=getattr(settings, "LLM_PRIORITY_WEIGHTS", None),
+            )
+        return _scheduler
+
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient
+from django.test.utils import override_settings
+from unittest import mock
+from collections import Counter
+import asyncio
+import time
+
+
+class Command(BaseCommand):
+    help = 'Benchmark concurrent requests to the async chat view, with a fixed delay standing in for the graph run'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20, help='Concurrent chat requests')
+        parser.add_argument('--delay', type=float, default=0.2, help='Seconds each simulated graph run waits on I/O')
+
+    def handle(self, *args, **options):
+        requests = options['requests']
+        delay = options['delay']
+
+        async def fake_process_with_memory(session_id, message):
+            await asyncio.sleep(delay)  # Stand-in for LLM / IMAP / DB waits
+            return {"session_id": session_id, "message": message, "ai_response": "ok"}
+
+        async def run():
+            client = AsyncClient()
+            return await asyncio.gather(*(
+                client.post(
+                    "/api/analyze/",
+                    data={"message": "hello", "session_id": f"benchmark-{i}"},
+                    content_type="application/json",
+                )
+                for i in range(requests)
+            ))
+
+        with override_settings(ALLOWED_HOSTS=['testserver']), \
+                mock.patch("hr_processor_ai_app.views.process_with_memory", fake_process_with_memory):
+            start = time.perf_counter()
+            responses = asyncio.run(run())
+            elapsed = time.perf_counter() - start
+
+        statuses = Counter(response.status_code for response in responses)
+        self.stdout.write(f"📊 {requests} concurrent chat requests, {delay:.2f}s simulated graph run each")
+        self.stdout.write(f"   Status codes: {dict(statuses)}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"✅ {elapsed:.3f}s total (serial would be {requests * delay:.1f}s, "
+                f"{requests / elapsed:.0f} req/s; ADMISSION_MAX_CONCURRENT caps the overlap)"
+            )
+        )
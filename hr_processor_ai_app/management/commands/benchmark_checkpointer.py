@@ -0,0 +1,72 @@
+from django.core.management.base import BaseCommand
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.graph import StateGraph
+from hr_processor_ai_app.agentstate import AgentState
+from hr_processor_ai_app.checkpointers import LRUMemorySaver
+from hr_processor_ai_app.memory_manager import memory_manager
+import asyncio
+import statistics
+import time
+
+
+def reply_node(state: AgentState) -> AgentState:
+    # Stand-in for an agent: no LLM call, so only checkpoint I/O is measured
+    return {
+        **state,
+        "ai_response": f"Reply to: {state['message']}",
+        "messages": [AIMessage(content=f"Reply to: {state['message']}" * 5)],
+    }
+
+
+class Command(BaseCommand):
+    help = 'Benchmark per-turn checkpoint latency of the PostgreSQL and local LRU checkpointers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--turns', type=int, default=50, help='Conversation turns per thread')
+        parser.add_argument('--threads', type=int, default=5, help='Threads per backend')
+
+    def handle(self, *args, **options):
+        turns = options['turns']
+        threads = options['threads']
+
+        async def run_turns(checkpointer, label):
+            graph = StateGraph(AgentState)
+            graph.add_node("reply", reply_node)
+            graph.set_entry_point("reply")
+            graph = graph.compile(checkpointer=checkpointer)
+
+            timings = []
+            for t in range(threads):
+                config = {"configurable": {"thread_id": f"benchmark-checkpointer-{label}-{t}-{time.time()}"}}
+                for i in range(turns):
+                    message = f"Turn {i}: screen candidates for the backend role"
+                    start = time.perf_counter()
+                    await graph.ainvoke({"session_id": "benchmark", "message": message,
+                                         "messages": [HumanMessage(content=message)]}, config)
+                    timings.append(time.perf_counter() - start)
+                # Don't leave benchmark threads behind in the database
+                await checkpointer.adelete_thread(config["configurable"]["thread_id"])
+            return timings
+
+        async def run():
+            results = {"local LRU": await run_turns(LRUMemorySaver(max_threads=threads), "local")}
+            memory = await memory_manager.get_memory()
+            if memory is not None:
+                results["postgres"] = await run_turns(memory, "postgres")
+                await memory_manager.close()
+            return results
+
+        results = asyncio.run(run())
+
+        self.stdout.write(f"📊 {threads} threads x {turns} turns per backend (graph run + checkpoint read/write)")
+        for label, timings in results.items():
+            ordered = sorted(timings)
+            p95 = ordered[int(len(ordered) * 0.95) - 1]
+            self.stdout.write(
+                f"   {label:<10} mean {statistics.mean(timings) * 1000:.2f} ms, "
+                f"p50 {statistics.median(timings) * 1000:.2f} ms, p95 {p95 * 1000:.2f} ms"
+            )
+        if "postgres" not in results:
+            self.stdout.write(self.style.WARNING("⚠️ PostgreSQL unavailable - only the local checkpointer was measured"))
+        else:
+            self.stdout.write(self.style.SUCCESS("✅ Done"))
@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand
+from hr_processor_ai_app import graph as graph_module
+from hr_processor_ai_app.memory_manager import memory_manager
+import asyncio
+import time
+
+
+class Command(BaseCommand):
+    help = 'Benchmark per-request graph/pool setup against the process-wide pooled graph (needs PostgreSQL)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20, help='Simulated requests per mode')
+
+    def handle(self, *args, **options):
+        requests = options['requests']
+        config = {"configurable": {"thread_id": "benchmark-graph-setup"}}
+
+        async def reset():
+            await memory_manager.close()
+            memory_manager._setup_done = False
+            graph_module._compiled_graphs.clear()
+
+        async def per_request_setup():
+            # Old behaviour: new pool + setup() + compile for every request
+            timings = []
+            for _ in range(requests):
+                await reset()
+                start = time.perf_counter()
+                graph, _ = await graph_module.build_graph_with_memory()
+                if memory_manager.memory is None:
+                    raise RuntimeError("PostgreSQL memory unavailable")
+                await graph.checkpointer.aget_tuple(config)
+                timings.append(time.perf_counter() - start)
+            return timings
+
+        async def shared_setup():
+            # New behaviour: build once, then every request reuses it
+            await reset()
+            await graph_module.build_graph_with_memory()
+            timings = []
+            for _ in range(requests):
+                start = time.perf_counter()
+                graph, _ = await graph_module.build_graph_with_memory()
+                await graph.checkpointer.aget_tuple(config)
+                timings.append(time.perf_counter() - start)
+            await memory_manager.close()
+            return timings
+
+        async def run():
+            return await per_request_setup(), await shared_setup()
+
+        try:
+            before, after = asyncio.run(run())
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'❌ Benchmark failed: {e}'))
+            return
+
+        before_ms = sum(before) / len(before) * 1000
+        after_ms = sum(after) / len(after) * 1000
+        self.stdout.write(f"📊 {requests} simulated requests (graph setup + one checkpoint read)")
+        self.stdout.write(f"   Per-request setup: {before_ms:.2f} ms/request")
+        self.stdout.write(f"   Shared pool/graph: {after_ms:.2f} ms/request")
+        self.stdout.write(self.style.SUCCESS(f"✅ Saved {before_ms - after_ms:.2f} ms per request"))
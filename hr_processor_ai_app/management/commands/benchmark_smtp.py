@@ -0,0 +1,91 @@
+from django.core.management.base import BaseCommand
+from django.core.mail import EmailMessage, get_connection, send_mail
+from django.test.utils import override_settings
+from hr_processor_ai_app.async_mailer import AsyncEmailBackend
+from hr_processor_ai_app.utils import CampaignMailer
+import asyncio
+import time
+
+
+class Command(BaseCommand):
+    help = 'Benchmark per-message SMTP sessions, one shared campaign connection and the async backend (local aiosmtpd server)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=100, help='Messages to send per run')
+        parser.add_argument('--port', type=int, default=8025, help='Port for the local aiosmtpd server')
+        parser.add_argument('--connections', type=int, default=3, help='Connections for the async backend')
+
+    def handle(self, *args, **options):
+        from aiosmtpd.controller import Controller
+        from aiosmtpd.handlers import Sink
+
+        count = options['count']
+        port = options['port']
+
+        controller = Controller(Sink(), hostname='127.0.0.1', port=port)
+        controller.start()
+
+        smtp_settings = {
+            'EMAIL_BACKEND': 'django.core.mail.backends.smtp.EmailBackend',
+            'EMAIL_HOST': '127.0.0.1',
+            'EMAIL_PORT': port,
+            'EMAIL_USE_TLS': False,
+            'EMAIL_HOST_USER': '',
+            'EMAIL_HOST_PASSWORD': '',
+            'DEFAULT_FROM_EMAIL': 'hr@example.com',
+        }
+
+        try:
+            with override_settings(**smtp_settings):
+                # Baseline: a new SMTP session per message (old behaviour)
+                start = time.perf_counter()
+                for i in range(count):
+                    send_mail(
+                        subject=f"Benchmark {i}",
+                        message="Benchmark body",
+                        from_email='hr@example.com',
+                        recipient_list=[f"candidate{i}@example.com"],
+                    )
+                per_message = time.perf_counter() - start
+
+                # Shared campaign connection
+                start = time.perf_counter()
+                with CampaignMailer(get_connection()) as mailer:
+                    for i in range(count):
+                        mailer.send(f"candidate{i}@example.com", f"Benchmark {i}", "Benchmark body")
+                shared = time.perf_counter() - start
+
+                # Async backend: messages spread over a few concurrent connections
+                async def send_async():
+                    messages = [
+                        EmailMessage(f"Benchmark {i}", "Benchmark body", 'hr@example.com', [f"candidate{i}@example.com"])
+                        for i in range(count)
+                    ]
+                    async with AsyncEmailBackend(max_connections=options['connections']) as backend:
+                        return await backend.send_messages(messages)
+
+                start = time.perf_counter()
+                async_sent = asyncio.run(send_async())
+                async_elapsed = time.perf_counter() - start
+        finally:
+            controller.stop()
+
+        self.stdout.write(f"📊 {count} messages against local aiosmtpd (no TLS/AUTH)")
+        self.stdout.write(
+            f"   New connection per message: {per_message:.3f}s "
+            f"({per_message / count * 1000:.2f} ms/msg)"
+        )
+        self.stdout.write(
+            f"   Shared campaign connection: {shared:.3f}s "
+            f"({shared / count * 1000:.2f} ms/msg)"
+        )
+        self.stdout.write(
+            f"   Async backend ({options['connections']} connections): {async_elapsed:.3f}s "
+            f"({async_elapsed / count * 1000:.2f} ms/msg, {async_sent / async_elapsed:.0f} msg/s, {async_sent}/{count} sent)"
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"✅ Per-message connection overhead: {(per_message - shared) / count * 1000:.2f} ms "
+                f"(real Gmail adds a TLS + AUTH round trip on top of this)"
+            )
+        )
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from hr_processor_ai_app.intent_router import get_model, skip_rate
+
+
+class Command(BaseCommand):
+    help = 'Report how many routing decisions skipped the LLM (patterns / local model)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None, help='Only count decisions from the last N days')
+
+    def handle(self, *args, **options):
+        stats = skip_rate(days=options['days'])
+        window = f"last {options['days']} days" if options['days'] else "all time"
+
+        self.stdout.write(f"📊 Routing decisions ({window}): {stats['total']}")
+        self.stdout.write(f"   Patterns:    {stats['pattern']}")
+        self.stdout.write(f"   Local model: {stats['model']}")
+        self.stdout.write(f"   LLM:         {stats['llm']}")
+        self.stdout.write(f"   Local model trained on {get_model().size} LLM decisions")
+        self.stdout.write(self.style.SUCCESS(f"✅ LLM skip rate: {stats['skip_rate']:.1%}"))
@@ -0,0 +1,137 @@
+from django.core.management.base import BaseCommand, CommandError
+from hr_processor_ai_app.memory_manager import memory_manager
+from django.utils import timezone
+from datetime import datetime, timedelta
+import base64
+import json
+import os
+
+# Checkpoints beyond the newest `keep` per thread/namespace, optionally only
+# for threads whose latest checkpoint is older than the inactivity cutoff
+STALE_CHECKPOINTS_SQL = """
+    WITH ranked AS (
+        SELECT thread_id, checkpoint_ns, checkpoint_id,
+               row_number() OVER (
+                   PARTITION BY thread_id, checkpoint_ns ORDER BY checkpoint_id DESC
+               ) AS rn,
+               max((checkpoint->>'ts')::timestamptz) OVER (
+                   PARTITION BY thread_id, checkpoint_ns
+               ) AS last_ts
+        FROM checkpoints
+    )
+    SELECT thread_id, checkpoint_ns, checkpoint_id
+    FROM ranked
+    WHERE rn > %(keep)s
+      AND (%(cutoff)s::timestamptz IS NULL OR last_ts < %(cutoff)s::timestamptz)
+"""
+
+# Channel blobs no remaining checkpoint points at any more
+ORPHAN_BLOBS_WHERE = """
+    NOT EXISTS (
+        SELECT 1 FROM checkpoints c
+        WHERE c.thread_id = b.thread_id
+          AND c.checkpoint_ns = b.checkpoint_ns
+          AND c.checkpoint->'channel_versions'->>b.channel = b.version
+    )
+"""
+
+
+def _jsonable(row):
+    return {
+        key: base64.b64encode(bytes(value)).decode() if isinstance(value, (bytes, memoryview)) else value
+        for key, value in row.items()
+    }
+
+
+class Command(BaseCommand):
+    help = 'Prune (and optionally archive) old LangGraph checkpoints, keeping the newest few per thread'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep', type=int, default=5, help='Checkpoints to keep per thread')
+        parser.add_argument('--inactive-days', type=int, default=None,
+                            help='Only prune threads with no checkpoint in this many days')
+        parser.add_argument('--archive-dir', default=None,
+                            help='Write pruned rows to a JSONL file in this directory before deleting')
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be pruned without deleting')
+
+    def handle(self, *args, **options):
+        import psycopg
+        from psycopg.rows import dict_row
+
+        keep = options['keep']
+        if keep < 1:
+            raise CommandError('--keep must be at least 1 so threads can resume')
+
+        cutoff = None
+        if options['inactive_days'] is not None:
+            cutoff = timezone.now() - timedelta(days=options['inactive_days'])
+
+        with psycopg.connect(memory_manager.build_conninfo(), row_factory=dict_row) as conn:
+            with conn.transaction():
+                cur = conn.cursor()
+                cur.execute(
+                    f"CREATE TEMP TABLE prune_targets ON COMMIT DROP AS {STALE_CHECKPOINTS_SQL}",
+                    {'keep': keep, 'cutoff': cutoff},
+                )
+                cur.execute("SELECT count(*) AS n, count(DISTINCT thread_id) AS threads FROM prune_targets")
+                totals = cur.fetchone()
+
+                if not totals['n']:
+                    self.stdout.write(self.style.SUCCESS('✅ Nothing to prune'))
+                    return
+
+                self.stdout.write(f"🧹 {totals['n']} checkpoints across {totals['threads']} threads to prune")
+
+                archive = None
+                if options['archive_dir'] and not options['dry_run']:
+                    archive = self._open_archive(options['archive_dir'])
+                    self._archive_rows(cur, archive, 'checkpoints', 'c')
+                    self._archive_rows(cur, archive, 'checkpoint_writes', 'w')
+
+                cur.execute("""
+                    DELETE FROM checkpoint_writes w USING prune_targets t
+                    WHERE w.thread_id = t.thread_id AND w.checkpoint_ns = t.checkpoint_ns
+                      AND w.checkpoint_id = t.checkpoint_id
+                """)
+                writes = cur.rowcount
+                cur.execute("""
+                    DELETE FROM checkpoints c USING prune_targets t
+                    WHERE c.thread_id = t.thread_id AND c.checkpoint_ns = t.checkpoint_ns
+                      AND c.checkpoint_id = t.checkpoint_id
+                """)
+                checkpoints = cur.rowcount
+
+                if archive:
+                    cur.execute(f"SELECT b.* FROM checkpoint_blobs b WHERE {ORPHAN_BLOBS_WHERE}")
+                    for row in cur:
+                        archive.write(json.dumps({'table': 'checkpoint_blobs', **_jsonable(row)}, default=str) + '\n')
+                    archive.close()
+                    self.stdout.write(f"📦 Archived pruned rows to {archive.name}")
+
+                cur.execute(f"DELETE FROM checkpoint_blobs b WHERE {ORPHAN_BLOBS_WHERE}")
+                blobs = cur.rowcount
+
+                if options['dry_run']:
+                    # Leaves the transaction block with everything rolled back
+                    raise psycopg.Rollback()
+
+        if options['dry_run']:
+            self.stdout.write(f"🔍 Dry run: would delete {checkpoints} checkpoints, {writes} writes, {blobs} blobs")
+            return
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Deleted {checkpoints} checkpoints, {writes} writes, {blobs} blobs"
+        ))
+
+    def _open_archive(self, archive_dir):
+        os.makedirs(archive_dir, exist_ok=True)
+        return open(os.path.join(archive_dir, f"checkpoints-{datetime.now():%Y%m%d-%H%M%S}.jsonl"), 'w')
+
+    def _archive_rows(self, cur, archive, table, alias):
+        cur.execute(f"""
+            SELECT {alias}.* FROM {table} {alias} JOIN prune_targets t
+              ON {alias}.thread_id = t.thread_id AND {alias}.checkpoint_ns = t.checkpoint_ns
+             AND {alias}.checkpoint_id = t.checkpoint_id
+        """)
+        for row in cur:
+            archive.write(json.dumps({'table': table, **_jsonable(row)}, default=str) + '\n')
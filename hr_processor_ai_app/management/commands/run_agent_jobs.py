@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from hr_processor_ai_app.jobs import process_jobs
+
+
+class Command(BaseCommand):
+    help = 'Background worker that runs queued chat jobs submitted to /api/jobs/'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=4, help='Jobs run at the same time')
+        parser.add_argument('--poll-interval', type=float, default=2.0, help='Seconds to sleep when the queue is empty')
+        parser.add_argument('--once', action='store_true', help='Exit once the queue is empty and running jobs have finished')
+
+    def handle(self, *args, **options):
+        concurrency = max(1, options['concurrency'])
+        poll_interval = options['poll_interval']
+
+        self.stdout.write(self.style.SUCCESS('🧵 Agent job worker started'))
+
+        try:
+            # A new job is claimed whenever one of the `concurrency` slots frees up
+            processed = process_jobs(concurrency=concurrency, once=options['once'], poll_interval=poll_interval)
+            self.stdout.write(f"⚙️ Ran {processed} jobs")
+
+        except KeyboardInterrupt:
+            self.stdout.write('🛑 Agent job worker stopped')
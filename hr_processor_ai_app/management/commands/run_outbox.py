@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from hr_processor_ai_app.outbox import drain_outbox
+import time
+
+
+class Command(BaseCommand):
+    help = 'Background worker that sends queued candidate emails from the outbox with retries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50, help='Emails claimed per batch')
+        parser.add_argument('--poll-interval', type=float, default=5.0, help='Seconds to sleep when the outbox is empty')
+        parser.add_argument('--once', action='store_true', help='Drain due emails once and exit')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        poll_interval = options['poll_interval']
+
+        self.stdout.write(self.style.SUCCESS('📬 Outbox worker started'))
+
+        try:
+            while True:
+                stats = drain_outbox(batch_size=batch_size)
+                processed = stats['sent'] + stats['retrying'] + stats['failed']
+
+                if processed or stats['deferred']:
+                    self.stdout.write(
+                        f"📤 Sent {stats['sent']}, retrying {stats['retrying']}, "
+                        f"failed {stats['failed']}, deferred {stats['deferred']}"
+                    )
+
+                if options['once'] and processed < batch_size:
+                    break
+                if not processed:
+                    time.sleep(poll_interval)
+
+        except KeyboardInterrupt:
+            self.stdout.write('🛑 Outbox worker stopped')
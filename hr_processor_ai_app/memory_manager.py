@@ -4,6 +4,7 @@ import asyncio
 
 
 import os
+import time
 import asyncio
 from psycopg_pool import AsyncConnectionPool
 from psycopg.rows import dict_row
@@ -29,66 +30,96 @@ LANGGRAPH_POSTGRES = {
 }
 
 class MemoryManager:
-    """Manages PostgreSQL memory for LangGraph agents"""
+    """
+    Manages PostgreSQL memory for LangGraph agents.
+    The pool and checkpointer are created once per process and shared by
+    every request; the checkpointer borrows a pooled connection per
+    operation and returns it when done.
+    """
     
     def __init__(self):
         self.pool = None
         self.memory = None
         self._setup_done = False
+        self._init_lock = None
+        self._last_failure = None  # monotonic time of the last failed initialize()
+    
+    def build_conninfo(self):
+        return (
+            f"postgres://{LANGGRAPH_POSTGRES['USERNAME']}:"
+            f"{LANGGRAPH_POSTGRES['PASSWORD']}@"
+            f"{LANGGRAPH_POSTGRES['HOST']}:"
+            f"{LANGGRAPH_POSTGRES['PORT']}/"
+            f"{LANGGRAPH_POSTGRES['DATABASE']}"
+            f"?sslmode={LANGGRAPH_POSTGRES['SSLMODE']}"
+        )
     
     async def initialize(self):
-        """Initialize PostgreSQL connection pool and memory"""
-        try:
-            # Create connection string
-            conninfo = (
-                f"postgres://{LANGGRAPH_POSTGRES['USERNAME']}:"
-                f"{LANGGRAPH_POSTGRES['PASSWORD']}@"
-                f"{LANGGRAPH_POSTGRES['HOST']}:"
-                f"{LANGGRAPH_POSTGRES['PORT']}/"
-                f"{LANGGRAPH_POSTGRES['DATABASE']}"
-                f"?sslmode={LANGGRAPH_POSTGRES['SSLMODE']}"
-            )
-            
-            # Create async connection pool
-            self.pool = AsyncConnectionPool(
-                conninfo=conninfo,
-                max_size=10,
-                kwargs={
-                    "autocommit": True,
-                    "prepare_threshold": 0,
-                    "row_factory": dict_row,
-                }
-            )
+        """Initialize PostgreSQL connection pool and memory (no-op once done)"""
+        if self.memory is not None:
+            return True
+        
+        # Don't hammer an unreachable database on every request
+        retry_after = getattr(settings, "LANGGRAPH_MEMORY_RETRY_SECONDS", 30)
+        if self._last_failure is not None and time.monotonic() - self._last_failure < retry_after:
+            return False
+        
+        if self._init_lock is None:
+            self._init_lock = asyncio.Lock()
+        
+        async with self._init_lock:
+            if self.memory is not None:
+                return True
             
-            # Get connection and setup memory
-            async with self.pool.connection() as conn:
-                self.memory = AsyncPostgresSaver(conn)
+            pool = None
+            try:
+                # Create async connection pool
+                pool = AsyncConnectionPool(
+                    conninfo=self.build_conninfo(),
+                    max_size=10,
+                    open=False,
+                    kwargs={
+                        "autocommit": True,
+                        "prepare_threshold": 0,
+                        "row_factory": dict_row,
+                    }
+                )
+                await pool.open(wait=True, timeout=10)
+                
+                # Checkpointer over the pool - each call checks a connection
+                # out and returns it, so nothing leaks between requests
+                memory = AsyncPostgresSaver(pool)
                 
                 # Setup tables on first run (only run once)
                 if not self._setup_done:
-                    await self.memory.setup()
+                    await memory.setup()
                     self._setup_done = True
                     logger.info("✅ LangGraph PostgreSQL memory initialized")
-            
-            return True
-            
-        except Exception as e:
-            logger.error(f"❌ Failed to initialize memory: {e}")
-            return False
+                
+                self.pool = pool
+                self.memory = memory
+                self._last_failure = None
+                return True
+                
+            except Exception as e:
+                logger.error(f"❌ Failed to initialize memory: {e}")
+                self._last_failure = time.monotonic()
+                if pool is not None:
+                    await pool.close()
+                return False
     
     async def get_memory(self):
-        """Get memory instance with fresh connection"""
-        if not self.pool:
+        """Get the shared checkpointer, or None if Postgres is unavailable"""
+        if self.memory is None:
             await self.initialize()
-        
-        # Get a new connection for this request
-        conn = await self.pool.getconn()
-        return AsyncPostgresSaver(conn), conn
+        return self.memory
     
     async def close(self):
         """Close connection pool"""
         if self.pool:
             await self.pool.close()
+        self.pool = None
+        self.memory = None
 
 # Global memory manager instance
-memory_manager = MemoryManager()
\ No newline at end of file
+memory_manager = MemoryManager()
@@ -1,17 +1,14 @@
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, SystemMessage
-from langchain_google_genai import ChatGoogleGenerativeAI
 from typing import List, Dict
+import asyncio
 import json
 import os
+from .async_runtime import db_sync_to_async
+from . import llm_gateway
 from dotenv import load_dotenv
 
 load_dotenv()
 
-llm = ChatGoogleGenerativeAI(
-    model="models/gemini-2.0-flash",
-    temperature=0.3,  # Lower temperature for consistent memory processing
-    google_api_key=os.getenv("GEMINI_API_KEY")
-)
 
 def extract_memory_context(messages: List[BaseMessage], current_message: str) -> Dict:
     """Extract relevant context from conversation history"""
@@ -60,10 +57,10 @@ Focus on:
 """
 
     try:
-        response = llm.invoke([
+        response = llm_gateway.invoke([
             SystemMessage(content="Extract conversation context as JSON only."),
             HumanMessage(content=memory_prompt)
-        ]).content.strip()
+        ], node="memory_context").content.strip()
         
         # Clean JSON response
         if response.startswith('```json'):
@@ -88,3 +85,149 @@ Focus on:
             "conversation_summary": "Ongoing HR session",
             "user_preferences": {}
         }
+
+
+def _parse_json_response(response: str) -> Dict:
+    if response.startswith('```json'):
+        response = response.replace('```json', '').replace('```', '').strip()
+    elif response.startswith('```'):
+        response = response.replace('```', '').strip()
+    return json.loads(response)
+
+
+def get_memory_context(thread_id: str, messages: List[BaseMessage], current_message: str) -> Dict:
+    """
+    Hot-path memory read: return the thread's rolling summary from the
+    database. Threads that predate rolling summaries (history but no row
+    yet) fall back to a one-off extract_memory_context call.
+    """
+    from .models import ConversationSummary
+    from .semantic_memory import format_snippets, retrieve_relevant
+
+    row = ConversationSummary.objects.filter(thread_id=thread_id).first()
+    if row is None:
+        memory_data = extract_memory_context(messages, current_message)
+    else:
+        memory_data = {
+            "memory_context": row.relevant_context,
+            "conversation_summary": row.summary,
+            "user_preferences": row.user_preferences,
+            "session_type": row.session_type,
+            "previous_actions": row.previous_actions
+        }
+
+    # Earlier turns relevant to this message, however far back they were
+    retrieved_context = format_snippets(retrieve_relevant(thread_id, current_message))
+    memory_data["retrieved_context"] = retrieved_context
+    if retrieved_context:
+        memory_data["memory_context"] = (
+            f"{memory_data.get('memory_context') or ''}\n\n"
+            f"RELEVANT EARLIER MESSAGES:\n{retrieved_context}"
+        ).strip()
+
+    return memory_data
+
+
+def update_rolling_summary(thread_id: str, user_message: str, ai_response: str) -> None:
+    """Fold only the newest exchange into the thread's stored summary"""
+    from .models import ConversationSummary
+
+    row, _ = ConversationSummary.objects.get_or_create(thread_id=thread_id)
+
+    fold_prompt = f"""
+You maintain a running summary of an HR assistant conversation.
+
+CURRENT SUMMARY:
+{row.summary or "(empty - this is the first exchange)"}
+
+KNOWN USER PREFERENCES:
+{json.dumps(row.user_preferences)}
+
+PREVIOUS ACTIONS:
+{json.dumps(row.previous_actions)}
+
+NEW EXCHANGE:
+User: {user_message}
+Assistant: {(ai_response or "")[:2000]}
+
+Update the summary to include the new exchange. Keep it brief and keep
+earlier details that still matter. Return ONLY JSON with these fields:
+{{
+    "conversation_summary": "Updated brief summary of what has been discussed",
+    "user_preferences": {{"key": "value", "preference_type": "user_preference"}},
+    "relevant_context": "Most relevant context for the next request",
+    "session_type": "type of HR session (screening/emailing/general)",
+    "previous_actions": ["action1", "action2"]
+}}
+
+Focus on:
+- HR-related preferences (email tone, screening criteria, etc.)
+- Previous tasks completed in this session
+- User's communication style
+- Relevant decisions made earlier
+"""
+
+    try:
+        response = llm_gateway.invoke([
+            SystemMessage(content="Update the conversation summary as JSON only."),
+            HumanMessage(content=fold_prompt)
+        ], node="rolling_summary").content.strip()
+
+        memory_data = _parse_json_response(response)
+    except Exception as e:
+        print(f"❌ Error updating rolling summary: {e}")
+        return
+
+    row.summary = memory_data.get("conversation_summary", row.summary)
+    row.relevant_context = memory_data.get("relevant_context", row.relevant_context)
+    row.user_preferences = memory_data.get("user_preferences", row.user_preferences) or {}
+    row.session_type = memory_data.get("session_type", row.session_type) or "general"
+    row.previous_actions = (memory_data.get("previous_actions", row.previous_actions) or [])[-20:]
+    row.turns_folded += 1
+    row.save()
+
+
+# Background summary updates, serialized per thread so folds never race.
+# A thread's lock is dropped once no fold holds or waits for it.
+_summary_locks: Dict[str, asyncio.Lock] = {}
+_summary_lock_users: Dict[str, int] = {}
+_summary_tasks = set()
+
+
+def index_exchange(thread_id: str, user_message: str, ai_response: str, tool_outputs: list = ()) -> None:
+    from .semantic_memory import index_exchange as index_semantic
+
+    try:
+        index_semantic(thread_id, user_message, ai_response, tool_outputs)
+    except Exception as e:
+        print(f"❌ Error indexing conversation snippets: {e}")
+
+
+def schedule_summary_update(thread_id: str, user_message: str, ai_response: str, tool_outputs: list = ()) -> None:
+    """
+    Fold the finished turn into the rolling summary and the thread's
+    semantic index (including `tool_outputs`, see semantic_memory.agent_outputs)
+    after the response has been returned. Must be called from a running event loop.
+    """
+    if not thread_id:
+        return
+
+    async def fold():
+        lock = _summary_locks.setdefault(thread_id, asyncio.Lock())
+        _summary_lock_users[thread_id] = _summary_lock_users.get(thread_id, 0) + 1
+        try:
+            async with lock:
+                # Index the user's message even when no answer came back - stated
+                # preferences matter more than the reply
+                await db_sync_to_async(index_exchange)(thread_id, user_message, ai_response, tool_outputs)
+                if ai_response:
+                    await db_sync_to_async(update_rolling_summary)(thread_id, user_message, ai_response)
+        finally:
+            _summary_lock_users[thread_id] -= 1
+            if not _summary_lock_users[thread_id]:
+                del _summary_lock_users[thread_id]
+                del _summary_locks[thread_id]
+
+    task = asyncio.get_running_loop().create_task(fold())
+    _summary_tasks.add(task)
+    task.add_done_callback(_summary_tasks.discard)
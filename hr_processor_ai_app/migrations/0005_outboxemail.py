@@ -0,0 +1,43 @@
+# Generated by Django 4.2.30 on 2026-10-19 12:58
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hr_processor_ai_app', '0004_jobapplicationscreeningresult'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jobapplicationscreeningresult',
+            name='body',
+            field=models.TextField(default=''),
+            preserve_default=False,
+        ),
+        migrations.CreateModel(
+            name='OutboxEmail',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('campaign_id', models.CharField(max_length=200)),
+                ('session_id', models.CharField(max_length=100)),
+                ('candidate_name', models.CharField(max_length=255)),
+                ('candidate_email', models.EmailField(max_length=254)),
+                ('idempotency_key', models.CharField(max_length=64, unique=True)),
+                ('subject', models.CharField(max_length=500)),
+                ('body', models.TextField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('sending', 'Sending'), ('sent', 'Sent'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='outbox_status_next_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.30 on 2026-10-19 12:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hr_processor_ai_app', '0005_outboxemail'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MailRateBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('provider', models.CharField(max_length=50)),
+                ('window', models.CharField(max_length=20)),
+                ('tokens', models.FloatField()),
+                ('updated_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='mailratebucket',
+            constraint=models.UniqueConstraint(fields=('provider', 'window'), name='unique_mail_rate_bucket'),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 4.2.30 on 2026-10-19 13:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+import re
+
+
+def normalize_email(sender):
+    if not sender:
+        return ""
+    match = re.search(r'<([^>]+)>', sender)
+    if match:
+        return match.group(1).strip().lower()
+    return sender.strip().lower() if '@' in sender else ""
+
+
+def link_screening_results(apps, schema_editor):
+    """Backfill the normalized email and source EmailRecord for existing rows"""
+    EmailRecord = apps.get_model('hr_processor_ai_app', 'EmailRecord')
+    JobApplicationScreeningResult = apps.get_model('hr_processor_ai_app', 'JobApplicationScreeningResult')
+
+    records_by_sender = {}
+    for record in EmailRecord.objects.order_by('id').only('id', 'session_id', 'sender').iterator():
+        key = (record.session_id, normalize_email(record.sender))
+        records_by_sender.setdefault(key, record.id)
+
+    for result in JobApplicationScreeningResult.objects.iterator():
+        normalized = normalize_email(result.candidate_email)
+        result.candidate_email_normalized = normalized
+        result.email_record_id = records_by_sender.get((result.session_id, normalized))
+        result.save(update_fields=['candidate_email_normalized', 'email_record'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hr_processor_ai_app', '0006_mailratebucket'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jobapplicationscreeningresult',
+            name='candidate_email_normalized',
+            field=models.CharField(blank=True, default='', max_length=254),
+        ),
+        migrations.AddField(
+            model_name='jobapplicationscreeningresult',
+            name='email_record',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='screening_results', to='hr_processor_ai_app.emailrecord'),
+        ),
+        migrations.AddIndex(
+            model_name='jobapplicationscreeningresult',
+            index=models.Index(fields=['session_id', 'screening_status'], name='screening_session_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='jobapplicationscreeningresult',
+            index=models.Index(fields=['session_id', 'candidate_email_normalized'], name='screening_session_email_idx'),
+        ),
+        migrations.RunPython(link_screening_results, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.30 on 2026-10-19 13:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hr_processor_ai_app', '0007_screening_email_record_link'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConversationSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('thread_id', models.CharField(max_length=100, unique=True)),
+                ('summary', models.TextField(blank=True, default='')),
+                ('relevant_context', models.TextField(blank=True, default='')),
+                ('user_preferences', models.JSONField(blank=True, default=dict)),
+                ('previous_actions', models.JSONField(blank=True, default=list)),
+                ('session_type', models.CharField(default='general', max_length=50)),
+                ('turns_folded', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
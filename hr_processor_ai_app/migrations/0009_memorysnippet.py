@@ -0,0 +1,27 @@
+# Generated by Django 4.2.30 on 2026-10-19 13:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hr_processor_ai_app', '0008_conversationsummary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MemorySnippet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('thread_id', models.CharField(max_length=100)),
+                ('role', models.CharField(max_length=20)),
+                ('content', models.TextField()),
+                ('vector', models.JSONField(default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['thread_id', 'created_at'], name='memory_snippet_thread_idx')],
+            },
+        ),
+    ]
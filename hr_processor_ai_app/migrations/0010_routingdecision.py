@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-19 13:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hr_processor_ai_app', '0009_memorysnippet'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RoutingDecision',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('message', models.TextField()),
+                ('classification', models.CharField(max_length=50)),
+                ('task_classification', models.CharField(default='other', max_length=100)),
+                ('target_key', models.CharField(blank=True, max_length=50, null=True)),
+                ('source', models.CharField(choices=[('pattern', 'Pattern'), ('model', 'Local model'), ('llm', 'LLM')], max_length=20)),
+                ('confidence', models.FloatField(default=1.0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['source', 'created_at'], name='routing_source_created_idx')],
+            },
+        ),
+    ]
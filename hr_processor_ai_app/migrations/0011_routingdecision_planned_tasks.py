@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 13:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hr_processor_ai_app', '0010_routingdecision'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='routingdecision',
+            name='planned_tasks',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
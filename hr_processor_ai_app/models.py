@@ -1,5 +1,7 @@
 # models.py
 from django.db import models
+from django.utils import timezone
+import uuid
 
 class EmailRecord(models.Model):
     id = models.AutoField(primary_key=True)  # Explicit primary key
@@ -28,13 +30,217 @@ class EmailAttachment(models.Model):
     
 class JobApplicationScreeningResult(models.Model):
     session_id = models.CharField(max_length=100)
+    email_record = models.ForeignKey(
+        EmailRecord, related_name='screening_results', null=True, blank=True, on_delete=models.SET_NULL
+    )  # Source application email
     candidate_name = models.CharField(max_length=255)
     candidate_email = models.EmailField()
+    candidate_email_normalized = models.CharField(max_length=254, blank=True, default="")  # bare lowercase address
     screening_status = models.CharField(max_length=20)  # shortlisted / rejected
     reason = models.TextField()
     body = models.TextField()
     resume_text = models.TextField()
     timestamp = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["session_id", "screening_status"], name="screening_session_status_idx"),
+            models.Index(fields=["session_id", "candidate_email_normalized"], name="screening_session_email_idx"),
+        ]
+
     def __str__(self):
         return f"{self.candidate_name} - {self.screening_status}"
+
+
+class OutboxEmail(models.Model):
+    """
+    Durable queue of outbound candidate emails, drained by the `run_outbox`
+    worker. `idempotency_key` makes re-running a campaign a no-op for
+    candidates that were already queued or emailed.
+    """
+    STATUS_PENDING = "pending"
+    STATUS_SENDING = "sending"
+    STATUS_SENT = "sent"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_PENDING, "Pending"),
+        (STATUS_SENDING, "Sending"),
+        (STATUS_SENT, "Sent"),
+        (STATUS_FAILED, "Failed"),
+    ]
+
+    campaign_id = models.CharField(max_length=200)  # session_id:target_key
+    session_id = models.CharField(max_length=100)
+    candidate_name = models.CharField(max_length=255)
+    candidate_email = models.EmailField()
+    idempotency_key = models.CharField(max_length=64, unique=True)
+    subject = models.CharField(max_length=500)
+    body = models.TextField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"], name="outbox_status_next_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.candidate_email} - {self.status}"
+
+
+class MailRateBucket(models.Model):
+    """
+    Token bucket state for outbound mail, one row per (provider, window).
+    Kept in the database so every web and worker process shares the same limits.
+    """
+    provider = models.CharField(max_length=50)  # gmail / outlook / default
+    window = models.CharField(max_length=20)  # per_second / per_minute / per_day
+    tokens = models.FloatField()
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["provider", "window"], name="unique_mail_rate_bucket"),
+        ]
+
+    def __str__(self):
+        return f"{self.provider} {self.window}: {self.tokens:.2f}"
+
+
+class ConversationSummary(models.Model):
+    """
+    Rolling per-thread conversation summary. Each turn folds only the newest
+    exchange into it, so reading memory context is a single row lookup.
+    """
+    thread_id = models.CharField(max_length=100, unique=True)
+    summary = models.TextField(blank=True, default="")
+    relevant_context = models.TextField(blank=True, default="")
+    user_preferences = models.JSONField(default=dict, blank=True)
+    previous_actions = models.JSONField(default=list, blank=True)
+    session_type = models.CharField(max_length=50, default="general")
+    turns_folded = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.thread_id} ({self.turns_folded} turns)"
+
+
+class MemorySnippet(models.Model):
+    """
+    One past message or tool result of a thread, with its hashed
+    bag-of-words vector, for semantic retrieval over the whole session.
+    """
+    thread_id = models.CharField(max_length=100)
+    role = models.CharField(max_length=20)  # user / assistant / tool
+    content = models.TextField()
+    vector = models.JSONField(default=dict)  # sparse {bucket: weight}, L2-normalised
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["thread_id", "created_at"], name="memory_snippet_thread_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.thread_id} [{self.role}] {self.content[:50]}"
+
+
+class RoutingDecision(models.Model):
+    """
+    One routing decision of the router node. LLM-made decisions are the
+    training data for the local intent model; the source mix gives the
+    LLM skip rate.
+    """
+    SOURCE_CHOICES = [
+        ("pattern", "Pattern"),
+        ("model", "Local model"),
+        ("llm", "LLM"),
+    ]
+
+    message = models.TextField()
+    classification = models.CharField(max_length=50)
+    task_classification = models.CharField(max_length=100, default="other")
+    target_key = models.CharField(max_length=50, null=True, blank=True)
+    planned_tasks = models.JSONField(default=list, blank=True)  # compound requests only
+    source = models.CharField(max_length=20, choices=SOURCE_CHOICES)
+    confidence = models.FloatField(default=1.0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["source", "created_at"], name="routing_source_created_idx"),
+        ]
+
+    def __str__(self):
+        return f"[{self.source}] {self.classification}/{self.task_classification}: {self.message[:50]}"
+
+
+class AgentJob(models.Model):
+    """
+    A chat message run by the background job worker (`python manage.py
+    run_agent_jobs`) instead of inside the HTTP request. Clients poll the
+    job endpoints for progress and the final result.
+    """
+    STATUS_QUEUED = "queued"
+    STATUS_RUNNING = "running"
+    STATUS_SUCCEEDED = "succeeded"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, "Queued"),
+        (STATUS_RUNNING, "Running"),
+        (STATUS_SUCCEEDED, "Succeeded"),
+        (STATUS_FAILED, "Failed"),
+    ]
+
+    job_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    session_id = models.CharField(max_length=100)
+    message = models.TextField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    current_step = models.CharField(max_length=100, blank=True, default="")  # last graph node reached
+    progress = models.JSONField(default=dict, blank=True)  # latest {"event", "done", "total"} reported by a node
+    events = models.JSONField(default=list, blank=True)  # recent node / progress events, oldest first
+    result = models.JSONField(null=True, blank=True)  # same payload as the chat endpoint
+    error = models.TextField(blank=True, default="")
+    attempts = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "created_at"], name="agentjob_status_created_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.job_id} - {self.status}"
+
+
+class LLMCacheEntry(models.Model):
+    """
+    A cached LLM response, keyed by model, temperature and normalized
+    messages. Used only by call sites that opt in (llm_gateway cache=True);
+    evicted by TTL and least-recent use (llm_cache.py).
+    """
+    key = models.CharField(max_length=64, unique=True)  # sha256 of model/temperature/messages
+    node = models.CharField(max_length=50)
+    model = models.CharField(max_length=100)
+    content = models.TextField()
+    hits = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["last_used_at"], name="llmcache_last_used_idx"),
+            models.Index(fields=["expires_at"], name="llmcache_expires_idx"),
+        ]
+
+    def __str__(self):
+        return f"[{self.node}] {self.key[:12]} ({self.hits} hits)"
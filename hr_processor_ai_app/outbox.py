@@ -0,0 +1,166 @@
+import hashlib
+import random
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import OutboxEmail
+from .rate_limiter import acquire
+from .utils import CampaignMailer, deliver_to_candidate
+
+
+def campaign_id_for(session_id: str, target_key: str) -> str:
+    """
+    One campaign per (session, target group). A session can therefore never
+    re-send to the same target group: once a candidate is queued or sent,
+    later requests only report that status (failed rows are requeued).
+    Contacting the group again needs a new chat session.
+    """
+    return f"{session_id}:{target_key}"
+
+
+def idempotency_key_for(campaign_id: str, candidate_email: str) -> str:
+    """Stable key, sha256(session_id:target_key|email), so a candidate is never queued twice for one campaign"""
+    raw = f"{campaign_id}|{candidate_email.strip().lower()}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def enqueue_email(session_id: str, target_key: str, candidate_data: dict, email_content: dict):
+    """
+    Queue one candidate email for the background sender.
+    Returns (outbox_row, status) where status is "queued", "requeued" (a
+    previously failed row was reset), or the existing row's status if the
+    candidate was already queued/sent for this campaign.
+    """
+    campaign_id = campaign_id_for(session_id, target_key)
+    candidate_email = candidate_data["candidate_email"]
+    key = idempotency_key_for(campaign_id, candidate_email)
+
+    with transaction.atomic():
+        row, created = OutboxEmail.objects.select_for_update().get_or_create(
+            idempotency_key=key,
+            defaults={
+                "campaign_id": campaign_id,
+                "session_id": session_id,
+                "candidate_name": candidate_data.get("candidate_name") or "Unknown",
+                "candidate_email": candidate_email,
+                "subject": email_content["subject"],
+                "body": email_content["body"],
+            },
+        )
+        if created:
+            return row, "queued"
+
+        if row.status == OutboxEmail.STATUS_FAILED:
+            row.subject = email_content["subject"]
+            row.body = email_content["body"]
+            row.status = OutboxEmail.STATUS_PENDING
+            row.attempts = 0
+            row.next_attempt_at = timezone.now()
+            row.last_error = ""
+            row.save()
+            return row, "requeued"
+
+        return row, row.status
+
+
+def retry_delay(attempts: int) -> timedelta:
+    """Exponential backoff with jitter: base * 2^(attempts-1), capped"""
+    base = getattr(settings, "OUTBOX_RETRY_BASE_SECONDS", 30)
+    cap = getattr(settings, "OUTBOX_RETRY_MAX_SECONDS", 3600)
+    delay = min(cap, base * (2 ** max(0, attempts - 1)))
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def release_stale_claims():
+    """Return rows stuck in 'sending' (worker died mid-send) to the queue"""
+    timeout = getattr(settings, "OUTBOX_SENDING_TIMEOUT_SECONDS", 600)
+    cutoff = timezone.now() - timedelta(seconds=timeout)
+    return OutboxEmail.objects.filter(
+        status=OutboxEmail.STATUS_SENDING, updated_at__lt=cutoff
+    ).update(status=OutboxEmail.STATUS_PENDING, next_attempt_at=timezone.now())
+
+
+def claim_batch(batch_size: int):
+    """
+    Atomically claim due rows for this worker. SKIP LOCKED lets several
+    workers drain the same outbox without double-sending.
+    """
+    with transaction.atomic():
+        rows = list(
+            OutboxEmail.objects.select_for_update(skip_locked=True)
+            .filter(status=OutboxEmail.STATUS_PENDING, next_attempt_at__lte=timezone.now())
+            .order_by("next_attempt_at")[:batch_size]
+        )
+        for row in rows:
+            row.status = OutboxEmail.STATUS_SENDING
+            row.attempts += 1
+            row.save(update_fields=["status", "attempts", "updated_at"])
+    return rows
+
+
+def drain_outbox(batch_size: int = 50):
+    """
+    Send one batch of due outbox emails over a shared SMTP connection.
+    Returns a dict with sent / retrying / failed / deferred counts.
+    """
+    max_attempts = getattr(settings, "OUTBOX_MAX_ATTEMPTS", 5)
+    stats = {"sent": 0, "retrying": 0, "failed": 0, "deferred": 0}
+
+    release_stale_claims()
+    rows = claim_batch(batch_size)
+    if not rows:
+        return stats
+
+    mailer = CampaignMailer()
+    try:
+        mailer.open()
+    except Exception as e:
+        print(f"⚠️ Could not open shared SMTP connection, sending per message: {e}")
+        mailer = None
+
+    try:
+        for position, row in enumerate(rows):
+            # Wait briefly for a rate-limit slot; if the provider window is
+            # exhausted, hand the rest of the batch back without using an attempt
+            acquired, retry_after = acquire(max_wait=getattr(settings, "EMAIL_RATE_LIMIT_MAX_WAIT_SECONDS", 60))
+            if not acquired:
+                deferred = rows[position:]
+                OutboxEmail.objects.filter(id__in=[r.id for r in deferred]).update(
+                    status=OutboxEmail.STATUS_PENDING,
+                    attempts=F("attempts") - 1,
+                    next_attempt_at=timezone.now() + timedelta(seconds=retry_after),
+                )
+                stats["deferred"] = len(deferred)
+                print(f"⏳ Rate limit reached, deferring {len(deferred)} emails for {retry_after:.0f}s")
+                break
+
+            try:
+                deliver_to_candidate(row.candidate_email, row.subject, row.body, mailer=mailer, throttle=False)
+                error = None
+            except Exception as e:
+                print(f"❌ Failed to send email to {row.candidate_email}: {e}")
+                error = f"{type(e).__name__}: {e}"[:1000]
+
+            if error is None:
+                row.status = OutboxEmail.STATUS_SENT
+                row.sent_at = timezone.now()
+                row.last_error = ""
+                stats["sent"] += 1
+            elif row.attempts >= max_attempts:
+                row.status = OutboxEmail.STATUS_FAILED
+                row.last_error = f"Gave up after {row.attempts} attempts: {error}"
+                stats["failed"] += 1
+            else:
+                row.status = OutboxEmail.STATUS_PENDING
+                row.next_attempt_at = timezone.now() + retry_delay(row.attempts)
+                row.last_error = f"Attempt {row.attempts} failed: {error}"
+                stats["retrying"] += 1
+
+            row.save(update_fields=["status", "sent_at", "last_error", "next_attempt_at", "updated_at"])
+    finally:
+        if mailer is not None:
+            mailer.close()
+
+    return stats
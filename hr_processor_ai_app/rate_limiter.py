@@ -0,0 +1,111 @@
+import time
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.utils import timezone
+from .models import MailRateBucket
+
+WINDOW_SECONDS = {
+    "per_second": 1,
+    "per_minute": 60,
+    "per_hour": 3600,
+    "per_day": 86400,
+}
+
+def provider_for_host(host: str) -> str:
+    """Map an SMTP host to the provider whose sending limits apply"""
+    host = (host or "").lower()
+    if "gmail" in host or "google" in host:
+        return "gmail"
+    if "outlook" in host or "office365" in host or "hotmail" in host:
+        return "outlook"
+    return "default"
+
+
+def get_limits(provider: str) -> dict:
+    """The provider's windows from settings.EMAIL_RATE_LIMITS, falling back to its "default" entry"""
+    limits = settings.EMAIL_RATE_LIMITS.get(provider) or settings.EMAIL_RATE_LIMITS.get("default")
+    if not limits:
+        raise ImproperlyConfigured(f"EMAIL_RATE_LIMITS has no entry for '{provider}' and no 'default'")
+    for window in limits:
+        if window not in WINDOW_SECONDS:
+            raise ImproperlyConfigured(
+                f"EMAIL_RATE_LIMITS['{provider}'] has unknown window '{window}', "
+                f"expected one of {', '.join(WINDOW_SECONDS)}"
+            )
+    return limits
+
+
+def _lock_buckets(provider: str) -> dict:
+    return {b.window: b for b in MailRateBucket.objects.select_for_update().filter(provider=provider)}
+
+
+def try_acquire(provider: str) -> float:
+    """
+    Take one token from every window of the provider's buckets.
+    Returns 0 when the send may go ahead, otherwise the seconds to wait
+    until all windows have a token again (nothing is consumed in that case).
+    """
+    limits = get_limits(provider)
+    now = timezone.now()
+
+    with transaction.atomic():
+        buckets = _lock_buckets(provider)
+        missing = [window for window in limits if window not in buckets]
+        if missing:
+            # First use: create the rows (a concurrent creator wins the
+            # conflict), then lock them like any other
+            MailRateBucket.objects.bulk_create(
+                [
+                    MailRateBucket(provider=provider, window=window, tokens=float(limits[window]), updated_at=now)
+                    for window in missing
+                ],
+                ignore_conflicts=True,
+            )
+            buckets = _lock_buckets(provider)
+
+        wait = 0.0
+        for window, capacity in limits.items():
+            bucket = buckets[window]
+
+            # Refill proportionally to the time elapsed since the last update
+            refill_rate = capacity / WINDOW_SECONDS[window]
+            elapsed = max(0.0, (now - bucket.updated_at).total_seconds())
+            bucket.tokens = min(float(capacity), bucket.tokens + elapsed * refill_rate)
+            bucket.updated_at = now
+
+            if bucket.tokens < 1:
+                wait = max(wait, (1 - bucket.tokens) / refill_rate)
+
+        if wait == 0:
+            for window in limits:
+                buckets[window].tokens -= 1
+
+        for window in limits:
+            buckets[window].save(update_fields=["tokens", "updated_at"])
+
+    return wait
+
+
+def acquire(provider: str = None, max_wait: float = None):
+    """
+    Block until a send slot is available for `provider` (defaults to the
+    configured EMAIL_HOST), waiting at most `max_wait` seconds. Pass
+    max_wait=0 to check without blocking, e.g. inside a web request.
+    Returns (acquired, retry_after_seconds).
+    """
+    provider = provider or provider_for_host(getattr(settings, "EMAIL_HOST", ""))
+    if max_wait is None:
+        max_wait = getattr(settings, "EMAIL_RATE_LIMIT_MAX_WAIT_SECONDS", 60)
+
+    deadline = time.monotonic() + max_wait
+    while True:
+        wait = try_acquire(provider)
+        if wait == 0:
+            return True, 0.0
+
+        remaining = deadline - time.monotonic()
+        if wait > remaining:
+            return False, wait
+
+        time.sleep(wait)
@@ -0,0 +1,169 @@
+import math
+import re
+import zlib
+from collections import Counter
+from typing import Dict, List
+from django.conf import settings
+from .models import MemorySnippet
+
+# Hashed bag-of-words "embeddings": no model download or API call, cheap
+# enough to score a session's recent history on every turn.
+VECTOR_BUCKETS = 2 ** 18
+MAX_SNIPPET_CHARS = 600
+
+_TOKEN_RE = re.compile(r"[a-z0-9][a-z0-9+#.\-]*[a-z0-9+#]|[a-z0-9]")
+_STOPWORDS = frozenset("""
+a an and are as at be but by can do for from has have i in is it me my of on or please
+so that the their them then there this to us was we what when which will with you your
+""".split())
+
+
+def _fold_plural(token: str) -> str:
+    # "emails" should match "email", "candidates" should match "candidate"
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    return [_fold_plural(t) for t in _TOKEN_RE.findall((text or "").lower()) if t not in _STOPWORDS]
+
+
+def embed(text: str) -> Dict[str, float]:
+    """Sparse L2-normalised vector of hashed unigrams and bigrams (sublinear tf)"""
+    tokens = tokenize(text)
+    terms = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    counts = Counter(zlib.crc32(term.encode()) % VECTOR_BUCKETS for term in terms)
+
+    weights = {bucket: 1.0 + math.log(count) for bucket, count in counts.items()}
+    norm = math.sqrt(sum(w * w for w in weights.values()))
+    if not norm:
+        return {}
+    # JSON object keys are strings, so store them that way from the start
+    return {str(bucket): round(w / norm, 5) for bucket, w in weights.items()}
+
+
+def cosine(a: Dict[str, float], b: Dict[str, float]) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(weight * b.get(bucket, 0.0) for bucket, weight in a.items())
+
+
+def split_snippets(text: str) -> List[str]:
+    """Break long responses into paragraph-sized snippets so each one scores on its own topic"""
+    snippets, current = [], ""
+    for paragraph in re.split(r"\n\s*\n", (text or "").strip()):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if current and len(current) + len(paragraph) > MAX_SNIPPET_CHARS:
+            snippets.append(current)
+            current = ""
+        current = f"{current}\n{paragraph}".strip()
+        while len(current) > MAX_SNIPPET_CHARS:
+            snippets.append(current[:MAX_SNIPPET_CHARS])
+            current = current[MAX_SNIPPET_CHARS:]
+    if current:
+        snippets.append(current)
+    return snippets
+
+
+def _snippet_rows(thread_id: str, role: str, text: str) -> List[MemorySnippet]:
+    return [
+        MemorySnippet(thread_id=thread_id, role=role, content=snippet, vector=vector)
+        for snippet in split_snippets(text)
+        if (vector := embed(snippet))
+    ]
+
+
+def _store(thread_id: str, rows: List[MemorySnippet]) -> int:
+    MemorySnippet.objects.bulk_create(rows)
+
+    # Keep each thread's index bounded - oldest snippets go first
+    max_snippets = getattr(settings, "SEMANTIC_MEMORY_MAX_SNIPPETS", 500)
+    stale_ids = list(
+        MemorySnippet.objects.filter(thread_id=thread_id)
+        .order_by("-created_at", "-id")
+        .values_list("id", flat=True)[max_snippets:]
+    )
+    if stale_ids:
+        MemorySnippet.objects.filter(id__in=stale_ids).delete()
+    return len(rows)
+
+
+def index_text(thread_id: str, role: str, text: str) -> int:
+    """Store a message or tool result for later retrieval; returns snippets added"""
+    return _store(thread_id, _snippet_rows(thread_id, role, text))
+
+
+def index_exchange(thread_id: str, user_message: str, ai_response: str, tool_outputs: List[str] = ()) -> None:
+    """Index one turn: the message, the reply and each tool result as its own snippet"""
+    rows = _snippet_rows(thread_id, "user", user_message) + _snippet_rows(thread_id, "assistant", ai_response)
+    for output in tool_outputs:
+        rows += _snippet_rows(thread_id, "tool", output)
+    _store(thread_id, rows)
+
+
+def agent_outputs(state: dict) -> List[str]:
+    """
+    Tool results of the agents that ran this turn - fetched emails, screening
+    verdicts and campaign sends - one line per item, so a later "what did we
+    decide about X" can find them. Nodes carry the whole state forward, so
+    only the outputs of this turn's agents are taken.
+    """
+    agent = state.get("current_agent")
+    if agent == "task_planner_agent":
+        ran = {task for task, response in (state.get("task_results") or {}).items()
+               if not str(response).startswith("Error: ")}
+    else:
+        ran = {agent}
+
+    lines = []
+    if "email_fetcher&responder_agent" in ran:
+        for fetched in state.get("emails") or []:
+            lines.append(f"Fetched {fetched.get('email_type')} email from {fetched.get('sender')}: {fetched.get('subject')}")
+    if "job_application_screening_agent" in ran:
+        for verdict in state.get("screening_results") or []:
+            lines.append(f"Screened {verdict['candidate']}: {verdict['screening_status']} ({verdict['reason']})")
+    if "email_team_agent" in ran:
+        campaign = state.get("email_results") or {}
+        for sent in campaign.get("detailed_results") or []:
+            lines.append(
+                f"Campaign email to {sent['candidate_name']} <{sent['candidate_email']}> "
+                f"({campaign.get('target_key')}): {sent.get('status') or ('sent' if sent['success'] else 'failed')}"
+            )
+    return lines
+
+
+def retrieve_relevant(thread_id: str, query: str, k: int = None) -> List[Dict]:
+    """
+    Top-k snippets of this thread most similar to the query, best first.
+    Only the newest SEMANTIC_MEMORY_SCAN_LIMIT snippets sharing at least one
+    term with the query are loaded - anything else would score 0 anyway.
+    """
+    k = k or getattr(settings, "SEMANTIC_MEMORY_TOP_K", 4)
+    min_score = getattr(settings, "SEMANTIC_MEMORY_MIN_SCORE", 0.15)
+    scan_limit = getattr(settings, "SEMANTIC_MEMORY_SCAN_LIMIT", 200)
+
+    query_vector = embed(query)
+    if not thread_id or not query_vector:
+        return []
+
+    candidates = (
+        MemorySnippet.objects.filter(thread_id=thread_id, vector__has_any_keys=list(query_vector))
+        .order_by("-created_at", "-id")
+        .values_list("role", "content", "vector")[:scan_limit]
+    )
+
+    scored = []
+    for role, content, vector in candidates:
+        score = cosine(query_vector, vector)
+        if score >= min_score:
+            scored.append({"role": role, "content": content, "score": round(score, 3)})
+
+    scored.sort(key=lambda s: s["score"], reverse=True)
+    return scored[:k]
+
+
+def format_snippets(snippets: List[Dict]) -> str:
+    return "\n".join(f"- [{s['role']}] {s['content']}" for s in snippets)
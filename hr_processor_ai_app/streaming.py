@@ -0,0 +1,65 @@
+import json
+import asyncio
+import logging
+from langgraph.config import get_stream_writer
+
+logger = logging.getLogger(__name__)
+
+
+def emit_event(event: str, **data):
+    """
+    Push a custom event to the client streaming this graph run.
+    Safe to call from any node or helper - it is a no-op outside a streamed run.
+    Events carrying `index`/`total` also become a background job's progress.
+    """
+    try:
+        writer = get_stream_writer()
+    except RuntimeError:
+        return
+    try:
+        writer({"event": event, **data})
+    except Exception as e:
+        logger.warning(f"⚠️ Could not emit stream event '{event}': {e}")
+
+
+def format_sse(event: str, data) -> str:
+    """Format one server-sent event frame"""
+    payload = json.dumps(data, default=str)
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
+async def iterate_on_runtime_loop(agen_factory):
+    """
+    Drive an async generator on the shared runtime loop, where the pooled
+    checkpointer and compiled graph live, and hand its items to the calling
+    (ASGI server) loop as they arrive.
+    """
+    from .async_runtime import submit
+
+    caller_loop = asyncio.get_running_loop()
+    items = asyncio.Queue()
+    done = object()
+
+    def hand_over(item):
+        caller_loop.call_soon_threadsafe(items.put_nowait, item)
+
+    async def consume():
+        try:
+            async for item in agen_factory():
+                hand_over(item)
+        except Exception as e:
+            logger.error(f"❌ Error in streaming worker: {e}")
+            hand_over(format_sse("error", {"error": str(e), "status": "error"}))
+        finally:
+            hand_over(done)
+
+    future = submit(consume())
+    try:
+        while True:
+            item = await items.get()
+            if item is done:
+                break
+            yield item
+    finally:
+        # Client went away - stop the graph run on the runtime loop too
+        future.cancel()
@@ -1,3 +1,1380 @@
-from django.test import TestCase
+import asyncio
+import os
+import time
+from unittest import mock
+from django.core.mail import EmailMessage
+from django.test import AsyncClient, Client, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from .admission import AdmissionController, AdmissionRejected
+from .async_mailer import AsyncEmailBackend
+from .llm_scheduler import LLMScheduler, INTERACTIVE, ROUTING, BULK_GENERATION
+from . import llm_cache, llm_gateway
+from .checkpointers import LRUMemorySaver
+from .jobs import process_jobs
+from .models import AgentJob, EmailRecord, LLMCacheEntry, JobApplicationScreeningResult, MemorySnippet, RoutingDecision
+from . import intent_router
+from .semantic_memory import agent_outputs, index_exchange, index_text, retrieve_relevant
+from .utils import fetch_candidates_by_target, normalize_email
 
-# Create your tests here.
+
+class FetchCandidatesByTargetTests(TestCase):
+
+    def setUp(self):
+        for i in range(5):
+            sender = f"Candidate {i} <Candidate{i}@Example.com>"
+            email_record = EmailRecord.objects.create(
+                session_id="s1",
+                subject=f"Application for AI Developer {i}",
+                sender=sender,
+                to="hr@example.com",
+                date=timezone.now(),
+                body=f"Application body {i}",
+                email_type="job_application",
+            )
+            JobApplicationScreeningResult.objects.create(
+                session_id="s1",
+                email_record=email_record,
+                candidate_name=sender,
+                candidate_email=sender,
+                candidate_email_normalized=normalize_email(sender),
+                screening_status="rejected",
+                reason="wrong application",
+                body=email_record.body,
+                resume_text="",
+            )
+
+    def test_fetch_uses_single_query(self):
+        with self.assertNumQueries(1):
+            candidates = fetch_candidates_by_target("s1", "wrong application")
+
+        self.assertEqual(len(candidates), 5)
+        self.assertEqual(candidates[0]["candidate_email"], "candidate0@example.com")
+        self.assertEqual(candidates[0]["original_subject"], "Application for AI Developer 0")
+
+    def test_normalize_email(self):
+        self.assertEqual(normalize_email("MJ D <Abcde@Gmail.com>"), "abcde@gmail.com")
+        self.assertEqual(normalize_email("abcde@gmail.com "), "abcde@gmail.com")
+        self.assertEqual(normalize_email(None), "")
+
+
+class AsyncEmailBackendTests(SimpleTestCase):
+
+    def setUp(self):
+        from aiosmtpd.controller import Controller
+
+        class RecordingHandler:
+            def __init__(self):
+                self.recipients = []
+                self.sessions = set()
+
+            async def handle_DATA(self, server, session, envelope):
+                self.recipients.extend(envelope.rcpt_tos)
+                self.sessions.add(id(session))
+                return "250 OK"
+
+        self.handler = RecordingHandler()
+        self.controller = Controller(self.handler, hostname="127.0.0.1", port=8031)
+        self.controller.start()
+        self.addCleanup(self.controller.stop)
+
+    def send(self, count, max_connections):
+        messages = [
+            EmailMessage(f"Subject {i}", "Body", "hr@example.com", [f"candidate{i}@example.com"])
+            for i in range(count)
+        ]
+
+        async def run():
+            async with AsyncEmailBackend(
+                host="127.0.0.1", port=8031, username="", password="",
+                use_tls=False, max_connections=max_connections,
+            ) as backend:
+                return await backend.send_messages(messages)
+
+        return asyncio.run(run())
+
+    def test_sends_all_messages_over_bounded_connections(self):
+        sent = self.send(count=50, max_connections=3)
+
+        self.assertEqual(sent, 50)
+        self.assertEqual(len(self.handler.recipients), 50)
+        self.assertLessEqual(len(self.handler.sessions), 3)
+
+
+class AnalyzeMessageViewConcurrencyTests(SimpleTestCase):
+
+    async def fake_process_with_memory(self, session_id, message):
+        await asyncio.sleep(0.2)  # Stand-in for LLM / IMAP / DB waits
+        return {"session_id": session_id, "message": message, "ai_response": "ok"}
+
+    def test_concurrent_requests_overlap(self):
+        client = AsyncClient()
+        requests = 20
+
+        async def run():
+            return await asyncio.gather(*(
+                client.post(
+                    "/api/analyze/",
+                    data={"message": "hello", "session_id": f"load-{i}"},
+                    content_type="application/json",
+                )
+                for i in range(requests)
+            ))
+
+        with mock.patch("hr_processor_ai_app.views.process_with_memory", self.fake_process_with_memory):
+            start = time.perf_counter()
+            responses = asyncio.run(run())
+            elapsed = time.perf_counter() - start
+
+        self.assertTrue(all(r.status_code == 200 for r in responses))
+        self.assertLess(elapsed, requests * 0.2 / 4)
+
+
+class AnalyzeMessageCoalescingTests(SimpleTestCase):
+
+    def setUp(self):
+        self.calls = 0
+
+    async def fake_process_with_memory(self, session_id, message):
+        self.calls += 1
+        await asyncio.sleep(0.2)
+        return {"session_id": session_id, "message": message, "ai_response": "ok"}
+
+    def test_duplicate_requests_share_one_run(self):
+        client = AsyncClient()
+
+        def post(message):
+            return client.post(
+                "/api/analyze/",
+                data={"message": message, "session_id": "double-click"},
+                content_type="application/json",
+            )
+
+        async def run():
+            first = await asyncio.gather(*(post("screen the applications") for _ in range(5)))
+            repeat = await post("screen the applications")
+            other = await post("show latest emails")
+            return first, repeat, other
+
+        with mock.patch("hr_processor_ai_app.views.process_with_memory", self.fake_process_with_memory):
+            first, repeat, other = asyncio.run(run())
+
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(sorted(r["X-Request-Coalesced"] for r in first), ["coalesced"] * 4 + ["executed"])
+        self.assertEqual(repeat["X-Request-Coalesced"], "cached")
+        self.assertEqual(other["X-Request-Coalesced"], "executed")
+        self.assertTrue(all(r.json()["response"] == "ok" for r in first))
+
+
+class AgentJobTests(TransactionTestCase):
+
+    async def fake_graph_events(self, session_id, message, tokens=True):
+        yield "start", {"session_id": session_id, "has_memory": False}
+        yield "node", {"node": "router", "agent": None}
+        for index in (1, 2):
+            yield "screening_result", {"event": "screening_result", "index": index, "total": 2,
+                                       "screening_status": "shortlisted"}
+        yield "result", {"session_id": session_id, "message": message, "response": "Screened 2", "status": "success"}
+
+    def test_job_runs_in_worker_and_reports_progress(self):
+        client = Client()
+        submitted = client.post(
+            "/api/jobs/",
+            data={"message": "screen the applications", "session_id": "s1"},
+            content_type="application/json",
+        )
+        self.assertEqual(submitted.status_code, 202)
+        job = submitted.json()
+        self.assertEqual(client.get(job["result_url"]).status_code, 202)
+
+        with mock.patch("hr_processor_ai_app.views.graph_events", self.fake_graph_events):
+            self.assertEqual(process_jobs(concurrency=4), 1)
+
+        status = client.get(job["status_url"]).json()
+        self.assertEqual(status["status"], AgentJob.STATUS_SUCCEEDED)
+        self.assertEqual(status["current_step"], "router")
+        self.assertEqual(status["progress"], {"event": "screening_result", "done": 2, "total": 2})
+        self.assertEqual(client.get(job["result_url"]).json()["response"], "Screened 2")
+
+    @override_settings(AGENT_JOB_RUNNING_TIMEOUT_SECONDS=0.3)
+    def test_heartbeat_keeps_a_silent_job_from_being_requeued(self):
+        from .async_runtime import db_sync_to_async
+        from .jobs import release_stale_jobs, submit_job
+
+        released = []
+
+        async def silent_graph_events(session_id, message, tokens=True):
+            await asyncio.sleep(0.8)  # one long node, no progress events
+            released.append(await db_sync_to_async(release_stale_jobs)())
+            yield "result", {"session_id": session_id, "response": "done", "status": "success"}
+
+        job = submit_job("s1", "send email to shortlisted candidates")
+        with mock.patch("hr_processor_ai_app.views.graph_events", silent_graph_events):
+            self.assertEqual(process_jobs(), 1)
+
+        job.refresh_from_db()
+        self.assertEqual(released, [0])
+        self.assertEqual((job.status, job.attempts), (AgentJob.STATUS_SUCCEEDED, 1))
+
+    @override_settings(AGENT_JOB_RUNNING_TIMEOUT_SECONDS=0.3)
+    def test_run_stops_when_its_job_was_released(self):
+        from .async_runtime import db_sync_to_async
+        from .jobs import submit_job
+
+        reached_end = []
+
+        async def requeued_graph_events(session_id, message, tokens=True):
+            await db_sync_to_async(AgentJob.objects.filter(session_id=session_id).update)(
+                status=AgentJob.STATUS_QUEUED
+            )
+            await asyncio.sleep(1)
+            reached_end.append(True)
+            yield "result", {"session_id": session_id, "response": "done", "status": "success"}
+
+        job = submit_job("s1", "send email to shortlisted candidates")
+        with mock.patch("hr_processor_ai_app.views.graph_events", requeued_graph_events), \
+                mock.patch("hr_processor_ai_app.jobs.claim_jobs", side_effect=[[AgentJob.objects.get(pk=job.pk)], []]):
+            AgentJob.objects.filter(pk=job.pk).update(status=AgentJob.STATUS_RUNNING, attempts=1)
+            self.assertEqual(process_jobs(), 1)
+
+        job.refresh_from_db()
+        self.assertEqual(reached_end, [])
+        self.assertEqual((job.status, job.result), (AgentJob.STATUS_QUEUED, None))
+
+    def test_a_slot_is_refilled_as_soon_as_its_job_finishes(self):
+        from .jobs import submit_job
+
+        started, finished = {}, {}
+
+        async def timed_graph_events(session_id, message, tokens=True):
+            started[message] = time.monotonic()
+            await asyncio.sleep(0.6 if message == "slow" else 0.1)
+            finished[message] = time.monotonic()
+            yield "result", {"session_id": session_id, "response": message, "status": "success"}
+
+        for message in ("slow", "fast", "next"):
+            submit_job("s1", message)
+        with mock.patch("hr_processor_ai_app.views.graph_events", timed_graph_events):
+            self.assertEqual(process_jobs(concurrency=2), 3)
+
+        # "next" takes the slot "fast" freed instead of waiting for "slow"
+        self.assertLess(started["next"], finished["slow"])
+        self.assertEqual(AgentJob.objects.filter(status=AgentJob.STATUS_SUCCEEDED).count(), 3)
+
+
+class AdmissionControllerTests(SimpleTestCase):
+
+    def test_limits_queue_and_reject(self):
+        async def run():
+            controller = AdmissionController(max_concurrent=2, max_per_session=1, max_queue=1, queue_timeout=5)
+            first = await controller.acquire("a")
+            await controller.acquire("b")
+
+            # Session "a" is at its limit: it queues even though the queue is short
+            waiting = asyncio.ensure_future(controller.acquire("a"))
+            await asyncio.sleep(0)
+            with self.assertRaises(AdmissionRejected) as rejected:
+                await controller.acquire("c")
+
+            first.release()
+            admitted = await asyncio.wait_for(waiting, 1)
+            return rejected.exception, admitted, controller
+
+        rejected, admitted, controller = asyncio.run(run())
+
+        self.assertEqual(rejected.reason, "queue_full")
+        self.assertGreaterEqual(rejected.retry_after, 1)
+        self.assertEqual(admitted.session_id, "a")
+        self.assertEqual(controller.active, 2)
+
+    def test_analyze_returns_429_with_retry_after(self):
+        controller = AdmissionController(max_concurrent=1, max_queue=0)
+
+        async def run():
+            from .async_runtime import run_async
+            await run_async(controller.acquire("busy"))
+            return await AsyncClient().post(
+                "/api/analyze/",
+                data={"message": "screen the applications", "session_id": "s429"},
+                content_type="application/json",
+            )
+
+        with mock.patch("hr_processor_ai_app.views.get_admission_controller", return_value=controller):
+            response = asyncio.run(run())
+
+        self.assertEqual(response.status_code, 429)
+        self.assertTrue(int(response["Retry-After"]) >= 1)
+        self.assertIn("admission_rejected_total", self.client.get("/api/metrics/").content.decode())
+
+    def test_stream_slot_is_released_if_the_stream_never_starts(self):
+        from django.test import RequestFactory
+        from .async_runtime import run_sync
+        from .views import analyze_message_stream_view
+
+        controller = AdmissionController(max_concurrent=1, max_queue=0)
+        request = RequestFactory().post(
+            "/api/analyze/stream/",
+            data={"message": "screen the applications", "session_id": "gone"},
+            content_type="application/json",
+        )
+        with mock.patch("hr_processor_ai_app.views.get_admission_controller", return_value=controller):
+            response = asyncio.run(analyze_message_stream_view(request))
+            self.assertEqual(controller.active, 1)
+
+            # Client disconnected before the first chunk: the server only closes the response
+            response.close()
+            run_sync(asyncio.sleep(0))
+
+        self.assertEqual(controller.active, 0)
+
+
+class LLMSchedulerTests(SimpleTestCase):
+
+    def test_interactive_skips_bulk_backlog_and_classes_share_by_weight(self):
+        scheduler = LLMScheduler(max_concurrent=2, reserved_interactive=1,
+                                 weights={ROUTING: 2, BULK_GENERATION: 1})
+        order = []
+
+        async def call(priority):
+            await scheduler.acquire(priority)
+            order.append(priority)
+            await asyncio.sleep(0.01)
+            scheduler.release(priority)
+
+        async def run():
+            bulk = [asyncio.ensure_future(call(BULK_GENERATION)) for _ in range(6)]
+            routing = [asyncio.ensure_future(call(ROUTING)) for _ in range(6)]
+            await asyncio.sleep(0)
+            started = time.monotonic()
+            await call(INTERACTIVE)
+            waited = time.monotonic() - started
+            await asyncio.gather(*bulk, *routing)
+            return waited
+
+        waited = asyncio.run(run())
+
+        # The reserved slot is free even though bulk work fills the shared one
+        self.assertLess(waited, 0.05)
+        # Weight 2:1 - while both are backlogged routing gets two of every three shared slots
+        shared = [p for p in order if p != INTERACTIVE]
+        self.assertEqual(shared[:9].count(ROUTING), 6)
+
+
+class FlakyLLM:
+    """Fails with the given provider status codes, then answers"""
+
+    def __init__(self, *codes):
+        self.codes = list(codes)
+        self.calls = 0
+
+    def _next(self):
+        from langchain_core.messages import AIMessage
+        self.calls += 1
+        if self.codes:
+            error = Exception("provider error")
+            error.code = self.codes.pop(0)
+            raise error
+        return AIMessage(content="ok", usage_metadata={"input_tokens": 7, "output_tokens": 2, "total_tokens": 9})
+
+    async def ainvoke(self, messages):
+        return self._next()
+
+    def invoke(self, messages):
+        return self._next()
+
+
+class LLMGatewayTests(SimpleTestCase):
+
+    def test_retries_throttling_and_records_tokens(self):
+        client = FlakyLLM(429, 503)
+        with mock.patch.object(llm_gateway, "get_client", return_value=client), \
+                self.settings(LLM_RETRY_BASE_SECONDS=0.001):
+            response = asyncio.run(llm_gateway.ainvoke(["hi"], node="router"))
+            self.assertEqual(llm_gateway.invoke(["hi"], node="memory_context").content, "ok")
+
+        self.assertEqual(response.content, "ok")
+        self.assertEqual(client.calls, 4)
+        self.assertEqual(llm_gateway.retries_total.value(node="router", reason="429"), 1)
+        self.assertGreaterEqual(llm_gateway.tokens_total.value(node="router", direction="input"), 7)
+
+    def test_client_errors_are_not_retried(self):
+        client = FlakyLLM(400)
+        with mock.patch.object(llm_gateway, "get_client", return_value=client):
+            with self.assertRaises(llm_gateway.LLMCallError):
+                asyncio.run(llm_gateway.ainvoke(["hi"], node="general"))
+        self.assertEqual(client.calls, 1)
+
+    def test_node_config_overrides(self):
+        with self.settings(LLM_NODE_MODELS={"screening": {"model": "models/gemini-2.0-pro", "temperature": 0}}):
+            config = llm_gateway.node_config("screening")
+        self.assertEqual((config["model"], config["temperature"], config["priority"]),
+                         ("models/gemini-2.0-pro", 0, "bulk_screening"))
+
+
+class LLMCacheTests(TestCase):
+
+    def test_opted_in_calls_are_served_from_cache(self):
+        from langchain_core.messages import HumanMessage
+        client = FlakyLLM()
+        with mock.patch.object(llm_gateway, "get_client", return_value=client):
+            first = llm_gateway.invoke([HumanMessage(content="Classify:  weekly newsletter")], node="email_classifier", cache=True)
+            again = llm_gateway.invoke([HumanMessage(content="Classify: weekly newsletter ")], node="email_classifier", cache=True)
+            llm_gateway.invoke([HumanMessage(content="Classify: weekly newsletter")], node="email_classifier")
+
+        self.assertEqual((first.content, again.content), ("ok", "ok"))
+        self.assertTrue(again.response_metadata["cached"])
+        self.assertEqual(client.calls, 2)  # the call without cache=True went to the model
+        self.assertEqual(llm_cache.lookups_total.value(node="email_classifier", result="hit"), 1)
+
+    def test_cache_failures_never_fail_the_call(self):
+        from django.db import DatabaseError
+        client = FlakyLLM()
+        with mock.patch.object(llm_gateway, "get_client", return_value=client), \
+                mock.patch.object(llm_cache, "get", side_effect=DatabaseError("cache table locked")), \
+                mock.patch.object(llm_cache, "put", side_effect=DatabaseError("cache table locked")) as put:
+            sync_response = llm_gateway.invoke(["hi"], node="router", cache=True)
+            async_response = asyncio.run(llm_gateway.ainvoke(["hi"], node="router", cache=True))
+
+        self.assertEqual((sync_response.content, async_response.content), ("ok", "ok"))
+        self.assertEqual(client.calls, 2)
+        self.assertEqual(put.call_count, 2)
+
+    def test_eviction_by_ttl_and_lru(self):
+        from langchain_core.messages import AIMessage
+        with self.settings(LLM_CACHE_MAX_ENTRIES=2, LLM_CACHE_EVICT_EVERY=1000):
+            for key in ("a", "b", "c"):
+                llm_cache.put(key, "router", "m", AIMessage(content=key))
+            llm_cache.get("a", "router")  # most recently used now
+            LLMCacheEntry.objects.filter(key="c").update(expires_at=timezone.now())
+
+            self.assertEqual(llm_cache.evict(), {"expired": 1, "lru": 0})
+            llm_cache.put("d", "router", "m", AIMessage(content="d"))
+            self.assertEqual(llm_cache.evict(), {"expired": 0, "lru": 1})
+
+        self.assertEqual(sorted(LLMCacheEntry.objects.values_list("key", flat=True)), ["a", "d"])
+
+
+class RouterCacheTests(TransactionTestCase):
+
+    def test_cached_router_answers_are_not_logged_as_new_decisions(self):
+        import json
+        from langchain_core.language_models.fake_chat_models import FakeListChatModel
+        from .agents import router_agent
+
+        route = {"classification": "hr_email_taskupdate", "task_classification": "email_team_agent",
+                 "target_key": "skill match"}
+        fake = FakeListChatModel(responses=[json.dumps(route)])
+        state = {"message": "please get in touch with those people about their status"}
+        with mock.patch.object(llm_gateway, "get_client", return_value=fake):
+            first = asyncio.run(router_agent(dict(state)))
+            again = asyncio.run(router_agent(dict(state)))
+
+        self.assertEqual(first["task_classification"], again["task_classification"])
+        self.assertEqual(RoutingDecision.objects.filter(source="llm").count(), 1)
+
+
+class SemanticMemoryTests(TestCase):
+
+    def test_retrieves_relevant_turn_from_early_in_session(self):
+        index_exchange("t1", "Always use a warm, friendly tone in rejection emails", "Noted, friendly tone for rejections.")
+        for i in range(30):
+            index_exchange("t1", f"Summarize inbox batch {i}", f"Batch {i} had {i} newsletters and alerts.")
+
+        snippets = retrieve_relevant("t1", "send rejection emails to the wrong applications", k=2)
+
+        self.assertTrue(snippets)
+        self.assertIn("friendly tone", snippets[0]["content"])
+
+    def test_index_is_per_thread_and_bounded(self):
+        index_exchange("t2", "Screen for Python developers", "Screened 3 candidates.")
+        self.assertEqual(retrieve_relevant("other-thread", "python developers"), [])
+
+        with self.settings(SEMANTIC_MEMORY_MAX_SNIPPETS=5):
+            for i in range(10):
+                index_text("t3", "user", f"message {i}")
+        self.assertEqual(MemorySnippet.objects.filter(thread_id="t3").count(), 5)
+
+    def test_agent_outputs_of_this_turn_are_indexed_as_tool_snippets(self):
+        state = {
+            "current_agent": "job_application_screening_agent",
+            "screening_results": [
+                {"candidate": "alice@example.com", "screening_status": "shortlisted", "reason": "skill match"},
+                {"candidate": "bob@example.com", "screening_status": "rejected", "reason": "wrong application"},
+            ],
+            # Left over from an earlier turn - not this turn's output
+            "emails": [{"sender": "old@example.com", "subject": "Old mail", "email_type": "other"}],
+        }
+        outputs = agent_outputs(state)
+        self.assertEqual(outputs, [
+            "Screened alice@example.com: shortlisted (skill match)",
+            "Screened bob@example.com: rejected (wrong application)",
+        ])
+
+        index_exchange("t4", "screen the applications for the Python role", "Screened 2 applications.", outputs)
+        snippets = retrieve_relevant("t4", "why was bob@example.com rejected?", k=1)
+        self.assertEqual(snippets[0]["role"], "tool")
+        self.assertIn("wrong application", snippets[0]["content"])
+
+    def test_scan_is_limited_to_recent_snippets_sharing_a_term(self):
+        index_text("t5", "user", "Keep the interview slots on Tuesday mornings")
+        for i in range(20):
+            index_text("t5", "assistant", f"Batch {i} had newsletters and alerts.")
+
+        with self.settings(SEMANTIC_MEMORY_SCAN_LIMIT=3):
+            # Unrelated snippets are filtered out in SQL, so they don't use up the scan
+            self.assertIn("Tuesday", retrieve_relevant("t5", "when are interview slots?")[0]["content"])
+            for i in range(3):
+                index_text("t5", "user", f"Interview slots moved, version {i}")
+            self.assertNotIn("Tuesday", " ".join(
+                snippet["content"] for snippet in retrieve_relevant("t5", "when are interview slots?", k=10)
+            ))
+
+
+class LRUMemorySaverTests(SimpleTestCase):
+
+    def _turn(self, graph, thread_id):
+        config = {"configurable": {"thread_id": thread_id}}
+        graph.invoke({"value": 1}, config)
+        return graph.get_state(config).values.get("value")
+
+    def test_evicts_least_recently_used_thread(self):
+        import operator
+        from typing import Annotated, TypedDict
+        from langgraph.graph import StateGraph
+
+        class CounterState(TypedDict):
+            value: Annotated[int, operator.add]
+
+        builder = StateGraph(CounterState)
+        builder.add_node("noop", lambda state: {})
+        builder.set_entry_point("noop")
+        saver = LRUMemorySaver(max_threads=2)
+        graph = builder.compile(checkpointer=saver)
+
+        self.assertEqual(self._turn(graph, "a"), 1)
+        self.assertEqual(self._turn(graph, "b"), 1)
+        self.assertEqual(self._turn(graph, "a"), 2)  # "a" is now the most recent
+        self.assertEqual(self._turn(graph, "c"), 1)  # evicts "b"
+
+        self.assertEqual(self._turn(graph, "a"), 3)
+        self.assertEqual(self._turn(graph, "b"), 1)  # started over
+
+
+class IntentRouterTests(TestCase):
+
+    def test_patterns_route_unambiguous_messages(self):
+        cases = {
+            "show latest emails": ("email_fetcher&responder_agent", None),
+            "send email to shortlisted candidates": ("email_team_agent", "skill match"),
+            "email the wrong application candidates": ("email_team_agent", "wrong application"),
+            "summarize job applications": ("job_applications_emails_summary_agent", None),
+            "screen the applications for the Python role": ("job_application_screening_agent", None),
+        }
+        for message, (task, target_key) in cases.items():
+            route = intent_router.match_patterns(message)
+            self.assertEqual(route["task_classification"], task, message)
+            self.assertEqual(route["target_key"], target_key, message)
+
+        self.assertIsNone(intent_router.match_patterns("what is the capital of France"))
+
+    def test_negated_hedged_and_indirect_mail_requests_go_to_the_llm(self):
+        for message in (
+            "do not send emails to rejected candidates yet",
+            "don't email the shortlisted candidates",
+            "send the rejection emails to candidates, but not yet",
+            "should we email the rejected candidates?",
+            "can you send emails to shortlisted candidates?",
+            "I think the rejected candidates have been sent an email already, then screen them",
+            "maybe screen the applications",
+        ):
+            self.assertIsNone(intent_router.match_patterns(message), message)
+            self.assertIsNone(intent_router.classify_intent(message), message)
+
+        # Only an explicit command routes mail locally
+        self.assertIsNone(intent_router.match_patterns("the team wants to email rejected candidates"))
+        route = intent_router.match_patterns("please send email to rejected candidates")
+        self.assertEqual((route["task_classification"], route["target_key"]), ("email_team_agent", "skill mismatch"))
+
+    def test_mail_targets_route_locally_only_as_the_sole_direct_recipient(self):
+        for message in (
+            "send emails to candidates who are not shortlisted",
+            "send rejection emails to candidates who weren't shortlisted",
+            "send email to everyone except the shortlisted candidates",
+            "email candidates that were not selected",
+            "send the hiring manager an email about shortlisted candidates",
+            "send an email to the hiring manager about shortlisted candidates",
+            "send emails to shortlisted and rejected candidates",
+            "send emails to candidates",
+        ):
+            self.assertIsNone(intent_router.match_patterns(message), message)
+            self.assertIsNone(intent_router.classify_intent(message), message)
+
+        route = intent_router.match_patterns("send rejection emails to the rejected applicants")
+        self.assertEqual(route["target_key"], "skill mismatch")
+
+    def test_model_mail_routes_need_a_direct_recipient(self):
+        for i in range(25):
+            intent_router.record_decision(f"send the shortlisted candidates update number {i}",
+                                          {"classification": "hr_email_taskupdate",
+                                           "task_classification": "email_team_agent",
+                                           "target_key": "skill match"}, "llm")
+
+        with self.settings(INTENT_MODEL_REFRESH_SECONDS=0, INTENT_MODEL_MIN_EXAMPLES=20):
+            self.assertIsNone(intent_router.classify_intent("send the manager the shortlisted candidates update"))
+
+    def test_model_never_routes_mail_without_a_command(self):
+        for i in range(25):
+            intent_router.record_decision(f"the rejected applicants from round {i} deserve a note",
+                                          {"classification": "hr_email_taskupdate",
+                                           "task_classification": "email_team_agent",
+                                           "target_key": "skill mismatch"}, "llm")
+
+        with self.settings(INTENT_MODEL_REFRESH_SECONDS=0, INTENT_MODEL_MIN_EXAMPLES=20):
+            self.assertIsNone(intent_router.classify_intent("the rejected applicants from round 99 deserve a note"))
+
+    def test_model_learns_from_llm_decisions_and_escalates_when_unsure(self):
+        for i in range(15):
+            intent_router.record_decision(f"what's a good interview question number {i}",
+                                          {"classification": "general", "task_classification": "other"}, "llm")
+            intent_router.record_decision(f"the applicants from batch {i} need a ranking",
+                                          {"classification": "hr_email_taskupdate",
+                                           "task_classification": "job_application_screening_agent"}, "llm")
+
+        with self.settings(INTENT_MODEL_REFRESH_SECONDS=0, INTENT_MODEL_MIN_EXAMPLES=20):
+            route, confidence, source = intent_router.classify_intent("rank the applicants from batch 99")
+            self.assertEqual(source, "model")
+            self.assertEqual(route["task_classification"], "job_application_screening_agent")
+            self.assertGreaterEqual(confidence, 0.9)
+
+            self.assertIsNone(intent_router.classify_intent("plan a team offsite"))
+
+        intent_router.record_decision("show latest emails", intent_router.match_patterns("show latest emails"), "pattern")
+        stats = intent_router.skip_rate()
+        self.assertEqual((stats["total"], stats["llm"], stats["pattern"]), (31, 30, 1))
+
+
+class RouterFallbackTests(TestCase):
+
+    def test_fallback_clears_target_from_previous_turn(self):
+        from langchain_core.language_models.fake_chat_models import FakeListChatModel
+        from .agents import router_agent
+
+        fake = FakeListChatModel(responses=["not json", "hr_email_taskupdate", "email_team_agent"])
+        state = {"message": "please get in touch with those people about their status", "target_key": "skill match"}
+        with mock.patch.object(llm_gateway, "get_client", return_value=fake):
+            result = asyncio.run(router_agent(state))
+
+        self.assertEqual(result["task_classification"], "email_team_agent")
+        self.assertIsNone(result["target_key"])
+
+
+class TaskPlannerTests(SimpleTestCase):
+
+    def test_compound_request_is_planned_in_order(self):
+        route = intent_router.match_patterns(
+            "fetch new mails, summarize job applications and screen the applications for this JD"
+        )
+        self.assertEqual(route["planned_tasks"], [
+            "email_fetcher&responder_agent",
+            "job_applications_emails_summary_agent",
+            "job_application_screening_agent",
+        ])
+
+    def test_negated_clauses_and_campaigns_are_left_to_the_llm(self):
+        for message in (
+            "don't screen the applications, just show latest emails",
+            "show latest emails and do not screen the applications",
+            "screen the applications and then send email to shortlisted candidates",
+        ):
+            self.assertIsNone(intent_router.plan_compound(message.lower()), message)
+            self.assertIsNone(intent_router.match_patterns(message), message)
+
+    def test_independent_tasks_share_a_level(self):
+        from .agents import plan_task_levels
+
+        levels = plan_task_levels([
+            "email_team_agent",
+            "job_application_screening_agent",
+            "email_fetcher&responder_agent",
+            "job_applications_emails_summary_agent",
+        ])
+        self.assertEqual(levels, [
+            ["email_fetcher&responder_agent"],
+            ["job_application_screening_agent", "job_applications_emails_summary_agent"],
+            ["email_team_agent"],
+        ])
+
+
+class OutboxTests(TestCase):
+
+    def setUp(self):
+        self.candidate = {"candidate_name": "Ada", "candidate_email": "ada@example.com"}
+        self.content = {"subject": "Interview", "body": "Hello Ada"}
+
+    def drain(self, error=None):
+        from . import outbox
+
+        deliver = mock.Mock(side_effect=error)
+        with mock.patch.object(outbox, "acquire", return_value=(True, 0)), \
+                mock.patch.object(outbox, "CampaignMailer"), \
+                mock.patch.object(outbox, "deliver_to_candidate", deliver):
+            return outbox.drain_outbox()
+
+    def test_enqueue_is_idempotent_per_session_and_target(self):
+        from .models import OutboxEmail
+        from .outbox import enqueue_email
+
+        row, status = enqueue_email("s1", "shortlisted", self.candidate, self.content)
+        self.assertEqual(status, "queued")
+        _, status = enqueue_email("s1", "shortlisted", self.candidate, self.content)
+        self.assertEqual(status, OutboxEmail.STATUS_PENDING)
+        self.assertEqual(OutboxEmail.objects.count(), 1)
+
+        OutboxEmail.objects.filter(id=row.id).update(status=OutboxEmail.STATUS_FAILED, attempts=5)
+        _, status = enqueue_email("s1", "shortlisted", self.candidate, self.content)
+        self.assertEqual(status, "requeued")
+        row.refresh_from_db()
+        self.assertEqual((row.status, row.attempts), (OutboxEmail.STATUS_PENDING, 0))
+
+    def test_failed_send_backs_off_and_keeps_the_smtp_error(self):
+        import smtplib
+        from .models import OutboxEmail
+        from .outbox import enqueue_email
+
+        row, _ = enqueue_email("s1", "shortlisted", self.candidate, self.content)
+        stats = self.drain(smtplib.SMTPRecipientsRefused({"ada@example.com": (550, b"mailbox unavailable")}))
+
+        self.assertEqual(stats["retrying"], 1)
+        row.refresh_from_db()
+        self.assertEqual((row.status, row.attempts), (OutboxEmail.STATUS_PENDING, 1))
+        self.assertGreater(row.next_attempt_at, timezone.now())
+        self.assertIn("mailbox unavailable", row.last_error)
+
+    def test_gives_up_after_max_attempts(self):
+        from .models import OutboxEmail
+        from .outbox import enqueue_email
+
+        row, _ = enqueue_email("s1", "shortlisted", self.candidate, self.content)
+        OutboxEmail.objects.filter(id=row.id).update(attempts=4)
+        with self.settings(OUTBOX_MAX_ATTEMPTS=5):
+            stats = self.drain(ConnectionError("connection refused"))
+
+        self.assertEqual(stats["failed"], 1)
+        row.refresh_from_db()
+        self.assertEqual(row.status, OutboxEmail.STATUS_FAILED)
+        self.assertEqual(row.last_error, "Gave up after 5 attempts: ConnectionError: connection refused")
+
+    def test_stale_claims_are_released(self):
+        from datetime import timedelta
+        from .models import OutboxEmail
+        from .outbox import enqueue_email, release_stale_claims
+
+        row, _ = enqueue_email("s1", "shortlisted", self.candidate, self.content)
+        OutboxEmail.objects.filter(id=row.id).update(
+            status=OutboxEmail.STATUS_SENDING, updated_at=timezone.now() - timedelta(hours=1)
+        )
+        with self.settings(OUTBOX_SENDING_TIMEOUT_SECONDS=600):
+            self.assertEqual(release_stale_claims(), 1)
+        row.refresh_from_db()
+        self.assertEqual(row.status, OutboxEmail.STATUS_PENDING)
+
+
+@override_settings(EMAIL_RATE_LIMITS={"default": {"per_minute": 2}})
+class RateLimiterTests(TestCase):
+
+    def test_bucket_refills_in_proportion_to_elapsed_time(self):
+        from datetime import timedelta
+        from . import rate_limiter
+
+        start = timezone.now()
+        with mock.patch.object(rate_limiter.timezone, "now", return_value=start):
+            self.assertEqual(rate_limiter.try_acquire("default"), 0)
+            self.assertEqual(rate_limiter.try_acquire("default"), 0)
+            # 2 per minute refills one token every 30s
+            self.assertAlmostEqual(rate_limiter.try_acquire("default"), 30)
+        with mock.patch.object(rate_limiter.timezone, "now", return_value=start + timedelta(seconds=15)):
+            self.assertAlmostEqual(rate_limiter.try_acquire("default"), 15)
+        with mock.patch.object(rate_limiter.timezone, "now", return_value=start + timedelta(seconds=30)):
+            self.assertEqual(rate_limiter.try_acquire("default"), 0)
+
+    def test_non_blocking_acquire_never_sleeps(self):
+        from . import rate_limiter
+
+        with mock.patch.object(rate_limiter.time, "sleep") as sleep:
+            results = [rate_limiter.acquire("default", max_wait=0) for _ in range(3)]
+        sleep.assert_not_called()
+        self.assertEqual([acquired for acquired, _ in results], [True, True, False])
+        self.assertGreater(results[-1][1], 0)
+
+    def test_unknown_window_is_a_configuration_error(self):
+        from django.core.exceptions import ImproperlyConfigured
+        from .rate_limiter import try_acquire
+
+        with self.settings(EMAIL_RATE_LIMITS={"default": {"per_week": 5}}):
+            with self.assertRaisesMessage(ImproperlyConfigured, "per_week"):
+                try_acquire("default")
+
+    def test_outbox_defers_without_using_an_attempt(self):
+        from datetime import timedelta
+        from . import outbox
+        from .models import OutboxEmail
+
+        for i in range(3):
+            outbox.enqueue_email("s1", "skill match", {"candidate_email": f"c{i}@example.com"}, {"subject": "S", "body": "B"})
+        deliver = mock.Mock()
+        with mock.patch.object(outbox, "acquire", return_value=(False, 120)), \
+                mock.patch.object(outbox, "CampaignMailer"), \
+                mock.patch.object(outbox, "deliver_to_candidate", deliver):
+            stats = outbox.drain_outbox()
+
+        deliver.assert_not_called()
+        self.assertEqual(stats["deferred"], 3)
+        for row in OutboxEmail.objects.all():
+            self.assertEqual((row.status, row.attempts), (OutboxEmail.STATUS_PENDING, 0))
+            self.assertGreater(row.next_attempt_at, timezone.now() + timedelta(seconds=100))
+
+
+class FakeIMAP:
+    """In-memory stand-in for imaplib.IMAP4_SSL serving a fixed inbox"""
+
+    inbox = []
+
+    def __init__(self, host):
+        pass
+
+    def login(self, user, password):
+        return "OK", [b"Logged in"]
+
+    def select(self, mailbox):
+        return "OK", [str(len(self.inbox)).encode()]
+
+    def search(self, charset, criteria):
+        return "OK", [b" ".join(str(i).encode() for i in range(1, len(self.inbox) + 1))]
+
+    def fetch(self, email_id, parts):
+        return "OK", [(email_id + b" (RFC822)", self.inbox[int(email_id) - 1]), b")"]
+
+    def logout(self):
+        return "BYE", [b""]
+
+
+class KeywordLLM:
+    """Answers by prompt content, so one fake serves every node of a graph run"""
+
+    def __init__(self):
+        self.prompts = []
+
+    async def ainvoke(self, messages):
+        from langchain_core.messages import AIMessage
+
+        text = " ".join(message.content for message in messages)
+        self.prompts.append(text)
+        if "Classify this email" in text:
+            return AIMessage(content="job_application")
+        return AIMessage(content="2 job applications received from candidates.")
+
+
+class GraphRunTests(TransactionTestCase):
+
+    def test_fetch_request_runs_through_the_graph(self):
+        from email.message import EmailMessage as MIMEMessage
+        from .graph import build_graph
+        from . import utils
+
+        inbox = []
+        for i in (1, 2):
+            message = MIMEMessage()
+            message["Subject"] = f"Application for Backend Engineer {i}"
+            message["From"] = f"candidate{i}@example.com"
+            message["To"] = "hr@example.com"
+            message["Date"] = "Mon, 19 Oct 2026 10:00:00 +0000"
+            message.set_content("Please find my resume attached.")
+            inbox.append(message.as_bytes())
+
+        llm = KeywordLLM()
+        with mock.patch.object(utils.imaplib, "IMAP4_SSL", type("Inbox", (FakeIMAP,), {"inbox": inbox})), \
+                mock.patch.object(llm_gateway, "get_client", return_value=llm):
+            state = asyncio.run(build_graph().ainvoke({
+                "session_id": "graph-s1",
+                "thread_id": "graph-s1",
+                "message": "fetch new mails",
+                "messages": [],
+            }))
+
+        self.assertEqual(state["task_classification"], "email_fetcher&responder_agent")
+        self.assertEqual(state["ai_response"], "2 job applications received from candidates.")
+        self.assertEqual(len(state["emails"]), 2)
+        self.assertEqual(
+            EmailRecord.objects.filter(session_id="graph-s1", email_type="job_application").count(), 2
+        )
+        # Both classifications, then the summary
+        self.assertEqual(len(llm.prompts), 3)
+
+
+class DirectCampaignTests(SimpleTestCase):
+
+    def test_direct_sends_overlap_across_pooled_connections(self):
+        from . import email_team_agent
+
+        candidates = [{"candidate_name": f"C{i}", "candidate_email": f"c{i}@example.com"} for i in range(6)]
+        in_flight = []
+        peak = []
+
+        async def fake_deliver(candidate, content, backend=None, throttle=True):
+            in_flight.append(candidate)
+            peak.append(len(in_flight))
+            await asyncio.sleep(0.01)
+            in_flight.remove(candidate)
+            return {"candidate_name": candidate["candidate_name"], "candidate_email": candidate["candidate_email"],
+                    "subject": content["subject"], "success": True, "error": None}
+
+        backend = mock.Mock(max_connections=3, close=mock.AsyncMock())
+        with self.settings(EMAIL_DELIVERY_MODE="direct"), \
+                mock.patch.object(email_team_agent, "fetch_candidates_by_target", return_value=candidates), \
+                mock.patch.object(email_team_agent, "AsyncEmailBackend", return_value=backend), \
+                mock.patch.object(email_team_agent, "acquire", return_value=(True, 0.0)), \
+                mock.patch.object(email_team_agent, "deliver_email", fake_deliver), \
+                mock.patch.object(llm_gateway, "get_client", return_value=KeywordLLM()):
+            result = asyncio.run(email_team_agent.email_team_main_agent(
+                "s1", "send email to shortlisted candidates", personalize=False, target_key="skill match"
+            ))
+
+        self.assertEqual(result["emails_sent"], 6)
+        self.assertEqual(max(peak), 3)
+        backend.close.assert_awaited_once()
+
+    def _rate_limited_campaign(self, worker_enabled):
+        from . import agents, email_team_agent
+
+        candidates = [{"candidate_name": f"C{i}", "candidate_email": f"c{i}@example.com"} for i in range(5)]
+
+        async def fake_deliver(candidate, content, backend=None, throttle=True):
+            return {"candidate_name": candidate["candidate_name"], "candidate_email": candidate["candidate_email"],
+                    "subject": content["subject"], "success": True, "error": None}
+
+        async def fake_queue(session_id, target_key, candidate, content):
+            return {"candidate_name": candidate["candidate_name"], "candidate_email": candidate["candidate_email"],
+                    "subject": content["subject"], "success": True, "status": "queued", "error": None}
+
+        queue = mock.AsyncMock(side_effect=fake_queue)
+        limits = [(True, 0.0), (True, 0.0), (False, 40.0)]
+        backend = mock.Mock(max_connections=3, close=mock.AsyncMock())
+        with self.settings(EMAIL_DELIVERY_MODE="direct", OUTBOX_WORKER_ENABLED=worker_enabled), \
+                mock.patch.object(email_team_agent, "fetch_candidates_by_target", return_value=candidates), \
+                mock.patch.object(email_team_agent, "AsyncEmailBackend", return_value=backend), \
+                mock.patch.object(email_team_agent, "acquire", side_effect=limits), \
+                mock.patch.object(email_team_agent, "deliver_email", fake_deliver), \
+                mock.patch.object(email_team_agent, "queue_email", queue), \
+                mock.patch.object(llm_gateway, "get_client", return_value=KeywordLLM()):
+            state = asyncio.run(agents.email_team_agent(
+                {"session_id": "s1", "message": "send email to shortlisted candidates", "target_key": "skill match"}
+            ))
+        return state, queue
+
+    def test_sends_past_the_rate_limit_are_reported_as_queued(self):
+        state, queue = self._rate_limited_campaign(worker_enabled=True)
+
+        self.assertEqual(queue.await_count, 3)
+        self.assertEqual((state["email_results"]["emails_sent"], state["email_results"]["emails_queued"]), (2, 3))
+        self.assertIn("- Sent: 2 emails", state["ai_response"])
+        self.assertIn("- Queued: 3 emails", state["ai_response"])
+
+    def test_without_an_outbox_worker_sends_past_the_rate_limit_are_reported_not_sent(self):
+        state, queue = self._rate_limited_campaign(worker_enabled=False)
+
+        queue.assert_not_awaited()
+        self.assertEqual(state["email_results"]["emails_rate_limited"], 3)
+        self.assertIn("- Sent: 2 emails", state["ai_response"])
+        self.assertIn("- Rate-limited: 3 emails not sent", state["ai_response"])
+        self.assertNotIn("Queued", state["ai_response"])
+
+
+class MessageWindowTests(SimpleTestCase):
+
+    def test_history_beyond_the_window_is_dropped_across_turns(self):
+        from typing import Annotated, Sequence, TypedDict
+        from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+        from langgraph.graph import StateGraph
+        from .agentstate import window_messages
+
+        class ChatState(TypedDict):
+            messages: Annotated[Sequence[BaseMessage], window_messages]
+
+        builder = StateGraph(ChatState)
+        # Like the real agents, the node hands the whole history back with its reply
+        builder.add_node("reply", lambda state: {
+            "messages": list(state["messages"]) + [AIMessage(content=f"re: {state['messages'][-1].content}")]
+        })
+        builder.set_entry_point("reply")
+        graph = builder.compile(checkpointer=LRUMemorySaver())
+        config = {"configurable": {"thread_id": "window"}}
+
+        with self.settings(MAX_HISTORY_MESSAGES=6):
+            for turn in range(10):
+                graph.invoke({"messages": [HumanMessage(content=f"turn {turn}")]}, config)
+
+        messages = graph.get_state(config).values["messages"]
+        self.assertEqual([m.content for m in messages], [
+            "turn 7", "re: turn 7", "turn 8", "re: turn 8", "turn 9", "re: turn 9",
+        ])
+
+
+def _checkpoint_db_available():
+    import psycopg
+    from .memory_manager import memory_manager
+
+    try:
+        psycopg.connect(memory_manager.build_conninfo(), connect_timeout=2).close()
+        return True
+    except Exception:
+        return False
+
+
+class PruneCheckpointsTests(SimpleTestCase):
+
+    def setUp(self):
+        if not _checkpoint_db_available():
+            self.skipTest("LangGraph Postgres database not reachable")
+
+    def test_dry_run_deletes_nothing(self):
+        import io
+        import operator
+        import uuid
+        from typing import Annotated, TypedDict
+        from django.core.management import call_command
+        from langgraph.checkpoint.postgres import PostgresSaver
+        from langgraph.graph import StateGraph
+        from .memory_manager import memory_manager
+
+        class CounterState(TypedDict):
+            value: Annotated[int, operator.add]
+
+        thread_id = f"prune-test-{uuid.uuid4()}"
+        config = {"configurable": {"thread_id": thread_id}}
+        tables = ("checkpoints", "checkpoint_writes", "checkpoint_blobs")
+
+        with PostgresSaver.from_conn_string(memory_manager.build_conninfo()) as saver:
+            saver.setup()
+            builder = StateGraph(CounterState)
+            builder.add_node("noop", lambda state: {})
+            builder.set_entry_point("noop")
+            graph = builder.compile(checkpointer=saver)
+
+            def counts():
+                return [
+                    saver.conn.execute(f"SELECT count(*) AS n FROM {table} WHERE thread_id = %s", (thread_id,))
+                    .fetchone()["n"]
+                    for table in tables
+                ]
+
+            try:
+                for _ in range(4):
+                    graph.invoke({"value": 1}, config)
+                before = counts()
+                out = io.StringIO()
+                call_command("prune_checkpoints", "--keep", "1", "--dry-run", stdout=out)
+                after = counts()
+            finally:
+                saver.delete_thread(thread_id)
+
+        self.assertIn("Dry run", out.getvalue())
+        self.assertGreater(before[0], 1)
+        self.assertEqual(after, before)
+
+
+class RollingSummaryTests(TestCase):
+
+    def fold(self, *responses):
+        from langchain_core.language_models.fake_chat_models import FakeListChatModel
+        from .memory_utils import update_rolling_summary
+
+        with mock.patch.object(llm_gateway, "get_client", return_value=FakeListChatModel(responses=list(responses))):
+            update_rolling_summary("sum-1", "Use a friendly tone in rejection emails", "Noted.")
+
+    def test_each_exchange_is_folded_into_the_stored_summary(self):
+        import json
+        from .models import ConversationSummary
+
+        self.fold(json.dumps({
+            "conversation_summary": "User prefers friendly rejections",
+            "user_preferences": {"tone": "friendly"},
+            "relevant_context": "Rejection emails pending",
+            "session_type": "emailing",
+            "previous_actions": [f"action {i}" for i in range(25)],
+        }))
+        row = ConversationSummary.objects.get(thread_id="sum-1")
+        self.assertEqual((row.summary, row.user_preferences, row.session_type, row.turns_folded),
+                         ("User prefers friendly rejections", {"tone": "friendly"}, "emailing", 1))
+        self.assertEqual(row.previous_actions[0], "action 5")  # only the latest 20 are kept
+
+        self.fold("not json")  # A failed fold leaves the summary as it was
+        row.refresh_from_db()
+        self.assertEqual((row.summary, row.turns_folded), ("User prefers friendly rejections", 1))
+
+    def test_memory_context_reads_summary_and_retrieved_snippets(self):
+        from .memory_utils import get_memory_context
+        from .models import ConversationSummary
+
+        ConversationSummary.objects.create(
+            thread_id="sum-2", summary="Screening for a Python role", relevant_context="3 shortlisted",
+            user_preferences={"tone": "formal"}, session_type="screening", previous_actions=["screened"],
+        )
+        index_text("sum-2", "user", "Only shortlist candidates with Django experience")
+
+        with mock.patch.object(llm_gateway, "get_client") as get_client:
+            memory = get_memory_context("sum-2", [], "which candidates have django experience?")
+        get_client.assert_not_called()  # one row lookup, no LLM call
+
+        self.assertEqual(memory["conversation_summary"], "Screening for a Python role")
+        self.assertEqual(memory["user_preferences"], {"tone": "formal"})
+        self.assertIn("Django experience", memory["retrieved_context"])
+        self.assertTrue(memory["memory_context"].startswith("3 shortlisted"))
+
+    def test_summary_locks_are_dropped_when_folds_finish(self):
+        from . import memory_utils
+
+        async def run():
+            with mock.patch.object(memory_utils, "index_exchange"), \
+                    mock.patch.object(memory_utils, "update_rolling_summary"):
+                for turn in range(3):
+                    memory_utils.schedule_summary_update("sum-3", f"message {turn}", "reply")
+                await asyncio.sleep(0)
+                self.assertIn("sum-3", memory_utils._summary_locks)
+                await asyncio.gather(*memory_utils._summary_tasks)
+
+        asyncio.run(run())
+        self.assertNotIn("sum-3", memory_utils._summary_locks)
+        self.assertNotIn("sum-3", memory_utils._summary_lock_users)
+
+
+class WarmUpTests(SimpleTestCase):
+
+    def test_only_server_processes_warm_up(self):
+        from .apps import is_server_process
+
+        cases = [
+            (["/venv/bin/gunicorn", "hr_processor_ai.wsgi"], {}, True),
+            (["/venv/lib/python3.11/site-packages/uvicorn/__main__.py", "hr_processor_ai.asgi:application"], {}, True),
+            (["manage.py", "runserver"], {"RUN_MAIN": "true"}, True),
+            (["manage.py", "runserver"], {}, False),  # the autoreloader parent
+            (["manage.py", "runserver", "--noreload"], {}, True),
+            (["manage.py", "migrate"], {}, False),
+            (["manage.py", "test"], {}, False),
+        ]
+        for argv, env, expected in cases:
+            with mock.patch("sys.argv", argv), mock.patch.dict("os.environ", env):
+                if "RUN_MAIN" not in env:
+                    os.environ.pop("RUN_MAIN", None)
+                self.assertEqual(is_server_process(), expected, argv)
+
+    def test_importing_the_server_entry_points_has_no_side_effects(self):
+        import importlib
+
+        with mock.patch("hr_processor_ai_app.graph.warm_up_graph") as warm_up:
+            importlib.import_module("hr_processor_ai.wsgi")
+            importlib.import_module("hr_processor_ai.asgi")
+        warm_up.assert_not_called()
+
+
+class EmailTemplateTests(SimpleTestCase):
+
+    def test_slots_are_filled_from_the_candidate_record(self):
+        from .email_team_agent import fill_email_template
+
+        filled = fill_email_template(
+            {"subject": "Your application: {original_subject}",
+             "body": "Dear {candidate_name}, you applied on {application_date} ({reason}). Salary: {salary}"},
+            {"candidate_name": "Ada", "original_subject": "Backend role",
+             "application_date": "2026-10-01T09:30:00+00:00", "reason": "skill match"},
+        )
+        self.assertEqual(filled["subject"], "Your application: Backend role")
+        self.assertEqual(filled["body"], "Dear Ada, you applied on 2026-10-01 (skill match). Salary: {salary}")
+
+    def test_internal_reasons_never_reach_the_candidate(self):
+        from .email_team_agent import fill_email_template
+
+        filled = fill_email_template({"subject": "Update", "body": "Outcome: {reason}"},
+                                     {"candidate_name": "Bob", "reason": "error processing"})
+        self.assertEqual(filled["body"], "Outcome: ")
+
+    def test_personalization_is_opt_in_and_capped(self):
+        from .email_team_agent import wants_personalized_emails
+
+        with self.settings(EMAIL_PERSONALIZATION_MAX_BATCH=3):
+            self.assertTrue(wants_personalized_emails("send personalised emails to shortlisted candidates", 3))
+            self.assertTrue(wants_personalized_emails("write to each of them Individually", 1))
+            self.assertFalse(wants_personalized_emails("send personalized emails to shortlisted candidates", 4))
+            self.assertFalse(wants_personalized_emails("send emails to shortlisted candidates", 1))
+            self.assertFalse(wants_personalized_emails("an impersonalized note is fine", 1))
+
+
+class FakeStreamingGraph:
+    """Replays a fixed (mode, chunk) sequence from astream"""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    async def astream(self, state, config=None, stream_mode=None):
+        for mode, chunk in self.chunks:
+            if mode in stream_mode:
+                yield mode, chunk
+
+
+class StreamViewTests(SimpleTestCase):
+
+    def test_frames_arrive_in_graph_order(self):
+        import json
+        from langchain_core.messages import AIMessageChunk
+
+        graph = FakeStreamingGraph([
+            ("updates", {"router": {"classification": "hr_email_taskupdate", "current_agent": "router"}}),
+            ("custom", {"event": "screening_result", "index": 1, "total": 2, "screening_status": "shortlisted"}),
+            ("messages", (AIMessageChunk(content="Screened"), {"langgraph_node": "job_application_screening_agent"})),
+            ("custom", {"event": "screening_result", "index": 2, "total": 2, "screening_status": "rejected"}),
+            ("updates", {"job_application_screening_agent": {
+                "ai_response": "Screened 2 applications", "current_agent": "job_application_screening_agent",
+            }}),
+        ])
+
+        async def build_graph_with_memory():
+            return graph, False
+
+        async def run():
+            response = await AsyncClient().post(
+                "/api/analyze/stream/",
+                data={"message": "screen the applications", "session_id": "sse-1"},
+                content_type="application/json",
+            )
+            body = b"".join([chunk async for chunk in response.streaming_content]).decode()
+            return response, body
+
+        with mock.patch("hr_processor_ai_app.views.build_graph_with_memory", build_graph_with_memory), \
+                mock.patch("hr_processor_ai_app.views.schedule_summary_update"):
+            response, body = asyncio.run(run())
+
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        self.assertTrue(body.endswith("\n\n"))
+        frames = []
+        for frame in body[:-2].split("\n\n"):
+            event_line, data_line = frame.split("\n")
+            self.assertTrue(event_line.startswith("event: ") and data_line.startswith("data: "), frame)
+            frames.append((event_line[len("event: "):], json.loads(data_line[len("data: "):])))
+
+        self.assertEqual([event for event, _ in frames], [
+            "start", "node", "screening_result", "token", "screening_result", "node", "result", "done",
+        ])
+        self.assertEqual(frames[1][1], {"node": "router", "agent": "router"})
+        self.assertEqual([data["index"] for event, data in frames if event == "screening_result"], [1, 2])
+        self.assertEqual(frames[3][1], {"node": "job_application_screening_agent", "content": "Screened"})
+        self.assertEqual(frames[6][1]["response"], "Screened 2 applications")
+        self.assertEqual(frames[7][1], {"session_id": "sse-1"})
+
+
+class CampaignMailerTests(SimpleTestCase):
+
+    def setUp(self):
+        from aiosmtpd.controller import Controller
+
+        class SessionRecorder:
+            def __init__(self):
+                self.recipients = []
+                self.sessions = set()
+
+            async def handle_DATA(self, server, session, envelope):
+                self.recipients.extend(envelope.rcpt_tos)
+                self.sessions.add(id(session))
+                return "250 OK"
+
+        self.handler = SessionRecorder()
+        self.controller = Controller(self.handler, hostname="127.0.0.1", port=8032)
+        self.controller.start()
+        self.addCleanup(self.controller.stop)
+
+    def mailer(self):
+        from django.core.mail import get_connection
+        from .utils import CampaignMailer
+
+        return CampaignMailer(connection=get_connection(
+            "django.core.mail.backends.smtp.EmailBackend",
+            host="127.0.0.1", port=8032, username="", password="", use_tls=False, fail_silently=False,
+        ))
+
+    def test_campaign_uses_one_connection(self):
+        with self.mailer() as mailer:
+            sent = [mailer.send(f"c{i}@example.com", "Update", "Hello") for i in range(5)]
+
+        self.assertEqual(sent, [True] * 5)
+        self.assertEqual(len(self.handler.recipients), 5)
+        self.assertEqual(len(self.handler.sessions), 1)
+
+    def test_dropped_connection_is_reopened_once(self):
+        import socket
+
+        with self.mailer() as mailer:
+            self.assertTrue(mailer.send("c0@example.com", "Update", "Hello"))
+            # The connection dies between messages, e.g. the server's idle timeout
+            mailer.connection.connection.sock.shutdown(socket.SHUT_RDWR)
+            self.assertTrue(mailer.send("c1@example.com", "Update", "Hello"))
+            self.assertTrue(mailer.send("c2@example.com", "Update", "Hello"))
+
+        self.assertEqual(mailer.reconnects, 1)
+        self.assertEqual(self.handler.recipients, ["c0@example.com", "c1@example.com", "c2@example.com"])
+        self.assertEqual(len(self.handler.sessions), 2)
+
+
+class DraftPipelineTests(SimpleTestCase):
+
+    def run_pipeline(self, delays, concurrency, stop_after=None):
+        from . import email_team_agent
+
+        candidates = [{"candidate_name": name} for name in delays]
+        in_flight = []
+        peak = []
+        cancelled = []
+
+        async def fake_generator(candidate, user_message, target_key):
+            name = candidate["candidate_name"]
+            in_flight.append(name)
+            peak.append(len(in_flight))
+            try:
+                await asyncio.sleep(delays[name])
+            except asyncio.CancelledError:
+                cancelled.append(name)
+                raise
+            finally:
+                in_flight.remove(name)
+            if name == "broken":
+                raise ValueError("LLM returned garbage")
+            return {"subject": f"Hi {name}", "body": "..."}
+
+        async def run():
+            drafts = email_team_agent.generate_drafts_concurrently(candidates, "send emails", "skill match", concurrency)
+            received = []
+            try:
+                async for index, candidate, content in drafts:
+                    received.append((index, candidate["candidate_name"], content))
+                    if stop_after and len(received) == stop_after:
+                        break
+            finally:
+                await drafts.aclose()
+            await asyncio.sleep(0)
+            return received
+
+        with mock.patch.object(email_team_agent, "email_generator_agent", fake_generator):
+            received = asyncio.run(run())
+        return received, max(peak), cancelled
+
+    def test_drafts_arrive_as_they_finish_with_bounded_concurrency(self):
+        received, peak, _ = self.run_pipeline({"slow": 0.3, "broken": 0.05, "fast": 0.0, "medium": 0.15}, concurrency=3)
+
+        self.assertEqual(peak, 3)
+        self.assertEqual([name for _, name, _ in received], ["fast", "broken", "medium", "slow"])
+        self.assertEqual({name: index for index, name, _ in received}, {"slow": 1, "broken": 2, "fast": 3, "medium": 4})
+        contents = {name: content for _, name, content in received}
+        self.assertIsNone(contents["broken"])  # a failed draft doesn't stop the others
+        self.assertEqual(contents["slow"], {"subject": "Hi slow", "body": "..."})
+
+    def test_stopping_early_cancels_pending_drafts(self):
+        received, _, cancelled = self.run_pipeline({"fast": 0.0, "slow": 1, "slower": 2}, concurrency=3, stop_after=1)
+
+        self.assertEqual([name for _, name, _ in received], ["fast"])
+        self.assertEqual(sorted(cancelled), ["slow", "slower"])
@@ -1,7 +1,19 @@
 # hrbot/urls.py
 from django.urls import path
-from .views import analyze_message_view
+from .views import (
+    analyze_message_view,
+    analyze_message_stream_view,
+    submit_job_view,
+    job_status_view,
+    job_result_view,
+    metrics_view,
+)
 
 urlpatterns = [
     path("analyze/", analyze_message_view, name="analyze-message"),
+    path("analyze/stream/", analyze_message_stream_view, name="analyze-message-stream"),
+    path("jobs/", submit_job_view, name="agent-job-submit"),
+    path("jobs/<uuid:job_id>/", job_status_view, name="agent-job-status"),
+    path("jobs/<uuid:job_id>/result/", job_result_view, name="agent-job-result"),
+    path("metrics/", metrics_view, name="metrics"),
 ]
@@ -1,12 +1,12 @@
 import os
 import imaplib
+import smtplib
 import email
 from email.header import decode_header
 from django.core.files.base import ContentFile
 from django.utils.timezone import is_naive, make_aware
 from dotenv import load_dotenv
 from .models import EmailRecord, EmailAttachment
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.messages import SystemMessage, HumanMessage
 from .models import EmailRecord, EmailAttachment
 import fitz  # PyMuPDF
@@ -15,6 +15,10 @@ import json
 from .models import JobApplicationScreeningResult
 from django.utils import timezone
 import re
+import asyncio
+from .async_runtime import db_sync_to_async
+from . import llm_gateway
+from .streaming import emit_event
 
 # Load environment variables first
 load_dotenv()
@@ -22,14 +26,6 @@ load_dotenv()
 EMAIL_HOST = os.getenv("EMAIL_HOST")
 EMAIL_USER = os.getenv("EMAIL_USER")
 EMAIL_PASS = os.getenv("EMAIL_PASS")
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-
-# Initialize Gemini LLM after loading env vars
-llm = ChatGoogleGenerativeAI(
-    model="models/gemini-2.0-flash",
-    temperature=0.7,
-    google_api_key=GEMINI_API_KEY
-)
 
 def clean_subject(subject):
     if subject is None:
@@ -39,7 +35,7 @@ def clean_subject(subject):
         return decoded.decode(encoding or "utf-8", errors="ignore")
     return decoded
 
-def classify_email_type_with_llm(subject: str, body: str) -> str:
+async def classify_email_type_with_llm(subject: str, body: str) -> str:
     prompt = f"""
 You are an email classification assistant. Based on the subject and body, classify this email as one of:
 - job_application
@@ -59,13 +55,14 @@ Body: {body}
     ]
 
     try:
-        response = llm.invoke(messages).content.strip().lower()
+        response = (await llm_gateway.ainvoke(messages, node="email_classifier", cache=True)).content.strip().lower()
         valid_types = ["job_application", "security", "organization", "other"]
         return response if response in valid_types else "other"
     except Exception:
         return "other"
 
-def email_fetcher(session_id: str):
+def fetch_latest_raw_emails(limit: int = 10) -> list:
+    """Blocking IMAP round trips: raw RFC822 bytes of the latest `limit` inbox emails"""
     mail = imaplib.IMAP4_SSL(EMAIL_HOST)
     mail.login(EMAIL_USER, EMAIL_PASS)
     mail.select("inbox")
@@ -73,85 +70,115 @@ def email_fetcher(session_id: str):
     status, messages = mail.search(None, "ALL")
     email_ids = messages[0].split()
 
-    all_emails = []
-
-    for email_id in email_ids[-10:]:  # Only latest 10 emails
+    raw_emails = []
+    for email_id in email_ids[-limit:]:
         status, msg_data = mail.fetch(email_id, "(RFC822)")
         for response_part in msg_data:
             if isinstance(response_part, tuple):
-                msg = email.message_from_bytes(response_part[1])
-
-                subject = clean_subject(msg.get("Subject"))
-                sender = msg.get("From")
-                to = msg.get("To")
-                date_str = msg.get("Date")
-                date_obj = email.utils.parsedate_to_datetime(date_str)
-                if is_naive(date_obj):
-                    date_obj = make_aware(date_obj)
-
-                # Get plain text body
-                body = ""
-                if msg.is_multipart():
-                    for part in msg.walk():
-                        if part.get_content_type() == "text/plain" and not part.get("Content-Disposition"):
-                            try:
-                                body = part.get_payload(decode=True).decode()
-                                break
-                            except Exception:
-                                continue
-                else:
-                    try:
-                        body = msg.get_payload(decode=True).decode()
-                    except Exception:
-                        body = ""
-
-                # Classify email type with LLM
-                email_type = classify_email_type_with_llm(subject, body)
-
-                # Save EmailRecord with email_type
-                email_record = EmailRecord.objects.create(
+                raw_emails.append(response_part[1])
+
+    mail.logout()
+    return raw_emails
+
+
+def parse_email(raw_email: bytes) -> dict:
+    msg = email.message_from_bytes(raw_email)
+
+    date_obj = email.utils.parsedate_to_datetime(msg.get("Date"))
+    if is_naive(date_obj):
+        date_obj = make_aware(date_obj)
+
+    # Get plain text body
+    body = ""
+    if msg.is_multipart():
+        for part in msg.walk():
+            if part.get_content_type() == "text/plain" and not part.get("Content-Disposition"):
+                try:
+                    body = part.get_payload(decode=True).decode()
+                    break
+                except Exception:
+                    continue
+    else:
+        try:
+            body = msg.get_payload(decode=True).decode()
+        except Exception:
+            body = ""
+
+    return {
+        "msg": msg,
+        "subject": clean_subject(msg.get("Subject")),
+        "sender": msg.get("From"),
+        "to": msg.get("To"),
+        "date": date_obj,
+        "body": body,
+    }
+
+
+def save_fetched_email(session_id: str, parsed: dict, email_type: str) -> dict:
+    """Store one fetched email and its attachments; returns its JSON form"""
+    # Save EmailRecord with email_type
+    email_record = EmailRecord.objects.create(
+        session_id=session_id,
+        subject=parsed["subject"],
+        sender=parsed["sender"],
+        to=parsed["to"],
+        date=parsed["date"],
+        body=parsed["body"],
+        email_type=email_type,
+    )
+
+    attachments_data = []
+
+    for part in parsed["msg"].walk():
+        content_disposition = str(part.get("Content-Disposition"))
+        if "attachment" in content_disposition:
+            filename = part.get_filename()
+            if filename:
+                file_data = part.get_payload(decode=True)
+                attachment = EmailAttachment(
+                    email=email_record,
                     session_id=session_id,
-                    subject=subject,
-                    sender=sender,
-                    to=to,
-                    date=date_obj,
-                    body=body,
-                    email_type=email_type,
+                    filename=filename,
                 )
-
-                attachments_data = []
-
-                for part in msg.walk():
-                    content_disposition = str(part.get("Content-Disposition"))
-                    if "attachment" in content_disposition:
-                        filename = part.get_filename()
-                        if filename:
-                            file_data = part.get_payload(decode=True)
-                            attachment = EmailAttachment(
-                                email=email_record,
-                                session_id=session_id,
-                                filename=filename,
-                            )
-                            attachment.file.save(filename, ContentFile(file_data))
-                            attachments_data.append({
-                                "filename": filename,
-                                "url": attachment.file.url
-                            })
-
-                all_emails.append({
-                    "id": email_record.id,
-                    "session_id": session_id,
-                    "subject": subject,
-                    "sender": sender,
-                    "to": to,
-                    "date": date_obj.isoformat(),
-                    "body": body,
-                    "email_type": email_type,
-                    "attachments": attachments_data,
+                attachment.file.save(filename, ContentFile(file_data))
+                attachments_data.append({
+                    "filename": filename,
+                    "url": attachment.file.url
                 })
 
-    mail.logout()
+    return {
+        "id": email_record.id,
+        "session_id": session_id,
+        "subject": parsed["subject"],
+        "sender": parsed["sender"],
+        "to": parsed["to"],
+        "date": parsed["date"].isoformat(),
+        "body": parsed["body"],
+        "email_type": email_type,
+        "attachments": attachments_data,
+    }
+
+
+async def email_fetcher(session_id: str):
+    # IMAP and database work run in worker threads; the LLM classifications
+    # of all fetched emails run concurrently on the event loop
+    raw_emails = await asyncio.to_thread(fetch_latest_raw_emails, 10)  # Only latest 10 emails
+    parsed_emails = [parse_email(raw_email) for raw_email in raw_emails]
+
+    # Classify email type with LLM
+    email_types = await asyncio.gather(*(
+        classify_email_type_with_llm(parsed["subject"], parsed["body"])
+        for parsed in parsed_emails
+    ))
+
+    all_emails = []
+    for parsed, email_type in zip(parsed_emails, email_types):
+        all_emails.append(
+            await db_sync_to_async(save_fetched_email)(session_id, parsed, email_type)
+        )
+
     print(f"Fetched {len(all_emails)} emails for session {session_id}")
+    emit_event("progress", step="fetch_emails", index=len(all_emails), total=len(all_emails))
     return all_emails
 
 
@@ -187,23 +214,30 @@ def extract_resume_text(file_path):
         print(f"Error extracting resume text from {file_path}: {e}")
     return ""
 
-def screen_and_summarize_applications(session_id: str, job_descr: str):
+def resume_text_for(email_record) -> str:
+    """Resume text from the email's attachments (first non-empty one)"""
+    for att in EmailAttachment.objects.filter(email=email_record):
+        resume_text = extract_resume_text(att.file.path)
+        if resume_text:
+            return resume_text
+    return ""
+
+
+async def screen_and_summarize_applications(session_id: str, job_descr: str):
     results = []
 
     # Fetch job application emails with email_type="job_application"
-    records = EmailRecord.objects.filter(
-        session_id=session_id,
-        email_type="job_application"
-    ).order_by("date")
-
-    for email_record in records:
-        # Extract resume text from attachments (take first non-empty)
-        resume_text = ""
-        attachments = EmailAttachment.objects.filter(email=email_record)
-        for att in attachments:
-            resume_text = extract_resume_text(att.file.path)
-            if resume_text:
-                break
+    records = await db_sync_to_async(list)(
+        EmailRecord.objects.filter(
+            session_id=session_id,
+            email_type="job_application"
+        ).order_by("date")
+    )
+    total = len(records)
+
+    for index, email_record in enumerate(records, 1):
+        # Attachment lookup and PDF/DOCX parsing are blocking - keep them off the loop
+        resume_text = await db_sync_to_async(resume_text_for)(email_record)
 
         candidate_data = {
             "subject": email_record.subject,
@@ -249,10 +283,10 @@ Examples:
 """
 
         try:
-            response = llm.invoke([
+            response = (await llm_gateway.ainvoke([
                 SystemMessage(content="You are a JSON-only response system. Return only valid JSON with no markdown formatting or additional text."),
                 HumanMessage(content=prompt)
-            ]).content.strip()
+            ], node="screening", cache=True)).content.strip()
 
             # Clean the response - remove markdown code blocks if present
             if response.startswith('```json'):
@@ -302,11 +336,13 @@ Examples:
                 "reason": "error processing"
             }
 
-        # Save screening result to DB
-        JobApplicationScreeningResult.objects.create(
+        # Save screening result to DB, linked to its source email
+        await db_sync_to_async(JobApplicationScreeningResult.objects.create)(
             session_id=session_id,
+            email_record=email_record,
             candidate_name=email_record.sender or "Unknown",
             candidate_email=email_record.sender or "Unknown",
+            candidate_email_normalized=normalize_email(email_record.sender),
             screening_status=resp_json["screening_status"],
             reason=resp_json["reason"],
             resume_text=resume_text,
@@ -320,6 +356,15 @@ Examples:
             **resp_json
         })
 
+        emit_event(
+            "screening_result",
+            index=index,
+            total=total,
+            candidate=email_record.sender or "Unknown",
+            screening_status=resp_json["screening_status"],
+            reason=resp_json["reason"],
+        )
+
     # Create final summary prompt for LLM
     summary_prompt = f"""
 Summarize the screening results below:
@@ -340,10 +385,10 @@ Candidate 1:
 """
 
     try:
-        final_summary = llm.invoke([
+        final_summary = (await llm_gateway.ainvoke([
             SystemMessage(content="Summarize screening outcomes"),
             HumanMessage(content=summary_prompt)
-        ]).content.strip()
+        ], node="screening_summary")).content.strip()
     except Exception as e:
         print(f"LLM summary generation error: {e}")
         final_summary = "Failed to generate summary."
@@ -376,9 +421,15 @@ def extract_email_from_sender(sender_string):
     return ""
 
 
+def normalize_email(sender_string):
+    """Bare lowercase address used for indexed candidate lookups"""
+    return extract_email_from_sender(sender_string).lower()
+
+
 def fetch_candidates_by_target(session_id: str, target_key: str):
     """
-    Fetch candidates data based on target key match only
+    Fetch candidates data based on target key match only.
+    Screening results and their source emails come back in one joined query.
     """
     try:
         # Get screening results based on target
@@ -397,24 +448,14 @@ def fetch_candidates_by_target(session_id: str, target_key: str):
         
         candidates_json = []
         
-        for record in screening_records:
-            clean_email = extract_email_from_sender(record.candidate_email)
+        for record in screening_records.select_related("email_record"):
+            clean_email = record.candidate_email_normalized or normalize_email(record.candidate_email)
             
-            # Get original email record for full details
-            try:
-                email_record = EmailRecord.objects.filter(
-                    session_id=session_id,
-                    sender__icontains=clean_email
-                ).first()
-                
-                original_subject = email_record.subject if email_record else ""
-                original_body = email_record.body if email_record else record.body
-                original_date = email_record.date.isoformat() if email_record else ""
-                
-            except:
-                original_subject = ""
-                original_body = record.body
-                original_date = ""
+            # Original email record for full details
+            email_record = record.email_record
+            original_subject = email_record.subject if email_record else ""
+            original_body = email_record.body if email_record else record.body
+            original_date = email_record.date.isoformat() if email_record else ""
             
             candidates_json.append({
                 "candidate_name": record.candidate_name or "Unknown",
@@ -436,12 +477,91 @@ def fetch_candidates_by_target(session_id: str, target_key: str):
         return []
 
 
-def send_email_to_candidate(email: str, subject: str, body: str):
-    """Send email to single candidate using Django's email backend"""
-    try:
+class CampaignMailer:
+    """
+    Sends a whole email campaign over one SMTP connection instead of paying
+    the TCP + TLS + AUTH handshake for every message.
+
+    Usage:
+        with CampaignMailer() as mailer:
+            mailer.send(email, subject, body)
+
+    If the server drops the connection mid-campaign (idle timeout, per-session
+    message cap), the message is retried once over a fresh connection.
+    """
+
+    def __init__(self, connection=None):
+        from django.core.mail import get_connection
+
+        self.connection = connection or get_connection(fail_silently=False)
+        self.reconnects = 0
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def open(self):
+        self.connection.open()
+
+    def close(self):
+        try:
+            self.connection.close()
+        except Exception as e:
+            print(f"⚠️ Error closing SMTP connection: {e}")
+
+    def _reconnect(self):
+        self.close()
+        self.connection.open()
+        self.reconnects += 1
+        print("🔄 SMTP connection re-established")
+
+    def send(self, email: str, subject: str, body: str) -> bool:
+        from django.core.mail import EmailMessage
+        from django.conf import settings
+
+        message = EmailMessage(
+            subject=subject,
+            body=body,
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            to=[email],
+            connection=self.connection,
+        )
+
+        try:
+            sent = self.connection.send_messages([message])
+        except (smtplib.SMTPServerDisconnected, ConnectionError):
+            self._reconnect()
+            sent = self.connection.send_messages([message])
+
+        return sent == 1
+
+
+def deliver_to_candidate(email: str, subject: str, body: str, mailer: CampaignMailer = None, throttle: bool = True):
+    """
+    Send email to single candidate using Django's email backend, raising
+    the SMTP / rate-limit error on failure (the outbox records it).
+    Pass the campaign's `mailer` to reuse its open SMTP connection.
+    With `throttle`, waits for a slot from the shared per-provider rate
+    limiter first; pass False only if the caller already holds one.
+    """
+    if throttle:
+        from .rate_limiter import acquire
+
+        acquired, retry_after = acquire()
+        if not acquired:
+            raise smtplib.SMTPException(f"Rate limited by provider limits, retry in {retry_after:.0f}s")
+
+    if mailer is not None:
+        if not mailer.send(email, subject, body):
+            raise smtplib.SMTPException("Message was not accepted by the mail backend")
+    else:
         from django.core.mail import send_mail
         from django.conf import settings
-        
+
         send_mail(
             subject=subject,
             message=body,
@@ -449,10 +569,15 @@ def send_email_to_candidate(email: str, subject: str, body: str):
             recipient_list=[email],
             fail_silently=False,
         )
-        
-        print(f"📧 Email sent successfully to {email}")
+
+    print(f"📧 Email sent successfully to {email}")
+
+
+def send_email_to_candidate(email: str, subject: str, body: str, mailer: CampaignMailer = None, throttle: bool = True):
+    """deliver_to_candidate that reports failure as False instead of raising"""
+    try:
+        deliver_to_candidate(email, subject, body, mailer=mailer, throttle=throttle)
         return True
-        
     except Exception as e:
         print(f"❌ Failed to send email to {email}: {e}")
         return False
@@ -1,16 +1,78 @@
-from django.http import JsonResponse
-from django.views.decorators.csrf import csrf_exempt
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from .graph import build_graph_with_memory, build_graph
 from .memory_manager import memory_manager
-from langchain_core.messages import HumanMessage, AIMessage
+from .streaming import format_sse, iterate_on_runtime_loop
+from .async_runtime import run_async, db_sync_to_async
+from .memory_utils import schedule_summary_update
+from .semantic_memory import agent_outputs
+from .coalescing import SingleFlight
+from .admission import AdmissionRejected, get_admission_controller
+from .metrics import registry
+from .jobs import submit_job, job_status_payload
+from .models import AgentJob
+from django.urls import reverse
+from django.conf import settings
+from langchain_core.messages import HumanMessage, AIMessage, AIMessageChunk
 import json
-import asyncio
 import logging
+import weakref
 
 logger = logging.getLogger(__name__)
 
-@csrf_exempt
-def analyze_message_view(request):
+# Identical in-flight (session_id, message) requests share one graph run, and
+# its result answers immediate repeats - retries and double clicks must not
+# fetch, screen or email twice
+analyze_flights = SingleFlight(
+    ttl=getattr(settings, "ANALYZE_RESULT_CACHE_SECONDS", 10),
+    cacheable=lambda result: not result.get("error"),
+)
+
+
+async def process_coalesced(session_id: str, message: str):
+    """process_with_memory, deduplicated per (session_id, message); returns (result, how)"""
+    return await analyze_flights.run(
+        (session_id, message.strip()),
+        lambda: process_admitted(session_id, message),
+    )
+
+
+async def process_admitted(session_id: str, message: str):
+    """process_with_memory once admission control grants a slot (raises AdmissionRejected)"""
+    async with get_admission_controller().admit(session_id):
+        return await process_with_memory(session_id, message)
+
+
+class AdmittedStreamingResponse(StreamingHttpResponse):
+    """
+    Streaming response that owns an admission slot. The slot is released
+    when the stream ends, when the server closes the response (also if the
+    client left before the first chunk, so the stream never started), and
+    at the latest when the response is garbage collected.
+    """
+
+    def __init__(self, slot, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.slot = slot
+        weakref.finalize(self, slot.release)
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            self.slot.release()
+
+
+def too_busy_response(error: AdmissionRejected) -> JsonResponse:
+    response = JsonResponse({"error": str(error), "status": "busy", "reason": error.reason}, status=429)
+    response["Retry-After"] = str(error.retry_after)
+    return response
+
+
+async def analyze_message_view(request):
+    """
+    Async chat endpoint. Served through hr_processor_ai/asgi.py, a single
+    process holds many in-flight requests while they wait on LLM/IMAP/DB I/O.
+    """
     if request.method == "POST":
         try:
             data = json.loads(request.body)
@@ -23,22 +85,16 @@ def analyze_message_view(request):
             if not session_id:
                 return JsonResponse({"error": "Session ID is required."}, status=400)
 
-            # Run async graph processing
-            result = asyncio.run(process_with_memory(session_id, message))
+            # Run async graph processing on the shared runtime loop, where the
+            # pooled checkpointer and compiled graph live
+            result, how = await run_async(process_coalesced(session_id, message))
             
-            # Ensure we return a response field for the Streamlit frontend
-            return JsonResponse({
-                "session_id": result["session_id"],
-                "message": result["message"],
-                "response": result.get("ai_response", "No response generated"),  # Main response field
-                "ai_response": result.get("ai_response"),
-                "classification": result.get("classification", "unknown"),
-                "task_classification": result.get("task_classification", "unknown"),
-                "agent": result.get("current_agent", "default"),
-                "has_memory": result.get("has_memory", False),
-                "thread_id": result.get("thread_id", session_id),
-                "status": "success"
-            })
+            response = JsonResponse(build_response_payload(result, session_id))
+            response["X-Request-Coalesced"] = how  # executed / coalesced / cached
+            return response
+
+        except AdmissionRejected as e:
+            return too_busy_response(e)
 
         except Exception as e:
             logger.error(f"❌ Error in analyze_message_view: {e}")
@@ -49,18 +105,226 @@ def analyze_message_view(request):
 
     return JsonResponse({"error": "Only POST method allowed."}, status=405)
 
+
+# csrf_exempt() on Django 4.2 wraps views in a sync function, which would hide
+# the coroutine from the handler - mark the async view exempt directly
+analyze_message_view.csrf_exempt = True
+
+
+def build_response_payload(result: dict, session_id: str) -> dict:
+    """Shape a graph result into the JSON returned to the chat clients"""
+    # Ensure we return a response field for the Streamlit frontend
+    return {
+        "session_id": result["session_id"],
+        "message": result["message"],
+        "response": result.get("ai_response", "No response generated"),  # Main response field
+        "ai_response": result.get("ai_response"),
+        "classification": result.get("classification", "unknown"),
+        "task_classification": result.get("task_classification", "unknown"),
+        "agent": result.get("current_agent", "default"),
+        "has_memory": result.get("has_memory", False),
+        "thread_id": result.get("thread_id", session_id),
+        "status": "success"
+    }
+
+
+async def analyze_message_stream_view(request):
+    """
+    Server-sent events variant of analyze_message_view.
+    Emits node transitions, screening verdicts, email send results and LLM
+    tokens while the graph runs, then a final `result` event.
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "Only POST method allowed."}, status=405)
+
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({"error": "Invalid JSON body."}, status=400)
+
+    message = data.get("message", "")
+    session_id = data.get("session_id", "")
+
+    if not message:
+        return JsonResponse({"error": "Message is required."}, status=400)
+
+    if not session_id:
+        return JsonResponse({"error": "Session ID is required."}, status=400)
+
+    # Admit before the stream starts, so an overloaded server can still answer 429
+    try:
+        slot = await run_async(get_admission_controller().acquire(session_id))
+    except AdmissionRejected as e:
+        return too_busy_response(e)
+
+    async def admitted_stream():
+        try:
+            async for frame in iterate_on_runtime_loop(lambda: stream_with_memory(session_id, message)):
+                yield frame
+        finally:
+            slot.release()
+
+    response = AdmittedStreamingResponse(slot, admitted_stream(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # Stop nginx from buffering the stream
+    return response
+
+
+analyze_message_stream_view.csrf_exempt = True
+
+
+def metrics_view(request):
+    """Process metrics (admission control, ...) in the Prometheus text format"""
+    return HttpResponse(registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+async def submit_job_view(request):
+    """
+    Queue a chat message as a background job and return its id at once.
+    For screenings and campaigns that outlast a client's request timeout;
+    `python manage.py run_agent_jobs` runs the job.
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "Only POST method allowed."}, status=405)
+
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({"error": "Invalid JSON body."}, status=400)
+
+    message = data.get("message", "")
+    session_id = data.get("session_id", "")
+
+    if not message:
+        return JsonResponse({"error": "Message is required."}, status=400)
+
+    if not session_id:
+        return JsonResponse({"error": "Session ID is required."}, status=400)
+
+    job = await db_sync_to_async(submit_job)(session_id, message)
+    return JsonResponse({
+        "job_id": str(job.job_id),
+        "status": job.status,
+        "status_url": reverse("agent-job-status", args=[job.job_id]),
+        "result_url": reverse("agent-job-result", args=[job.job_id]),
+    }, status=202)
+
+
+submit_job_view.csrf_exempt = True
+
+
+async def get_job(job_id):
+    try:
+        return await db_sync_to_async(AgentJob.objects.get)(job_id=job_id)
+    except AgentJob.DoesNotExist:
+        return None
+
+
+async def job_status_view(request, job_id):
+    """Status, current graph step and reported progress of a background job"""
+    if request.method != "GET":
+        return JsonResponse({"error": "Only GET method allowed."}, status=405)
+
+    job = await get_job(job_id)
+    if job is None:
+        return JsonResponse({"error": "Job not found."}, status=404)
+    return JsonResponse(job_status_payload(job))
+
+
+async def job_result_view(request, job_id):
+    """
+    Final chat payload of a finished job. 202 while it is still queued or
+    running, so polling clients can keep asking.
+    """
+    if request.method != "GET":
+        return JsonResponse({"error": "Only GET method allowed."}, status=405)
+
+    job = await get_job(job_id)
+    if job is None:
+        return JsonResponse({"error": "Job not found."}, status=404)
+
+    if job.status == AgentJob.STATUS_SUCCEEDED:
+        return JsonResponse(job.result)
+    if job.status == AgentJob.STATUS_FAILED:
+        return JsonResponse({"error": job.error, "status": "error", "job_id": str(job.job_id)}, status=500)
+
+    response = JsonResponse({"job_id": str(job.job_id), "status": job.status}, status=202)
+    response["Retry-After"] = "2"
+    return response
+
+
+async def graph_events(session_id: str, message: str, tokens: bool = True):
+    """
+    Run the graph with streaming enabled and yield (event, data) pairs as it
+    progresses - node transitions, custom node events, LLM tokens and a final
+    `result` (or `error`). Shared by the SSE view and the background job worker.
+    """
+    use_memory = False
+    messages = [HumanMessage(content=message)]
+    result = {}
+
+    try:
+        graph, use_memory = await build_graph_with_memory()
+
+        initial_state = {
+            "session_id": session_id,
+            "message": message,
+            "messages": messages,
+            "thread_id": session_id,
+        }
+        config = {"configurable": {"thread_id": session_id}} if use_memory else None
+
+        yield "start", {"session_id": session_id, "has_memory": use_memory}
+
+        stream_mode = ["updates", "messages", "custom"] if tokens else ["updates", "custom"]
+        async for mode, chunk in graph.astream(initial_state, config, stream_mode=stream_mode):
+            if mode == "updates":
+                for node, update in chunk.items():
+                    if isinstance(update, dict):
+                        result.update(update)
+                    yield "node", {"node": node, "agent": (update or {}).get("current_agent")}
+            elif mode == "messages":
+                message_chunk, metadata = chunk
+                if isinstance(message_chunk, (AIMessage, AIMessageChunk)) and message_chunk.content:
+                    yield "token", {
+                        "node": metadata.get("langgraph_node"),
+                        "content": message_chunk.content,
+                    }
+            elif mode == "custom":
+                yield chunk.get("event", "progress"), chunk
+
+        result.update({
+            "session_id": session_id,
+            "message": message,
+            "has_memory": use_memory,
+            "thread_id": session_id,
+        })
+        schedule_summary_update(session_id, message, result.get("ai_response"), agent_outputs(result))
+        yield "result", build_response_payload(result, session_id)
+
+    except Exception as e:
+        logger.error(f"❌ Error in graph_events: {e}")
+        yield "error", {"error": str(e), "status": "error"}
+
+
+async def stream_with_memory(session_id: str, message: str):
+    """Run the graph with streaming enabled and yield SSE frames as it progresses"""
+    async for event, data in graph_events(session_id, message):
+        yield format_sse(event, data)
+
+    yield format_sse("done", {"session_id": session_id})
+
+
 async def process_with_memory(session_id: str, message: str):
     """Process message with memory support"""
     # Initialize variables at the top to avoid UnboundLocalError
     graph = None
-    conn = None
     use_memory = False
     messages = [HumanMessage(content=message)]  # Initialize messages here
     
     try:
-        # Try to use memory-enabled graph
-        graph, conn = await build_graph_with_memory()
-        use_memory = conn is not None
+        # Try to use memory-enabled graph (compiled once per process)
+        graph, use_memory = await build_graph_with_memory()
         
         # Prepare initial state with messages initialized
         initial_state = {
@@ -88,24 +352,16 @@ async def process_with_memory(session_id: str, message: str):
                 ]
             else:
                 result["messages"] = messages
-            
-            # Close connection safely
-            if conn:
-                try:
-                    await conn.close()
-                except Exception as close_error:
-                    logger.warning(f"⚠️ Error closing connection: {close_error}")
                 
         else:
             # Fallback to non-memory graph
             logger.warning("⚠️ Using fallback graph without memory")
-            graph = build_graph()
             initial_state = {
                 "session_id": session_id,
                 "message": message,
                 "messages": messages,  # Ensure messages is always present
             }
-            result = graph.invoke(initial_state)
+            result = await graph.ainvoke(initial_state)
             
             # Ensure result has messages field
             if not result:
@@ -124,19 +380,15 @@ async def process_with_memory(session_id: str, message: str):
         # Ensure messages field exists
         if "messages" not in result:
             result["messages"] = messages
+        
+        # Fold this turn into the rolling summary after the response is sent
+        schedule_summary_update(session_id, message, result.get("ai_response"), agent_outputs(result))
             
         return result
         
     except Exception as e:
         logger.error(f"❌ Error in process_with_memory: {e}")
         
-        # Clean up connection if it exists
-        if conn:
-            try:
-                await conn.close()
-            except Exception as close_error:
-                logger.warning(f"⚠️ Error closing connection during cleanup: {close_error}")
-        
         # Ultimate fallback with safe initialization
         try:
             graph = build_graph()
@@ -145,7 +397,7 @@ async def process_with_memory(session_id: str, message: str):
                 "message": message,
                 "messages": messages,  # Use the initialized messages
             }
-            result = graph.invoke(initial_state)
+            result = await graph.ainvoke(initial_state)
             
             # Ensure result is a dictionary
             if not result: